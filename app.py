@@ -1,32 +1,204 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import os
-from crewai import Agent, Task, Crew, Process
-from langchain_groq import ChatGroq
-from pydantic import BaseModel
-from typing import List, Literal, Type
+import queue
+import threading
 import json
-import litellm
-litellm.set_verbose = True
+import uuid
 
-# Import your tool classes from the original file (assuming they are in the same directory)
-from backend.agents.agents import run_project_analysis
+# crewai and litellm are not imported here: gunicorn preloads them in the master (gunicorn.conf.py),
+# and without preloading they load on the first analysis instead of at worker boot.
+from backend.jobs.jobs import job_manager, JobQueueFull
+from backend.cache.cache import CACHE_ENABLED
+from backend.batch.batch import iter_jsonl, run_batch, BATCH_CONCURRENCY
+from backend.observability.tracing import span
+from backend.observability import metrics
+from backend.llms.ratelimit import ProviderRateLimited
+from backend.jobs.admission import AdmissionQueueFull
+from backend.logs.logs import configure_logging
+from backend.pipeline.cancellation import cancel_registry, RunCancelled, RunIdInUse, RUN_ID_PATTERN
+
+configure_logging()
+
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', '5'))  # seconds between keep-alive lines (disconnect detection)
 
 app = Flask(__name__, static_folder='frontend', static_url_path='')
 CORS(app)
 
 # Helper to run the CrewAI pipeline
+def run_cached_project_analysis(*args, **kwargs):
+    from backend.agents.agents import run_cached_project_analysis as run
+    return run(*args, **kwargs)
+
+def new_run_id():
+    """The id the client can cancel its run by: a server-generated uuid4 hex, or the client's own.
+
+    A client that sends ``X-Run-Id`` (32 lowercase hex digits, e.g. a uuid4 hex) knows the id
+    before /api/analyze answers, so it can cancel the run meanwhile. Raises ValueError for a
+    malformed id and RunIdInUse for one that was used before.
+    """
+    run_id = request.headers.get('X-Run-Id')
+    if run_id is None:
+        return uuid.uuid4().hex
+    if not RUN_ID_PATTERN.fullmatch(run_id):
+        raise ValueError('X-Run-Id must be 32 lowercase hex digits (e.g. a uuid4 hex).')
+    if not cancel_registry.claim(run_id):
+        raise RunIdInUse('X-Run-Id has already been used; send a fresh one.')
+    return run_id
+
+def run_id_error(e):
+    return jsonify({'success': False, 'error': str(e)}), 409 if isinstance(e, RunIdInUse) else 400
+
+def use_cache():
+    """Clients can skip the result cache lookup with 'Cache-Control: no-cache'."""
+    return CACHE_ENABLED and 'no-cache' not in request.headers.get('Cache-Control', '')
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     data = request.json
     try:
-        result = run_project_analysis(data)
-        return jsonify({'success': True, 'result': result})
+        run_id = new_run_id()
+    except ValueError as e:
+        return run_id_error(e)
+    try:
+        queue_info = {}
+        with span('request', kind='request', endpoint='/api/analyze') as s:
+            result, cache_status, key = run_cached_project_analysis(data, use_cache=use_cache(),
+                                                                    on_queue_update=queue_info.update, run_id=run_id)
+            s.set(cache=cache_status)
+        metrics.REQUEST_LATENCY.labels(endpoint='/api/analyze', cache=cache_status).observe(s.duration)
+        response = jsonify({'success': True, 'result': result})
+        response.headers['X-Cache'] = cache_status
+        response.headers['X-Cache-Key'] = key[:16]
+        response.headers['X-Run-Id'] = run_id
+        if queue_info:
+            response.headers['X-Queue-Wait'] = str(queue_info['waited'])
+        return response
+    except RunCancelled as e:
+        return jsonify({'success': False, 'cancelled': True, 'error': str(e)}), 409
+    except AdmissionQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except ProviderRateLimited as e:
+        response = jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after})
+        response.status_code = 429
+        if e.retry_after:
+            response.headers['Retry-After'] = str(int(e.retry_after + 1))
+        return response
     except Exception as e:
         import traceback
         return jsonify({'success': False, 'error': str(e), 'traceback': traceback.format_exc()})
 
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Same analysis as /api/analyze, streamed as NDJSON: one line per finished stage, then the result.
+
+    The first event carries the run id for /api/analyze/<run_id>/cancel. Blank keep-alive lines
+    are sent while waiting; when one cannot be delivered the client is gone and the run is cancelled.
+    """
+    data = request.json
+    cached = use_cache()
+    try:
+        run_id = new_run_id()
+    except ValueError as e:
+        return run_id_error(e)
+    events = queue.Queue()
+    events.put({'event': 'started', 'run_id': run_id})
+
+    def worker():
+        try:
+            with span('request', kind='request', endpoint='/api/analyze/stream') as s:
+                result, cache_status, _ = run_cached_project_analysis(
+                    data,
+                    on_task_complete=lambda stage, output: events.put({'event': 'stage', 'stage': stage, 'output': output}),
+                    use_cache=cached,
+                    on_queue_update=lambda info: events.put({'event': 'queued', **info}),
+                    run_id=run_id,
+                )
+                s.set(cache=cache_status)
+            metrics.REQUEST_LATENCY.labels(endpoint='/api/analyze/stream', cache=cache_status).observe(s.duration)
+            events.put({'event': 'done', 'success': True, 'result': result, 'cache': cache_status})
+        except RunCancelled as e:
+            events.put({'event': 'cancelled', 'success': False, 'error': str(e)})
+        except Exception as e:
+            import traceback
+            events.put({'event': 'error', 'success': False, 'error': str(e), 'traceback': traceback.format_exc()})
+
+    threading.Thread(target=worker, name='crew-stream', daemon=True).start()
+
+    def generate():
+        finished = False
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield '\n'
+                    continue
+                yield json.dumps(event, default=str) + '\n'
+                if event['event'] in ('done', 'error', 'cancelled'):
+                    finished = True
+                    break
+        finally:
+            if not finished:
+                cancel_registry.cancel(run_id, 'client disconnected')
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/analyze/<run_id>/cancel', methods=['POST'])
+def cancel_analysis(run_id):
+    """Stop a running (or queued) analysis by its run id, whichever worker runs it."""
+    running_here = cancel_registry.cancel(run_id)
+    return jsonify({'success': True, 'run_id': run_id, 'running_here': running_here}), 202
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """JSONL project forms in, one NDJSON result line per record out as each completes.
+
+    ``?offset=N`` skips the first N records so an interrupted batch can be resumed.
+    """
+    offset = request.args.get('offset', 0, type=int)
+    concurrency = min(request.args.get('concurrency', BATCH_CONCURRENCY, type=int), BATCH_CONCURRENCY)
+    if offset < 0 or concurrency < 1:
+        return jsonify({'success': False, 'error': 'offset must be >= 0 and concurrency >= 1.'}), 400
+
+    def generate():
+        records = iter_jsonl(request.stream, offset=offset)
+        for entry in run_batch(records, concurrency=concurrency):
+            yield json.dumps(entry, default=str) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    data = request.json
+    try:
+        job_id = job_manager.submit(data)
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'}), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job id.'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if job_manager.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Unknown job id.'}), 404
+    if not job_manager.cancel(job_id):
+        return jsonify({'success': False, 'error': 'Job has already finished.'}), 409
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+@app.route('/metrics')
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, mimetype=content_type)
+
 @app.route('/')
 def serve_index():
     return send_from_directory(app.static_folder, 'index.html')
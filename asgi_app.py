@@ -0,0 +1,225 @@
+"""Async (ASGI) entry point serving the same analysis API and frontend as app.py.
+
+    uvicorn asgi_app:app --port 8000
+
+The cache lookup, the wait for an admission slot and the wait for a coalesced run happen on
+the event loop, so queued, coalesced or streaming requests cost a coroutine, not a thread
+(short SQLite reads and writes use the loop's default executor). crewai runs agents
+synchronously, so an admitted analysis takes a worker thread (at most ASGI_CREW_THREADS at
+once) for as long as it executes; its LLM calls are performed as ``litellm.acompletion`` on
+this server's event loop (backend/llms/aio.py).
+"""
+import os
+import json
+import uuid
+import asyncio
+import traceback
+import contextvars
+from contextlib import asynccontextmanager
+
+ASGI_CREW_THREADS = int(os.getenv('ASGI_CREW_THREADS', '32'))  # analyses executing at once per process
+# Waiting here costs a coroutine, not a thread: admit as many runs as there are crew threads and
+# let hundreds queue (app.py keeps the thread-per-request defaults of backend/jobs/admission.py)
+os.environ.setdefault('ANALYSIS_CONCURRENCY', str(ASGI_CREW_THREADS))
+os.environ.setdefault('ADMISSION_QUEUE_LIMIT', '1000')
+
+import anyio
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse, FileResponse
+from starlette.routing import Route, Mount
+from starlette.staticfiles import StaticFiles
+
+from backend.cache.cache import CACHE_ENABLED
+from backend.observability.tracing import span
+from backend.observability import metrics
+from backend.llms.ratelimit import ProviderRateLimited
+from backend.jobs.admission import AdmissionQueueFull
+from backend.logs.logs import configure_logging
+from backend.pipeline.cancellation import cancel_registry, RunCancelled, RunIdInUse, RUN_ID_PATTERN
+
+STREAM_HEARTBEAT = float(os.getenv('STREAM_HEARTBEAT', '5'))     # seconds between keep-alive lines
+DISCONNECT_POLL = 1.0
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend')
+
+configure_logging()
+
+crew_threads = None
+
+
+async def run_cached_project_analysis(data, **kwargs):
+    from backend.agents.agents import run_cached_project_analysis_async as run
+    return await run(data, run_in_crew_thread, **kwargs)
+
+
+async def new_run_id(request):
+    """The id the client can cancel its run by: a server-generated uuid4 hex, or the client's own
+    ``X-Run-Id`` (validated as in app.py). Raises ValueError / RunIdInUse."""
+    run_id = request.headers.get('x-run-id')
+    if run_id is None:
+        return uuid.uuid4().hex
+    if not RUN_ID_PATTERN.fullmatch(run_id):
+        raise ValueError('X-Run-Id must be 32 lowercase hex digits (e.g. a uuid4 hex).')
+    if not await asyncio.to_thread(cancel_registry.claim, run_id):
+        raise RunIdInUse('X-Run-Id has already been used; send a fresh one.')
+    return run_id
+
+
+def run_id_error(e):
+    return JSONResponse({'success': False, 'error': str(e)}, status_code=409 if isinstance(e, RunIdInUse) else 400)
+
+
+async def cancel_on_disconnect(request, run_id):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL)
+    await asyncio.to_thread(cancel_registry.cancel, run_id, 'client disconnected')
+
+
+def use_cache(request):
+    """Clients can skip the result cache lookup with 'Cache-Control: no-cache'."""
+    return CACHE_ENABLED and 'no-cache' not in request.headers.get('cache-control', '')
+
+
+async def run_in_crew_thread(func, *args):
+    """Run an admitted crew in one of the ASGI_CREW_THREADS threads, with this task's context."""
+    context = contextvars.copy_context()
+    return await anyio.to_thread.run_sync(context.run, func, *args, limiter=crew_threads)
+
+
+async def analyze(request):
+    data = await request.json()
+    cached = use_cache(request)
+    try:
+        run_id = await new_run_id(request)
+    except ValueError as e:
+        return run_id_error(e)
+    queue_info = {}
+
+    watcher = asyncio.ensure_future(cancel_on_disconnect(request, run_id))
+    try:
+        with span('request', kind='request', endpoint='/api/analyze') as s:
+            result, cache_status, key = await run_cached_project_analysis(data, use_cache=cached,
+                                                                          on_queue_update=queue_info.update,
+                                                                          run_id=run_id)
+            s.set(cache=cache_status)
+        metrics.REQUEST_LATENCY.labels(endpoint='/api/analyze', cache=cache_status).observe(s.duration)
+    except RunCancelled as e:
+        return JSONResponse({'success': False, 'cancelled': True, 'error': str(e)}, status_code=409)
+    except AdmissionQueueFull as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=503)
+    except ProviderRateLimited as e:
+        headers = {'Retry-After': str(int(e.retry_after + 1))} if e.retry_after else None
+        return JSONResponse({'success': False, 'error': str(e), 'retry_after': e.retry_after},
+                            status_code=429, headers=headers)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e), 'traceback': traceback.format_exc()})
+    finally:
+        watcher.cancel()
+    headers = {'X-Cache': cache_status, 'X-Cache-Key': key[:16], 'X-Run-Id': run_id}
+    if queue_info:
+        headers['X-Queue-Wait'] = str(queue_info['waited'])
+    return Response(json.dumps({'success': True, 'result': result}, default=str),
+                    media_type='application/json', headers=headers)
+
+
+async def analyze_stream(request):
+    """Same analysis as /api/analyze, streamed as NDJSON: one line per finished stage, then the result."""
+    data = await request.json()
+    cached = use_cache(request)
+    try:
+        run_id = await new_run_id(request)
+    except ValueError as e:
+        return run_id_error(e)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    events.put_nowait({'event': 'started', 'run_id': run_id})
+
+    def emit(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def run():
+        try:
+            with span('request', kind='request', endpoint='/api/analyze/stream') as s:
+                result, cache_status, _ = await run_cached_project_analysis(
+                    data,
+                    on_task_complete=lambda stage, output: emit({'event': 'stage', 'stage': stage, 'output': output}),
+                    use_cache=cached,
+                    on_queue_update=lambda info: emit({'event': 'queued', **info}),
+                    run_id=run_id,
+                )
+                s.set(cache=cache_status)
+            metrics.REQUEST_LATENCY.labels(endpoint='/api/analyze/stream', cache=cache_status).observe(s.duration)
+            emit({'event': 'done', 'success': True, 'result': result, 'cache': cache_status})
+        except RunCancelled as e:
+            emit({'event': 'cancelled', 'success': False, 'error': str(e)})
+        except Exception as e:
+            emit({'event': 'error', 'success': False, 'error': str(e), 'traceback': traceback.format_exc()})
+
+    task = asyncio.ensure_future(run())
+
+    async def generate():
+        finished = False
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield '\n'
+                    continue
+                yield json.dumps(event, default=str) + '\n'
+                if event['event'] in ('done', 'error', 'cancelled'):
+                    finished = True
+                    break
+            await task
+        finally:
+            # Also reached when Starlette stops the stream because the client disconnected
+            if not finished:
+                # Handed to an executor thread without awaiting it: the stream's scope may
+                # already be cancelled, and the SQLite write must not block the loop
+                loop.run_in_executor(None, cancel_registry.cancel, run_id, 'client disconnected')
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def cancel_analysis(request):
+    """Stop a running (or queued) analysis by its run id, whichever worker runs it."""
+    run_id = request.path_params['run_id']
+    running_here = await anyio.to_thread.run_sync(cancel_registry.cancel, run_id)
+    return JSONResponse({'success': True, 'run_id': run_id, 'running_here': running_here}, status_code=202)
+
+
+async def prometheus_metrics(request):
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+async def serve_index(request):
+    return FileResponse(os.path.join(FRONTEND_DIR, 'index.html'))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global crew_threads
+    from backend.llms import aio
+    from backend.server.startup import init_worker
+    crew_threads = anyio.CapacityLimiter(ASGI_CREW_THREADS)
+    await anyio.to_thread.run_sync(init_worker)
+    await aio.attach()
+    try:
+        yield
+    finally:
+        await aio.detach()
+
+
+app = Starlette(routes=[
+    Route('/api/analyze', analyze, methods=['POST']),
+    Route('/api/analyze/stream', analyze_stream, methods=['POST']),
+    Route('/api/analyze/{run_id}/cancel', cancel_analysis, methods=['POST']),
+    Route('/metrics', prometheus_metrics),
+    Route('/', serve_index),
+    Mount('/', StaticFiles(directory=FRONTEND_DIR)),
+], middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+   lifespan=lifespan)
@@ -1,152 +1,502 @@
 import os
-from crewai import Agent, Task, Crew, Process
-from typing import List, Literal, Type
-import json
-from backend.tools.tools import *
-from backend.llms.llm import get_llms
-import litellm
-litellm.set_verbose = True
-
-
-
-
-
-def run_project_analysis(data):
-    project_name = data.get('project_name')
-    project_description = data.get('project_description')
-    project_type = data.get('project_type')
-    timeline = data.get('timeline')
-    budget_range = data.get('budget_range')
-    priority = data.get('priority')
-    tech_requirements = data.get('tech_requirements', '')
-    special_considerations = data.get('special_considerations', '')
-    groq_api_key = data.get('groq_api_key')
-    model_name = 'gemma2-9b-it'  # Use a Groq-supported model name
-
-    # Dynamically get LLMs with the correct API key
-    llms = get_llms(groq_api_key=groq_api_key, model_name=model_name)
-    ceo_llm = llms['ceo_llm']
-    cto_llm = llms['cto_llm']
-    pm_llm = llms['pm_llm']
-    dev_llm = llms['dev_llm']
-    client_llm = llms['client_llm']
-
-    analyze_tool = AnalyzeProjectRequirements()
-    spec_tool = CreateTechnicalSpecification()
-
-    ceo = Agent(
-        role="Project Director (CEO)",
-        goal=f"""Analyze the provided project details (name: {project_name}, description: {project_description}, type: {project_type}, budget: {budget_range}) using the AnalyzeProjectRequirementsTool.\nYour final output must be the structured project analysis data as per the ProjectAnalysisOutput model.\nProvide a brief summary of your strategic assessment based on this analysis.""",
-        backstory="You are a seasoned CEO with extensive experience in evaluating project feasibility and strategic alignment. You are meticulous and data-driven.",
-        tools=[analyze_tool],
-        llm=ceo_llm,
-        verbose=True,
-        allow_delegation=False
-    )
+import asyncio
+import functools
+import threading
+from crewai import Task
+from crewai.tasks.task_output import TaskOutput
+from backend.tools.tools import ProjectAnalysisOutput, TechnicalSpecificationOutput
+from backend.llms.llm import get_llms, resolve_api_key
+from backend.llms.routing import MODEL_ROUTES, routes_signature, route_decision, use_route
+from backend.llms.deadlines import deadline, remaining, stage_deadline, DeadlineExceeded, RUN_DEADLINE
+from backend.context.context import RunContext, use_run_context
+from backend.context.budget import ContextBudgeter
+from backend.agents.templates import clone_stage, clone_crew
+from backend.agents.fast_path import run_fast_stage, FAST_PATH_STAGES
+from backend.pipeline.pipeline import run_dag, validate_graph, PIPELINE_PARALLELISM
+from backend.observability.tracing import span
+from backend.observability.metrics import STAGE_LATENCY, ANALYSES_IN_FLIGHT, STAGE_ROLES, DEGRADED_RUNS, COALESCED_REQUESTS
+from backend.jobs.admission import admission
+from backend.cache.cache import result_cache, stage_cache, cache_key, FORM_FIELDS, CACHE_ENABLED
+from backend.pipeline.cancellation import cancel_registry, check_cancelled
+from backend.server.crew_pool import crew_pool, CREW_POOL_SIZE
+from backend.cache.singleflight import single_flight, SINGLE_FLIGHT, LEADER, REMOTE_FOLLOWER
+from backend.logs.logs import capture_failures
 
-    cto = Agent(
-        role="Technical Architect (CTO)",
-        goal="""Based on the project analysis provided by the CEO, create a detailed technical specification using the CreateTechnicalSpecificationTool.\nYou will receive the project analysis as a JSON string. Use this to determine the architecture_type, core_technologies, and scalability_requirements.\nYour final output must be the structured technical specification data as per the TechnicalSpecificationOutput model.\nProvide a brief summary of your technical recommendations.""",
-        backstory="You are a highly experienced Technical Architect with a deep understanding of various system architectures, technologies, and scalability patterns. You translate project needs into robust technical plans.",
-        tools=[spec_tool],
-        llm=cto_llm,
-        verbose=True,
-        allow_delegation=False
-    )
+# Result keys of the five pipeline stages, in execution order
+STAGE_NAMES = ['ceo', 'cto', 'pm', 'dev', 'client']
 
-    product_manager = Agent(
-        role="Product Manager",
-        goal="""Based on the project information, CEO's analysis, and CTO's technical specification, develop a high-level product roadmap.\nDefine potential core product features and outline a phased approach if applicable.\nFocus on product-market fit and initial go-to-market considerations.""",
-        backstory="You are an experienced Product Manager skilled in defining product vision, strategy, and roadmaps, ensuring alignment with business goals and market needs.",
-        llm=pm_llm,
-        verbose=True
-    )
+# Form fields each stage reads directly, and the stages whose output it receives as context.
+# The CEO only sees name/description/type/budget and the CTO only sees the CEO's analysis,
+# so edits to timeline, priority or the free-text fields leave both reusable.
+STAGE_INPUTS = {
+    'ceo': ['project_name', 'project_description', 'project_type', 'budget_range'],
+    'cto': [],
+    'pm': FORM_FIELDS,
+    'dev': FORM_FIELDS,
+    'client': FORM_FIELDS,
+}
+STAGE_DEPENDENCIES = {
+    'ceo': [],
+    'cto': ['ceo'],
+    'pm': ['ceo', 'cto'],
+    'dev': ['ceo', 'cto', 'pm'],
+    'client': ['ceo', 'cto', 'pm', 'dev'],
+}
 
-    developer = Agent(
-        role="Lead Developer",
-        goal="""Based on the project information, CEO's analysis, CTO's technical specification, and Product Manager's roadmap, provide an initial technical implementation plan.\nOutline key development phases, suggest a core tech stack (complementing CTO's choices), identify potential technical challenges, and give a rough effort estimation breakdown.\nConsider cloud service costs if applicable.""",
-        backstory="You are a Senior Full-Stack Developer with broad experience in implementing complex software projects. You are pragmatic and skilled in estimation and risk assessment.",
-        llm=dev_llm,
-        verbose=True
-    )
+# Task graphs ({stage: stages it takes as context}) selectable with the 'pipeline' form field
+# or PIPELINE_MODE. Every graph is run by the DAG scheduler, which starts each stage as a
+# one-task crew as soon as its dependencies are done: one at a time for 'sequential', at most
+# PIPELINE_PARALLELISM at a time otherwise. In 'dag' the Dev plan only needs the CEO analysis
+# and CTO spec, so it runs alongside the PM roadmap and the client strategy takes all four.
+# In 'fanout' the client strategy only needs the CEO analysis and CTO spec too, so it runs
+# alongside the PM roadmap and Dev plan.
+PIPELINES = {
+    'sequential': STAGE_DEPENDENCIES,
+    'dag': {
+        'ceo': [],
+        'cto': ['ceo'],
+        'pm': ['ceo', 'cto'],
+        'dev': ['ceo', 'cto'],
+        'client': ['ceo', 'cto', 'pm', 'dev'],
+    },
+    'fanout': {
+        'ceo': [],
+        'cto': ['ceo'],
+        'pm': ['ceo', 'cto'],
+        'dev': ['ceo', 'cto', 'pm'],
+        'client': ['ceo', 'cto'],
+    },
+}
+for _graph in PIPELINES.values():
+    validate_graph(_graph)
+
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'sequential')
+
+# Opt-in (form field 'fast_path' or FAST_PATH=1): build the CEO/CTO structured outputs directly
+# instead of letting their agents reach them through several tool-calling LLM turns.
+FAST_PATH = os.getenv('FAST_PATH', '0') in ('1', 'true', 'True')
+
+# How each upstream stage is referred to in downstream task descriptions
+CONTEXT_LABELS = {
+    'ceo': "CEO's analysis",
+    'cto': "CTO's technical specification",
+    'pm': "PM's roadmap",
+    'dev': "Developer's plan",
+}
+
+# Token budget for the upstream context handed to each downstream stage (0 = pass full outputs)
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+STAGE_CONTEXT_BUDGETS = {
+    'pm': CONTEXT_TOKEN_BUDGET,
+    'dev': CONTEXT_TOKEN_BUDGET,
+    'client': CONTEXT_TOKEN_BUDGET,
+}
+
+STAGE_OUTPUT_MODELS = {
+    'ceo': ProjectAnalysisOutput,
+    'cto': TechnicalSpecificationOutput,
+}
+
+
+def format_task_output(output):
+    """Convert a crewai TaskOutput (or None) into the JSON-friendly dict returned to clients."""
+    if output:
+        return {
+            'raw_output': getattr(output, 'raw_output', str(output)),
+            'exported_output': getattr(output, 'exported_output', None)
+        }
+    return {'raw_output': None, 'exported_output': None}
+
+
+def describe_context(deps):
+    """Render the "CEO's analysis (context: '{@ceo_task}'), and ..." lines for a task description."""
+    lines = [f"{CONTEXT_LABELS[dep]} (context: '{{@{dep}_task}}')" for dep in deps]
+    if len(lines) > 1:
+        return ',\n'.join(lines[:-1]) + ', and\n' + lines[-1]
+    return lines[0] if lines else ''
+
+
+def describe_upstream(deps):
+    """Render "the project information, CEO's analysis, and ..." for an agent goal."""
+    names = ['the project information'] + [CONTEXT_LABELS[dep] for dep in deps]
+    if len(names) > 2:
+        return ', '.join(names[:-1]) + ', and ' + names[-1]
+    return ' and '.join(names)
+
+
+def stage_inputs(inputs, deps):
+    """``inputs`` plus the placeholders describing the upstream stages one stage receives in its graph."""
+    return dict(inputs, context=describe_context(deps), upstream=describe_upstream(deps))
 
-    client_manager = Agent(
-        role="Client Success Manager",
-        goal="""Based on all available project information (initial details, CEO analysis, CTO spec, PM roadmap, Dev plan), outline a client engagement and success strategy.\nFocus on communication, expectation management, feedback loops, and key milestones for client review.\nSuggest a preliminary go-to-market and customer acquisition outline from a client success perspective.""",
-        backstory="You are an experienced Client Success Manager dedicated to ensuring client satisfaction and successful project delivery through proactive communication and strategic guidance.",
-        llm=client_llm,
-        verbose=True
-    )
 
+def format_project_info(project_info):
+    """One line per filled-in form field; cheaper than the dict repr and skips empty fields."""
+    return '\n'.join(f"- {name}: {value}" for name, value in project_info.items() if value)
+
+
+def template_inputs(data):
+    """Values for the agent/task template placeholders (see backend/agents/templates.py)."""
     project_info = {
-        "name": project_name,
-        "description": project_description,
-        "type": project_type,
-        "timeline": timeline,
-        "budget": budget_range,
-        "priority": priority,
-        "technical_requirements": tech_requirements,
-        "special_considerations": special_considerations
+        "name": data.get('project_name'),
+        "description": data.get('project_description'),
+        "type": data.get('project_type'),
+        "timeline": data.get('timeline'),
+        "budget": data.get('budget_range'),
+        "priority": data.get('priority'),
+        "technical_requirements": data.get('tech_requirements', ''),
+        "special_considerations": data.get('special_considerations', '')
+    }
+    return {
+        'project_name': project_info['name'],
+        'project_description': project_info['description'],
+        'project_type': project_info['type'],
+        'budget_range': project_info['budget'],
+        'project_info': format_project_info(project_info),
     }
 
-    ceo_task = Task(
-        description=f"""Analyze the following project and produce a structured analysis:\nProject Name: {project_name}\nProject Description: {project_description}\nProject Type: {project_type}\nBudget Range: {budget_range}\nYour output should be the structured ProjectAnalysisOutput and a brief strategic summary.""",
-        expected_output="A ProjectAnalysisOutput object containing the detailed analysis, and a brief textual summary of strategic insights.",
-        agent=ceo,
-        output_pydantic=ProjectAnalysisOutput
-    )
 
-    cto_task = Task(
-        description=f"""Given the project analysis from the CEO (available as '{{@ceo_task}}'), create a technical specification.\nYou must convert the CEO's analysis (which will be a ProjectAnalysisOutput object from the context) into a JSON string to pass to the 'project_analysis_json' parameter of your CreateTechnicalSpecificationTool.\nChoose appropriate architecture, core technologies, and scalability requirements based on the analysis.\nYour output should be the structured TechnicalSpecificationOutput and a brief technical summary.""",
-        expected_output="A TechnicalSpecificationOutput object containing the detailed technical specification, and a brief textual summary of technical recommendations.",
-        agent=cto,
-        context=[ceo_task],
-        output_pydantic=TechnicalSpecificationOutput
-    )
+def stage_cache_keys(data, routes=MODEL_ROUTES, graph=STAGE_DEPENDENCIES, fast_path=False):
+    """Key every stage on its own inputs and model route plus the keys of the stages it depends on."""
+    keys = {}
+    for stage_name in STAGE_NAMES:
+        upstream = ','.join(keys[dep] for dep in graph[stage_name])
+        keys[stage_name] = cache_key(data, fields=STAGE_INPUTS[stage_name], model=routes_signature(routes, [stage_name]),
+                                     stage=stage_name, upstream=upstream,
+                                     fast_path=fast_path and stage_name in FAST_PATH_STAGES)
+    return keys
 
-    pm_task = Task(
-        description=f"""Based on project information: {str(project_info)},\nCEO's analysis (context: '{{@ceo_task}}'), and\nCTO's technical specification (context: '{{@cto_task}}'),\ndevelop a high-level product roadmap and define potential core features.""",
-        expected_output="A textual high-level product roadmap, list of potential core features, and initial go-to-market considerations.",
-        agent=product_manager,
-        context=[ceo_task, cto_task]
-    )
 
-    dev_task = Task(
-        description=f"""Based on project information: {str(project_info)},\nCEO's analysis (context: '{{@ceo_task}}'),\nCTO's technical specification (context: '{{@cto_task}}'), and\nPM's roadmap (context: '{{@pm_task}}'),\nprovide an initial technical implementation plan, tech stack suggestions, identify challenges, and estimate effort. Include potential cloud costs.""",
-        expected_output="A textual technical implementation plan, tech stack ideas, challenge list, effort estimates, and cloud cost considerations.",
-        agent=developer,
-        context=[ceo_task, cto_task, pm_task]
-    )
+def stage_cache_entry(output):
+    """What is kept per stage: enough to rebuild the TaskOutput used as downstream context."""
+    pydantic_output = getattr(output, 'pydantic', None)
+    return {
+        'raw': getattr(output, 'raw', None) or str(output),
+        'pydantic': pydantic_output.model_dump() if pydantic_output is not None else None,
+        'output': format_task_output(output),
+    }
 
-    client_task = Task(
-        description=f"""Based on all project information: {str(project_info)},\nCEO's analysis (context: '{{@ceo_task}}'),\nCTO's specification (context: '{{@cto_task}}'),\nPM's roadmap (context: '{{@pm_task}}'), and\nDeveloper's plan (context: '{{@dev_task}}'),\noutline a client engagement and success strategy, including communication, expectation management, and go-to-market ideas.""",
-        expected_output="A textual client engagement strategy, communication plan, and preliminary go-to-market outline.",
-        agent=client_manager,
-        context=[ceo_task, cto_task, pm_task, dev_task]
-    )
 
-    project_crew = Crew(
-        agents=[ceo, cto, product_manager, developer, client_manager],
-        tasks=[ceo_task, cto_task, pm_task, dev_task, client_task],
-        process=Process.sequential,
-        verbose=True
+def restore_task_output(stage_name, task, entry):
+    model = STAGE_OUTPUT_MODELS.get(stage_name)
+    return TaskOutput(
+        description=task.description,
+        raw=entry['raw'],
+        pydantic=model(**entry['pydantic']) if model and entry.get('pydantic') else None,
+        agent=task.agent.role,
     )
 
-    crew_result = project_crew.kickoff()
 
-    def get_output(task):
-        if task.output:
-            return {
-                'raw_output': getattr(task.output, 'raw_output', str(task.output)),
-                'exported_output': getattr(task.output, 'exported_output', None)
-            }
-        return {'raw_output': None, 'exported_output': None}
+def record_stage_result(run_context, stage_name, output):
+    """Make a finished stage's typed output (if any) available to the tools of later stages."""
+    structured = getattr(output, 'pydantic', None)
+    if structured is not None:
+        run_context.set(stage_name, structured)
+
+
+def fast_path_for(data):
+    value = data.get('fast_path', FAST_PATH)
+    return value in (True, 1, '1', 'true', 'True')
+
+
+def pipeline_mode_for(data):
+    mode = data.get('pipeline') or PIPELINE_MODE
+    if mode not in PIPELINES:
+        raise ValueError(f"Unknown pipeline '{mode}'. Choose one of: {', '.join(PIPELINES)}.")
+    return mode
+
+
+def run_single_task(stage_name, task):
+    """Execute one stage's task as its own single-task crew; its context tasks must already have output."""
+    crew = clone_crew(stage_name, task)
+    crew.kickoff()
+    return task.output
+
+
+def run_project_analysis(data, on_task_complete=None, use_cache=CACHE_ENABLED):
+    """Run the five-agent crew for one project form.
+
+    ``on_task_complete(stage_name, output_dict)`` is called as soon as each stage finishes.
+    Stages whose inputs (and upstream stages) are unchanged since a previous run are
+    restored from the stage cache instead of being executed again. Stages still unfinished
+    when RUN_DEADLINE (or their own stage deadline) passes are listed under
+    ``incomplete_stages`` and the rest of the result is returned as is.
+    """
+    ANALYSES_IN_FLIGHT.inc()
+    try:
+        # This run's credentials and routes, plus the typed stage results shared with the tools
+        # (so the CTO tool reads the CEO's analysis directly). Nothing here is process-global,
+        # so concurrent runs in one worker cannot see each other's keys.
+        run_context = RunContext(api_key=resolve_api_key(data.get('groq_api_key')), routes=MODEL_ROUTES)
+        with capture_failures(), deadline(RUN_DEADLINE) as run_deadline, use_run_context(run_context), \
+                span('analysis', kind='analysis', project=data.get('project_name')) as analysis_span:
+            result = _run_project_analysis(data, run_context, on_task_complete, use_cache, run_deadline)
+            analysis_span.set(reused_stages=result['reused_stages'], fast_path_stages=result['fast_path_stages'],
+                              pipeline=result['pipeline'], incomplete_stages=result['incomplete_stages'])
+            return result
+    finally:
+        ANALYSES_IN_FLIGHT.dec()
+
+
+def run_stage(stage_name, task, source='agent', route=None):
+    """Execute one stage inside a 'task' span and record its latency for the stage's role.
+
+    ``route`` is the stage's routing decision; LLM calls fall back on it and record the outcome.
+    LLM calls are bounded by the stage's deadline; missing it raises DeadlineExceeded.
+    A cancelled run does not start the stage (RunCancelled).
+    """
+    check_cancelled()
+    with use_route(route), deadline(stage_deadline(stage_name)), \
+            span('task', kind='task', stage=stage_name, role=STAGE_ROLES[stage_name], source=source) as s:
+        try:
+            output = run_single_task(stage_name, task)
+        except Exception as e:
+            # crewai may wrap the error raised by the LLM wrapper
+            if remaining() == 0 and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded(f"Stage '{stage_name}' did not finish before its deadline.") from e
+            raise
+    STAGE_LATENCY.labels(role=STAGE_ROLES[stage_name], source=source).observe(s.duration)
+    return output
+
+
+def _run_project_analysis(data, run_context, on_task_complete, use_cache, run_deadline=None):
+    pipeline_mode = pipeline_mode_for(data)
+    graph = PIPELINES[pipeline_mode]
+    fast_path = fast_path_for(data)
+    routes = run_context.routes
+
+    # LLM handles with the run's API key, each on its stage's routed model
+    llms = get_llms(groq_api_key=run_context.api_key, routes=routes)
+    routing = {stage_name: route_decision(routes[stage_name]) for stage_name in STAGE_NAMES}
+
+    # Each run clones its agents and tasks from the per-process prototypes
+    inputs = template_inputs(data)
+    tasks = {}
+    for stage_name in STAGE_NAMES:
+        _, tasks[stage_name] = clone_stage(stage_name, stage_inputs(inputs, graph[stage_name]),
+                                           llms[f'{stage_name}_llm'], run_context)
+    # Budgeted stages get a single digest task as context instead of every upstream task;
+    # its output is filled in by prepare_contexts() once all of the stage's inputs exist.
+    digest_tasks = {}
+    for stage_name, deps in graph.items():
+        if deps and STAGE_CONTEXT_BUDGETS.get(stage_name):
+            digest_tasks[stage_name] = Task(
+                description=f"Condensed upstream context for the {stage_name} stage",
+                expected_output="Context digest",
+                agent=tasks[stage_name].agent,
+            )
+            tasks[stage_name].context = [digest_tasks[stage_name]]
+        elif deps:
+            tasks[stage_name].context = [tasks[dep] for dep in deps]
+    keys = stage_cache_keys(data, routes, graph, fast_path)
+    context_tokens = {}
+    digest_lock = threading.Lock()
+
+    def prepare_contexts():
+        with digest_lock:
+            for stage_name, digest_task in digest_tasks.items():
+                deps = graph[stage_name]
+                if digest_task.output is not None or any(tasks[dep].output is None for dep in deps):
+                    continue
+                sections = [(CONTEXT_LABELS[dep], getattr(tasks[dep].output, 'raw', None) or str(tasks[dep].output),
+                             run_context.get(dep)) for dep in deps]
+                budgeter = ContextBudgeter(STAGE_CONTEXT_BUDGETS[stage_name])
+                text, context_tokens[stage_name] = budgeter.build(sections, tasks[stage_name].description)
+                digest_task.output = TaskOutput(description=digest_task.description, raw=text,
+                                                agent=tasks[stage_name].agent.role)
+
+    def stage_callback(stage_name, cache=True):
+        def callback(output):
+            tasks[stage_name].output = output
+            record_stage_result(run_context, stage_name, output)
+            prepare_contexts()
+            if cache:
+                stage_cache.set(keys[stage_name], stage_cache_entry(output))
+            if on_task_complete:
+                on_task_complete(stage_name, format_task_output(output))
+        return callback
+
+    def run_fast(stage_name):
+        check_cancelled()
+        task = tasks[stage_name]
+        with use_route(routing[stage_name]), deadline(stage_deadline(stage_name)), \
+                span('task', kind='task', stage=stage_name, role=STAGE_ROLES[stage_name], source='fast_path') as s:
+            output, fallback = run_fast_stage(stage_name, task, data, run_context, llms[f'{stage_name}_llm'],
+                                              routing[stage_name]['model'])
+            s.set(fallback=fallback)
+        STAGE_LATENCY.labels(role=STAGE_ROLES[stage_name], source='fast_path').observe(s.duration)
+        fast_stages.append(stage_name)
+        if fallback:
+            fast_fallbacks.append(stage_name)
+        # Defaults stand in for an unusable reply: not cached as if the model had chosen them
+        stage_callback(stage_name, cache=not fallback)(output)
+
+    # A stage is reused only if it is cached and every stage it depends on is reused too.
+    # Fast-path stages run without an agent once their inputs are ready (reused or fast-path).
+    reused, fast, fast_stages, fast_fallbacks = [], [], [], []
+    for stage_name, task in tasks.items():
+        entry = stage_cache.get(keys[stage_name]) if use_cache else None
+        if entry is not None and all(dep in reused for dep in graph[stage_name]):
+            task.output = restore_task_output(stage_name, task, entry)
+            record_stage_result(run_context, stage_name, task.output)
+            reused.append(stage_name)
+            if on_task_complete:
+                on_task_complete(stage_name, entry['output'])
+        elif fast_path and stage_name in FAST_PATH_STAGES and all(dep in reused + fast for dep in graph[stage_name]):
+            fast.append(stage_name)
+        else:
+            task.callback = stage_callback(stage_name)
+
+    prepare_contexts()
+    pending = [stage_name for stage_name in STAGE_NAMES if stage_name not in reused]
+    if pending:
+        # 'sequential' is the same scheduler with one stage at a time. Reused tasks stay in the
+        # context of the pending ones, so their outputs still flow downstream.
+        parallelism = 1 if pipeline_mode == 'sequential' else PIPELINE_PARALLELISM
+        # A stage (fast-path ones included) that misses its deadline is dropped with its
+        # dependents; once the run deadline passes, the stages finished so far are returned.
+        run_dag(graph, lambda stage_name: run_fast(stage_name) if stage_name in fast else
+                run_stage(stage_name, tasks[stage_name], route=routing[stage_name]),
+                completed=reused, max_parallel=parallelism, deadline=run_deadline, tolerate=(DeadlineExceeded,))
+    crew_result = tasks['client'].output
+    incomplete = [stage_name for stage_name in STAGE_NAMES if tasks[stage_name].output is None]
+    if incomplete:
+        DEGRADED_RUNS.inc()
 
     return {
-        'ceo': get_output(ceo_task),
-        'cto': get_output(cto_task),
-        'pm': get_output(pm_task),
-        'dev': get_output(dev_task),
-        'client': get_output(client_task),
-        'crew_result': str(crew_result)
-    }
\ No newline at end of file
+        'ceo': format_task_output(tasks['ceo'].output),
+        'cto': format_task_output(tasks['cto'].output),
+        'pm': format_task_output(tasks['pm'].output),
+        'dev': format_task_output(tasks['dev'].output),
+        'client': format_task_output(tasks['client'].output),
+        'crew_result': str(crew_result) if crew_result is not None else '',
+        'reused_stages': reused,
+        'fast_path_stages': fast_stages,
+        'fast_path_fallbacks': fast_fallbacks,
+        'pipeline': pipeline_mode,
+        'context_tokens': context_tokens,
+        'routing': {stage_name: routing[stage_name] for stage_name in STAGE_NAMES if stage_name not in reused},
+        'incomplete_stages': incomplete,
+        'degraded': bool(incomplete)
+    }
+
+
+def run_cached_project_analysis(data, on_task_complete=None, use_cache=CACHE_ENABLED, on_queue_update=None,
+                                run_id=None):
+    """Serve the analysis from the result cache when possible, otherwise run the crew and store it.
+
+    Returns ``(result, cache_status, key)`` where cache_status is 'HIT', 'MISS', 'BYPASS' or
+    'COALESCED'. Stage callbacks are replayed from the cached result on a hit. A request
+    identical to one already running (in any worker) joins that run instead of starting its
+    own, and gets its stage callbacks, result or error. Crew runs wait for a slot in the
+    priority admission queue (by the form's priority); ``on_queue_update`` receives their
+    queue position and estimated wait. ``cancel_registry.cancel(run_id)`` makes this request
+    stop waiting with RunCancelled; a coalesced run itself stops once no request waits for it.
+    """
+    key = analysis_key(data)
+    if use_cache:
+        cached = cached_result(key, on_task_complete)
+        if cached is not None:
+            return cached, 'HIT', key
+    cache_status = 'MISS' if use_cache else 'BYPASS'
+    with cancel_registry.run(run_id):
+        return run_coalesced(data, key, cache_status, on_task_complete, use_cache, on_queue_update)
+
+
+async def run_cached_project_analysis_async(data, run_sync, on_task_complete=None, use_cache=CACHE_ENABLED,
+                                            on_queue_update=None, run_id=None):
+    """run_cached_project_analysis for event-loop callers (asgi_app.py).
+
+    The cache lookup, the admission wait and waiting for a coalesced run happen on the loop
+    (their blocking SQLite calls in short-lived executor threads); only an admitted crew run
+    takes a thread, through ``await run_sync(func, *args)``.
+    """
+    key = analysis_key(data)
+    if use_cache:
+        cached = await asyncio.to_thread(cached_result, key, on_task_complete)
+        if cached is not None:
+            return cached, 'HIT', key
+    cache_status = 'MISS' if use_cache else 'BYPASS'
+    with cancel_registry.run(run_id):
+        if not SINGLE_FLIGHT:
+            result = await run_and_store_async(data, key, on_task_complete, use_cache, on_queue_update, run_sync)
+            return result, cache_status, key
+        flight, role = await asyncio.to_thread(single_flight.begin, key)
+        if role == LEADER:
+            single_flight.lead_async(flight, lambda on_stage: run_and_store_async(
+                data, key, on_stage, use_cache, on_queue_update, run_sync))
+        elif role == REMOTE_FOLLOWER:
+            COALESCED_REQUESTS.labels(scope='host').inc()
+            single_flight.follow_remote_async(flight)
+            cache_status = 'COALESCED'
+        else:
+            COALESCED_REQUESTS.labels(scope='worker').inc()
+            cache_status = 'COALESCED'
+        return await single_flight.wait_async(flight, on_task_complete, check=check_cancelled), cache_status, key
+
+
+def analysis_key(data):
+    return cache_key(data, model=routes_signature(MODEL_ROUTES), pipeline=pipeline_mode_for(data),
+                     fast_path=fast_path_for(data))
+
+
+def cached_result(key, on_task_complete=None):
+    """The cached result for ``key`` (its stages replayed to ``on_task_complete``), or None."""
+    cached = result_cache.get(key)
+    if cached is not None and on_task_complete:
+        for stage_name in STAGE_NAMES:
+            on_task_complete(stage_name, cached.get(stage_name))
+    return cached
+
+
+def run_coalesced(data, key, cache_status, on_task_complete, use_cache, on_queue_update):
+    """Run the analysis for ``key``, or join the identical one already running.
+
+    The run goes on in the background while any request waits for it, so cancelling the
+    request that started it does not fail the requests that joined it.
+    """
+    if not SINGLE_FLIGHT:
+        return run_and_store(data, key, on_task_complete, use_cache, on_queue_update), cache_status, key
+    flight, role = single_flight.begin(key)
+    if role == LEADER:
+        single_flight.lead(flight, lambda on_stage: run_and_store(data, key, on_stage, use_cache, on_queue_update))
+    elif role == REMOTE_FOLLOWER:
+        COALESCED_REQUESTS.labels(scope='host').inc()
+        single_flight.follow_remote(flight)
+        cache_status = 'COALESCED'
+    else:
+        COALESCED_REQUESTS.labels(scope='worker').inc()
+        cache_status = 'COALESCED'
+    return single_flight.wait(flight, on_task_complete, check=check_cancelled), cache_status, key
+
+
+def cacheable(result):
+    """Degraded results, and those built on fast-path default choices, are not stored."""
+    return not result['degraded'] and not result.get('fast_path_fallbacks')
+
+
+def cache_entry(result):
+    """What is stored for a result: everything but the ``memory`` report of the run that made it."""
+    return {name: value for name, value in result.items() if name != 'memory'}
+
+
+def run_and_store(data, key, on_task_complete, use_cache, on_queue_update):
+    """Run the crew once admitted (in a crew pool process if CREW_POOL_SIZE is set) and store
+    the result if it is ``cacheable``."""
+    with admission.slot(data.get('priority'), on_queue_update, check=check_cancelled):
+        if CREW_POOL_SIZE:
+            result = crew_pool.run(data, on_task_complete=on_task_complete, use_cache=use_cache)
+        else:
+            result = run_project_analysis(data, on_task_complete=on_task_complete, use_cache=use_cache)
+    if cacheable(result):
+        result_cache.set(key, cache_entry(result))
+    return result
+
+
+async def run_and_store_async(data, key, on_task_complete, use_cache, on_queue_update, run_sync):
+    """run_and_store for event-loop callers: waits for admission on the loop, then runs the crew via ``run_sync``."""
+    async with admission.slot_async(data.get('priority'), on_queue_update, check=check_cancelled):
+        run = crew_pool.run if CREW_POOL_SIZE else run_project_analysis
+        result = await run_sync(functools.partial(run, data, on_task_complete=on_task_complete, use_cache=use_cache))
+    if cacheable(result):
+        await asyncio.to_thread(result_cache.set, key, cache_entry(result))
+    return result
@@ -0,0 +1,129 @@
+import json
+import logging
+import litellm
+from crewai.tasks.task_output import TaskOutput
+from backend.tools.tools import AnalyzeProjectRequirements, CreateTechnicalSpecification, ProjectAnalysisOutput
+
+# Stages whose structured output can be produced without the agent's tool-calling loop
+FAST_PATH_STAGES = ['ceo', 'cto']
+
+ARCHITECTURE_TYPES = ["monolithic", "microservices", "serverless", "hybrid"]
+SCALABILITY_LEVELS = ["high", "medium", "low"]
+
+logger = logging.getLogger(__name__)
+
+# Used when the single JSON completion returns something unparseable or outside the tool's schema
+DEFAULT_TECH_CHOICES = {
+    "Web Application": ("monolithic", "React, Node.js, PostgreSQL", "medium"),
+    "Mobile App": ("serverless", "React Native, Firebase, Node.js", "medium"),
+    "API Development": ("microservices", "FastAPI, PostgreSQL, Docker", "high"),
+    "Data Analytics": ("hybrid", "Python, Apache Spark, PostgreSQL", "high"),
+    "AI/ML Solution": ("hybrid", "Python, PyTorch, FastAPI, Docker", "high"),
+    "Other": ("monolithic", "Python, PostgreSQL, Docker", "medium"),
+}
+
+
+def analyze_project(data):
+    """CEO stage: AnalyzeProjectRequirementsTool is deterministic, so call it directly."""
+    return AnalyzeProjectRequirements()._run(
+        project_name=data.get('project_name'),
+        project_description=data.get('project_description'),
+        project_type=data.get('project_type'),
+        budget_range=data.get('budget_range'),
+    )
+
+
+def choose_tech(analysis, llm, api_key, model):
+    """Ask the CTO model once, in JSON mode, for the three arguments the spec tool needs.
+
+    ``model`` is the route's full litellm model id: crewai drops the provider prefix from
+    ``llm.model`` for the providers it has native clients for, which litellm then rejects.
+
+    Returns ``(choices, fallback)``: ``fallback`` is True when the reply was unusable and the
+    project type's DEFAULT_TECH_CHOICES are returned instead. Errors of the call itself
+    (deadline, rate limit, authentication, ...) propagate.
+    """
+    default = DEFAULT_TECH_CHOICES.get(analysis.analyzed_project_type, DEFAULT_TECH_CHOICES["Other"])
+    messages = [
+        {"role": "system", "content": "You are a Technical Architect. Reply with a JSON object only."},
+        {"role": "user", "content": (
+            f"Project analysis: {analysis.model_dump_json()}\n"
+            "Return JSON with keys: "
+            f"\"architecture_type\" (one of {ARCHITECTURE_TYPES}), "
+            "\"core_technologies\" (comma-separated list of main technologies and frameworks), "
+            f"\"scalability_requirements\" (one of {SCALABILITY_LEVELS})."
+        )},
+    ]
+    response = litellm.completion(
+        model=model,
+        api_key=api_key,
+        api_base=getattr(llm, 'base_url', None),
+        temperature=llm.temperature,
+        max_tokens=getattr(llm, 'max_tokens', None),
+        timeout=getattr(llm, 'timeout', None),
+        messages=messages,
+        response_format={"type": "json_object"},
+    )
+    try:
+        choice = json.loads(response.choices[0].message.content)
+        architecture = str(choice.get("architecture_type", "")).strip().lower()
+        technologies = choice.get("core_technologies", "")
+        if isinstance(technologies, list):
+            technologies = ", ".join(str(t) for t in technologies)
+        scalability = str(choice.get("scalability_requirements", "")).strip().lower()
+        if architecture in ARCHITECTURE_TYPES and scalability in SCALABILITY_LEVELS and technologies.strip():
+            return (architecture, technologies, scalability), False
+        logger.warning('Fast-path CTO reply is outside the schema (%r); using the %s defaults',
+                       choice, analysis.analyzed_project_type)
+    except (ValueError, TypeError, AttributeError, IndexError) as e:
+        logger.warning('Fast-path CTO reply is not usable JSON (%s); using the %s defaults',
+                       e, analysis.analyzed_project_type)
+    return default, True
+
+
+def create_specification(analysis, llm, run_context, model):
+    """CTO stage: one constrained completion, then the deterministic spec tool; returns ``(spec, fallback)``."""
+    (architecture, technologies, scalability), fallback = choose_tech(analysis, llm, run_context.api_key, model)
+    spec = CreateTechnicalSpecification(run_context=run_context)._run(
+        architecture_type=architecture,
+        core_technologies=technologies,
+        scalability_requirements=scalability,
+    )
+    return spec, fallback
+
+
+def fast_task_output(task, structured, summary):
+    """Wrap a structured result in a TaskOutput so downstream tasks get it as context."""
+    return TaskOutput(
+        description=task.description,
+        raw=f"{summary}\n{structured.model_dump_json(indent=2)}",
+        pydantic=structured,
+        agent=task.agent.role,
+    )
+
+
+def run_fast_stage(stage_name, task, data, run_context, llm, model):
+    """Produce the TaskOutput of a FAST_PATH_STAGES stage without running its agent (with the run's API key
+    and ``model``, the stage's routed litellm model id).
+
+    Returns ``(output, fallback)``; ``fallback`` marks an output built from default choices.
+    """
+    if stage_name == 'ceo':
+        analysis = analyze_project(data)
+        run_context.set('ceo', analysis)
+        return fast_task_output(task, analysis, (
+            f"Strategic assessment: {analysis.name} is a {analysis.complexity}-complexity "
+            f"{analysis.analyzed_project_type} with budget feasibility '{analysis.budget_feasibility}'."
+        )), False
+    if stage_name == 'cto':
+        analysis = run_context.get('ceo')
+        if not isinstance(analysis, ProjectAnalysisOutput):
+            analysis = analyze_project(data)
+            run_context.set('ceo', analysis)
+        spec, fallback = create_specification(analysis, llm, run_context, model)
+        return fast_task_output(task, spec, (
+            f"Technical recommendation{' (defaults for the project type)' if fallback else ''}: "
+            f"a {spec.architecture} architecture built on "
+            f"{', '.join(t.strip() for t in spec.technologies)} with {spec.scalability} scalability requirements."
+        )), fallback
+    raise ValueError(f"Stage '{stage_name}' has no fast path.")
@@ -0,0 +1,185 @@
+"""Agent, task and crew definitions for the five stages, built once per process and cloned per run.
+
+Goals and task descriptions are templates with ``{placeholders}`` that are filled from the
+project form. Constructing crewai Agents, Tasks and Crews runs pydantic validation plus
+crewai's setup validators, so ``crew_prototypes()`` does it once and ``clone_stage()`` /
+``clone_crew()`` derive each run's objects with ``model_copy`` (no validation), replacing
+only the per-run fields.
+"""
+import threading
+import uuid
+from crewai import Agent, Task, Crew, Process, LLM
+from crewai.agents.cache import CacheHandler
+from backend.tools.tools import (AnalyzeProjectRequirements, CreateTechnicalSpecification,
+                                 ProjectAnalysisOutput, TechnicalSpecificationOutput)
+from backend.llms.llm import normalize_model_name
+from backend.logs.logs import CREW_VERBOSE
+from backend.observability.tracing import trace_agent_step
+from backend.pipeline.cancellation import check_cancelled
+
+# Placeholders: project_name, project_description, project_type, budget_range,
+# project_info (one line per filled-in form field), context (the stage's upstream outputs)
+# and upstream (what those outputs are, e.g. "the project information and CEO's analysis").
+AGENT_TEMPLATES = {
+    'ceo': {
+        'role': "Project Director (CEO)",
+        'goal': """Analyze the provided project details (name: {project_name}, description: {project_description}, type: {project_type}, budget: {budget_range}) using the AnalyzeProjectRequirementsTool.\nYour final output must be the structured project analysis data as per the ProjectAnalysisOutput model.\nProvide a brief summary of your strategic assessment based on this analysis.""",
+        'backstory': "You are a seasoned CEO with extensive experience in evaluating project feasibility and strategic alignment. You are meticulous and data-driven.",
+        'tools': [AnalyzeProjectRequirements],
+        'options': {'allow_delegation': False},
+    },
+    'cto': {
+        'role': "Technical Architect (CTO)",
+        'goal': """Based on the project analysis provided by the CEO, create a detailed technical specification using the CreateTechnicalSpecificationTool.\nThe tool already has the CEO's structured analysis; you only choose the architecture_type, core_technologies, and scalability_requirements.\nYour final output must be the structured technical specification data as per the TechnicalSpecificationOutput model.\nProvide a brief summary of your technical recommendations.""",
+        'backstory': "You are a highly experienced Technical Architect with a deep understanding of various system architectures, technologies, and scalability patterns. You translate project needs into robust technical plans.",
+        'tools': [CreateTechnicalSpecification],
+        'options': {'allow_delegation': False},
+    },
+    'pm': {
+        'role': "Product Manager",
+        'goal': """Based on {upstream}, develop a high-level product roadmap.\nDefine potential core product features and outline a phased approach if applicable.\nFocus on product-market fit and initial go-to-market considerations.""",
+        'backstory': "You are an experienced Product Manager skilled in defining product vision, strategy, and roadmaps, ensuring alignment with business goals and market needs.",
+        'tools': [],
+    },
+    'dev': {
+        'role': "Lead Developer",
+        'goal': """Based on {upstream}, provide an initial technical implementation plan.\nOutline key development phases, suggest a core tech stack (complementing CTO's choices), identify potential technical challenges, and give a rough effort estimation breakdown.\nConsider cloud service costs if applicable.""",
+        'backstory': "You are a Senior Full-Stack Developer with broad experience in implementing complex software projects. You are pragmatic and skilled in estimation and risk assessment.",
+        'tools': [],
+    },
+    'client': {
+        'role': "Client Success Manager",
+        'goal': """Based on {upstream}, outline a client engagement and success strategy.\nFocus on communication, expectation management, feedback loops, and key milestones for client review.\nSuggest a preliminary go-to-market and customer acquisition outline from a client success perspective.""",
+        'backstory': "You are an experienced Client Success Manager dedicated to ensuring client satisfaction and successful project delivery through proactive communication and strategic guidance.",
+        'tools': [],
+    },
+}
+
+TASK_TEMPLATES = {
+    'ceo': {
+        'description': """Analyze the following project and produce a structured analysis:\nProject Name: {project_name}\nProject Description: {project_description}\nProject Type: {project_type}\nBudget Range: {budget_range}\nYour output should be the structured ProjectAnalysisOutput and a brief strategic summary.""",
+        'expected_output': "A ProjectAnalysisOutput object containing the detailed analysis, and a brief textual summary of strategic insights.",
+        'output_pydantic': ProjectAnalysisOutput,
+    },
+    'cto': {
+        'description': """Given the project analysis from the CEO (available as '{{@ceo_task}}'), create a technical specification.\nYour CreateTechnicalSpecificationTool already has the CEO's structured analysis; do not pass it as an argument.\nChoose appropriate architecture, core technologies, and scalability requirements based on the analysis.\nYour output should be the structured TechnicalSpecificationOutput and a brief technical summary.""",
+        'expected_output': "A TechnicalSpecificationOutput object containing the detailed technical specification, and a brief textual summary of technical recommendations.",
+        'output_pydantic': TechnicalSpecificationOutput,
+    },
+    'pm': {
+        'description': """Based on project information:\n{project_info}\n{context},\ndevelop a high-level product roadmap and define potential core features.""",
+        'expected_output': "A textual high-level product roadmap, list of potential core features, and initial go-to-market considerations.",
+    },
+    'dev': {
+        'description': """Based on project information:\n{project_info}\n{context},\nprovide an initial technical implementation plan, tech stack suggestions, identify challenges, and estimate effort. Include potential cloud costs.""",
+        'expected_output': "A textual technical implementation plan, tech stack ideas, challenge list, effort estimates, and cloud cost considerations.",
+    },
+    'client': {
+        'description': """Based on all project information:\n{project_info}\n{context},\noutline a client engagement and success strategy, including communication, expectation management, and go-to-market ideas.""",
+        'expected_output': "A textual client engagement strategy, communication plan, and preliminary go-to-market outline.",
+    },
+}
+
+
+def agent_step(step):
+    """crewai step_callback: trace the step, then stop the agent if its run was cancelled."""
+    trace_agent_step(step)
+    check_cancelled()
+
+
+def build_stage(stage_name, llm, tools, inputs=None):
+    """Construct (and validate) a stage's Agent and Task from scratch.
+
+    With ``inputs`` the templates are filled in; without, the placeholders are kept (prototypes).
+    """
+    agent_spec, task_spec = AGENT_TEMPLATES[stage_name], TASK_TEMPLATES[stage_name]
+    render = (lambda text: text.format_map(inputs)) if inputs is not None else (lambda text: text)
+    agent = Agent(
+        role=agent_spec['role'],
+        goal=render(agent_spec['goal']),
+        backstory=agent_spec['backstory'],
+        tools=tools,
+        llm=llm,
+        verbose=CREW_VERBOSE,
+        step_callback=agent_step,
+        **agent_spec.get('options', {})
+    )
+    task = Task(
+        description=render(task_spec['description']),
+        expected_output=task_spec['expected_output'],
+        agent=agent,
+        output_pydantic=task_spec.get('output_pydantic'),
+    )
+    return agent, task
+
+
+def build_crew(agent, task):
+    """Construct (and validate) the one-task crew a stage runs in."""
+    return Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=CREW_VERBOSE)
+
+
+_prototypes = None
+_crew_prototypes = None
+_prototypes_lock = threading.Lock()
+
+
+def crew_prototypes():
+    """{stage: (agent, task)} built once per process with a placeholder LLM and unbound tools.
+
+    Each stage's one-task prototype Crew is built alongside (see ``clone_crew``).
+    """
+    global _prototypes, _crew_prototypes
+    if _prototypes is None:
+        with _prototypes_lock:
+            if _prototypes is None:
+                llm = LLM(model=normalize_model_name())
+                prototypes = {
+                    stage_name: build_stage(stage_name, llm, [tool() for tool in spec['tools']])
+                    for stage_name, spec in AGENT_TEMPLATES.items()
+                }
+                _crew_prototypes = {stage_name: build_crew(agent, task)
+                                    for stage_name, (agent, task) in prototypes.items()}
+                _prototypes = prototypes
+    return _prototypes
+
+
+def clone_stage(stage_name, inputs, llm, run_context):
+    """A run's own Agent and Task for one stage, shallow-copied from the prototypes.
+
+    Everything a run mutates (task output, callback, context, the tools' run context) lives
+    on the copies; the prototypes are never executed.
+    """
+    proto_agent, proto_task = crew_prototypes()[stage_name]
+    tools = [tool.model_copy(update={'run_context': run_context}) for tool in proto_agent.tools]
+    agent = proto_agent.model_copy(update={
+        'id': uuid.uuid4(),
+        'goal': AGENT_TEMPLATES[stage_name]['goal'].format_map(inputs),
+        'llm': llm,
+        'tools': tools,
+    })
+    task = proto_task.model_copy(update={
+        'id': uuid.uuid4(),
+        'description': TASK_TEMPLATES[stage_name]['description'].format_map(inputs),
+        'agent': agent,
+        'tools': tools,  # crewai copied the prototype agent's unbound tools onto the prototype task
+        'processed_by_agents': set(),
+    })
+    return agent, task
+
+
+def clone_crew(stage_name, task):
+    """The one-task Crew that runs a ``clone_stage`` task, shallow-copied from the stage's prototype.
+
+    A copy skips Crew's validators, so it does here what they would do for the run: give the
+    crew and its agent a tool-result cache of their own (tool results depend on the run context).
+    """
+    crew_prototypes()
+    crew = _crew_prototypes[stage_name].model_copy(update={
+        'id': uuid.uuid4(),
+        'agents': [task.agent],
+        'tasks': [task],
+    })
+    crew._cache_handler = CacheHandler()
+    if crew.cache:
+        task.agent.set_cache_handler(crew._cache_handler)
+    return crew
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from backend.logs.logs import configure_logging
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '2'))
+
+
+def iter_jsonl(lines, offset=0, skip=()):
+    """Yield ``(index, record, error)`` for each non-blank JSONL line, reading lazily.
+
+    ``index`` counts non-blank lines from 0; lines before ``offset`` or listed in ``skip``
+    are not yielded. Unparseable lines yield ``(index, None, message)``.
+    """
+    index = -1
+    for line in lines:
+        if not line.strip():
+            continue
+        index += 1
+        if index < offset or index in skip:
+            continue
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('each line must be a JSON object')
+            yield index, record, None
+        except ValueError as e:
+            yield index, None, f'Invalid JSON record: {e}'
+
+
+def analyze_record(index, record, api_key=None):
+    """Run one record and return its result line; failures are reported, not raised."""
+    from backend.agents.agents import run_cached_project_analysis  # crewai is only loaded once a batch runs
+    if api_key and not record.get('groq_api_key'):
+        record = dict(record, groq_api_key=api_key)
+    try:
+        result, cache_status, _ = run_cached_project_analysis(record)
+        return {'index': index, 'success': True, 'cache': cache_status, 'result': result}
+    except Exception as e:
+        return {'index': index, 'success': False, 'error': str(e)}
+
+
+def run_batch(records, concurrency=BATCH_CONCURRENCY, api_key=None):
+    """Analyze ``iter_jsonl`` records with at most ``concurrency`` in flight.
+
+    Results are yielded in completion order, as soon as each finishes; input is only read
+    ``concurrency`` records ahead, so arbitrarily long streams use constant memory.
+    Raises ValueError if ``concurrency`` is below 1.
+    """
+    if concurrency < 1:
+        raise ValueError(f'concurrency must be at least 1, got {concurrency}.')
+    records = iter(records)
+    running = {}
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='crew-batch') as executor:
+        while running or not exhausted:
+            while not exhausted and len(running) < concurrency:
+                try:
+                    index, record, error = next(records)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if error:
+                    yield {'index': index, 'success': False, 'error': error}
+                    continue
+                running[executor.submit(analyze_record, index, record, api_key)] = index
+            if running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+                    yield future.result()
+
+
+def completed_indices(path):
+    """Indices already written successfully to a results file (used to resume)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if entry.get('success'):
+                done.add(entry['index'])
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze a JSONL file of project forms, one result line per record.')
+    parser.add_argument('input', help="JSONL file of project forms, or '-' for stdin")
+    parser.add_argument('-o', '--output', help='JSONL results file; records already successful in it are skipped (default: stdout)')
+    parser.add_argument('--offset', type=int, default=0, help='skip the first N records')
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help='analyses run in parallel')
+    parser.add_argument('--api-key', default=None, help='Groq API key for records without groq_api_key (default: GROQ_API_KEY)')
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    configure_logging()
+
+    skip = completed_indices(args.output) if args.output else set()
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    sink = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    failures = 0
+    try:
+        for entry in run_batch(iter_jsonl(source, args.offset, skip), args.concurrency, args.api_key):
+            failures += not entry['success']
+            sink.write(json.dumps(entry, default=str) + '\n')
+            sink.flush()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import os
+import re
+import json
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Form fields that determine an analysis; the API key is deliberately not part of the key
+FORM_FIELDS = ['project_name', 'project_description', 'project_type', 'timeline',
+               'budget_range', 'priority', 'tech_requirements', 'special_considerations']
+
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.join(tempfile.gettempdir(), 'crewai_agency_cache.sqlite3'))
+CACHE_TTL = float(os.getenv('CACHE_TTL', '86400'))                     # seconds
+CACHE_MEMORY_ENTRIES = int(os.getenv('CACHE_MEMORY_ENTRIES', '128'))   # per process
+CACHE_DISK_ENTRIES = int(os.getenv('CACHE_DISK_ENTRIES', '5000'))      # shared by all workers
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+
+
+def normalize_value(value):
+    """Trim and collapse whitespace so cosmetic edits hit the same cache entry."""
+    if value is None:
+        return ''
+    return re.sub(r'\s+', ' ', str(value)).strip()
+
+
+def cache_key(data, fields=FORM_FIELDS, **extra):
+    """SHA-256 over the normalized form fields plus any extra discriminators (e.g. model name)."""
+    payload = {field: normalize_value(data.get(field)) for field in fields}
+    payload.update({name: normalize_value(value) for name, value in extra.items()})
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache: an in-process LRU in front of a SQLite table shared across workers.
+
+    Both tiers expire entries after ``ttl`` seconds; the memory tier keeps at most
+    ``memory_entries`` items and the disk tier at most ``disk_entries`` (least recently
+    used first).
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, ttl=CACHE_TTL, memory_entries=CACHE_MEMORY_ENTRIES,
+                 disk_entries=CACHE_DISK_ENTRIES, table='results'):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.table = table
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+        value = json.loads(row[0])
+        self._remember(key, row[1], value)
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, expires_at, value)
+        with self._connect() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value, default=str), expires_at, now))
+            conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+            conn.execute(f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} '
+                         f'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.disk_entries,))
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table}')
+
+
+result_cache = ResultCache()
+# Per-stage outputs, so an edited form can reuse the stages whose inputs did not change
+stage_cache = ResultCache(table='stages')
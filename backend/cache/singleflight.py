@@ -0,0 +1,439 @@
+"""Single-flight coalescing of identical analyses that are running at the same time.
+
+The first request for a cache key leads: it starts the run; identical requests arriving while
+it runs follow it and receive its result (or its failure) without calling the provider.
+Every request, the leading one included, then only waits for the run's ``Flight``, so a
+request that is cancelled just stops waiting: the run itself is cancelled once no request
+waits for it any more (in any worker). Within a worker followers get stage callbacks live.
+Across workers the leader claims the key in a SQLite table next to the result cache, counts
+the workers waiting for it there and publishes stage outputs and the final result; one
+thread per follower worker polls the row and hands the outcome to its local followers.
+The ``*_async`` methods do the same for event-loop callers (asgi_app.py), where waiting
+costs a coroutine instead of a thread.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+import contextvars
+
+from backend.cache.cache import CACHE_DB_PATH
+from backend.pipeline.cancellation import cancel_registry
+
+SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', '1') not in ('0', 'false', 'False')
+FLIGHT_TIMEOUT = float(os.getenv('FLIGHT_TIMEOUT', '600'))             # a leader older than this is presumed dead
+FLIGHT_POLL_INTERVAL = float(os.getenv('FLIGHT_POLL_INTERVAL', '0.5'))  # seconds between polls of another worker's run
+FLIGHT_RETENTION = float(os.getenv('FLIGHT_RETENTION', '60'))           # seconds a finished run stays readable
+
+LEADER, FOLLOWER, REMOTE_FOLLOWER = 'leader', 'follower', 'remote_follower'
+RUNNING, DONE, FAILED = 'running', 'done', 'failed'
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderFailed(Exception):
+    """Raised to followers when the run they joined failed in another worker (or vanished)."""
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Flight:
+    """One in-progress analysis and everyone waiting for it in this process."""
+
+    def __init__(self, key, role=LEADER):
+        self.key = key
+        self.role = role
+        self.run_id = uuid.uuid4().hex  # cancel id of the run when this process leads it
+        self.stages = []        # (stage_name, output) in completion order
+        self.result = None
+        self.error = None
+        self.waiters = 1        # requests of this process waiting for the outcome
+        self.owner = None       # run_id of the leader's row in the shared table, once registered there
+        self.closed = False     # no request waits any more; late joiners must start a new flight
+        self._listeners = []
+        self._callbacks = []
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def publish_stage(self, stage_name, output):
+        with self._lock:
+            self.stages.append((stage_name, output))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(stage_name, output)
+            except Exception:
+                logger.exception('Stage callback of a coalesced request failed')
+
+    def subscribe(self, on_task_complete):
+        """Replay the stages finished so far to ``on_task_complete`` and forward the next ones."""
+        with self._lock:
+            stages = list(self.stages)
+            self._listeners.append(on_task_complete)
+        for stage_name, output in stages:
+            on_task_complete(stage_name, output)
+
+    def unsubscribe(self, on_task_complete):
+        with self._lock:
+            if on_task_complete in self._listeners:
+                self._listeners.remove(on_task_complete)
+
+    def add_done_callback(self, callback):
+        """Call ``callback()`` once the outcome is known (right away if it already is)."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            self.result, self.error = result, error
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def wait(self, on_task_complete=None, timeout=FLIGHT_TIMEOUT, check=None):
+        """Wait for the outcome; ``check()`` is called about once a second and may raise to stop waiting."""
+        if on_task_complete:
+            self.subscribe(on_task_complete)
+        deadline = time.monotonic() + timeout
+        try:
+            while not self._done.wait(min(1.0, max(0.0, deadline - time.monotonic()))):
+                if check is not None:
+                    check()
+                if time.monotonic() >= deadline:
+                    raise LeaderFailed('The identical analysis this request joined did not finish in time.')
+        finally:
+            if on_task_complete:
+                self.unsubscribe(on_task_complete)
+        return self.outcome()
+
+
+class SingleFlight:
+    """Coalesces concurrent runs per key, in this process and through a table shared by all workers."""
+
+    def __init__(self, path=CACHE_DB_PATH, table='flights', timeout=FLIGHT_TIMEOUT,
+                 poll_interval=FLIGHT_POLL_INTERVAL, retention=FLIGHT_RETENTION, shared=True):
+        self.path = path
+        self.table = table
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.shared = shared
+        self._flights = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                started_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                waiters INTEGER NOT NULL DEFAULT 1
+            )""")
+            try:
+                conn.execute(f'ALTER TABLE {self.table} ADD COLUMN waiters INTEGER NOT NULL DEFAULT 1')
+            except sqlite3.OperationalError:
+                pass  # created with the column
+            self._initialized = True
+        return conn
+
+    def _transaction(self, work):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            value = work(conn)
+            conn.execute('COMMIT')
+            return value
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def begin(self, key):
+        """Join the run for ``key``: returns ``(flight, role)`` with role LEADER, FOLLOWER or REMOTE_FOLLOWER.
+
+        The LEADER must start the run with ``lead``; a REMOTE_FOLLOWER must start relaying the
+        other worker's run with ``follow_remote``. Every caller then waits with ``wait``.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = Flight(key)
+                    break
+            if self._attach(flight):
+                return flight, FOLLOWER
+        if self.shared:
+            try:
+                flight.role = self._claim(key, flight)
+            except sqlite3.Error:
+                logger.exception('Could not claim the shared single-flight entry; running uncoordinated')
+        return flight, flight.role
+
+    def _attach(self, flight):
+        """Add a local waiter to ``flight``; False if it is closing and a new flight must be started."""
+        with flight._lock:
+            if flight.closed:
+                return False
+            flight.waiters += 1
+            if flight.waiters > 1 or flight.owner is None or flight._done.is_set():
+                return True
+            # This worker had stopped waiting for its own run but kept it going for others
+            def rejoin(conn):
+                return conn.execute(f'UPDATE {self.table} SET waiters = waiters + 1 WHERE key = ? AND owner = ? '
+                                    f'AND status = ?', (flight.key, flight.owner, RUNNING)).rowcount
+            try:
+                if self._transaction(rejoin):
+                    return True
+            except sqlite3.Error:
+                logger.exception('Could not rejoin the shared single-flight entry')
+                return True
+            # Everyone else left and the run is being cancelled
+            flight.waiters -= 1
+            flight.closed = True
+        self._forget(flight)
+        return False
+
+    def _claim(self, key, flight):
+        def claim(conn):
+            now = time.time()
+            row = conn.execute(f'SELECT owner, pid, status, started_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[2] == RUNNING and row[1] != os.getpid() \
+                    and row[3] > now - self.timeout and pid_alive(row[1]):
+                conn.execute(f'UPDATE {self.table} SET waiters = waiters + 1 WHERE key = ?', (key,))
+                flight.owner = row[0]
+                return REMOTE_FOLLOWER
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, owner, pid, status, stages, started_at, '
+                         f"updated_at, waiters) VALUES (?, ?, ?, ?, '[]', ?, ?, 1)",
+                         (key, flight.run_id, os.getpid(), RUNNING, now, now))
+            conn.execute(f'DELETE FROM {self.table} WHERE status != ? AND updated_at < ?', (RUNNING, now - self.retention))
+            flight.owner = flight.run_id
+            return LEADER
+        return self._transaction(claim)
+
+    def lead(self, flight, run):
+        """Leader: run ``run(on_stage)`` in a thread as cancellable run ``flight.run_id``.
+
+        The run outlives the request that started it for as long as any request waits for it.
+        """
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._run, flight, run), name='single-flight', daemon=True).start()
+
+    def _run(self, flight, run):
+        with cancel_registry.run(flight.run_id):
+            try:
+                result = run(lambda stage_name, output: self.publish_stage(flight, stage_name, output))
+            except BaseException as e:
+                self.finish(flight, error=self._leader_error(e))
+            else:
+                self.finish(flight, result)
+
+    def lead_async(self, flight, run):
+        """``lead`` for event-loop callers: ``run(on_stage)`` is a coroutine function, run as a task."""
+        task = asyncio.ensure_future(self._run_async(flight, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_async(self, flight, run):
+        with cancel_registry.run(flight.run_id):
+            try:
+                result = await run(lambda stage_name, output: self.publish_stage(flight, stage_name, output))
+            except BaseException as e:
+                await asyncio.to_thread(self.finish, flight, None, self._leader_error(e))
+            else:
+                await asyncio.to_thread(self.finish, flight, result)
+
+    @staticmethod
+    def _leader_error(e):
+        if isinstance(e, Exception):
+            return e
+        return LeaderFailed('The identical analysis this request joined was cancelled.')
+
+    def publish_stage(self, flight, stage_name, output):
+        """Leader: hand a finished stage to local and remote followers."""
+        flight.publish_stage(stage_name, output)
+        if flight.role == LEADER and flight.owner:
+            self._update(flight, stages=json.dumps(flight.stages, default=str))
+
+    def finish(self, flight, result=None, error=None):
+        """Release the key and deliver ``result`` (or ``error``) to every local follower (and, when
+        leading, to the other workers)."""
+        self._forget(flight)
+        flight.finish(result, error)
+        if flight.role == LEADER and flight.owner:
+            if error is None:
+                self._update(flight, status=DONE, result=json.dumps(result, default=str))
+            else:
+                self._update(flight, status=FAILED, error=f'{type(error).__name__}: {error}'[:1000])
+
+    def _forget(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def _update(self, flight, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        try:
+            with self._connect() as conn:
+                conn.execute(f'UPDATE {self.table} SET {assignments}, updated_at = ? WHERE key = ? AND owner = ?',
+                             (*fields.values(), time.time(), flight.key, flight.owner))
+        except sqlite3.Error:
+            logger.exception('Could not publish to the shared single-flight entry')
+
+    def wait(self, flight, on_task_complete=None, check=None):
+        """Wait for the run's outcome as one of its requests, then leave it.
+
+        A request that stops waiting early (``check()`` raised, e.g. RunCancelled) only leaves:
+        the run is cancelled once no request in any worker waits for it.
+        """
+        try:
+            return flight.wait(on_task_complete, self.timeout, check)
+        finally:
+            self.leave(flight)
+
+    async def wait_async(self, flight, on_task_complete=None, check=None):
+        """``wait`` for event-loop callers; ``check`` runs in a short-lived executor thread."""
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        flight.add_done_callback(lambda: loop.call_soon_threadsafe(done.set))
+        if on_task_complete:
+            flight.subscribe(on_task_complete)
+        deadline = loop.time() + self.timeout
+        try:
+            while not flight.done:
+                try:
+                    await asyncio.wait_for(done.wait(), min(1.0, max(0.0, deadline - loop.time())))
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                if check is not None:
+                    await asyncio.to_thread(check)
+                if loop.time() >= deadline:
+                    raise LeaderFailed('The identical analysis this request joined did not finish in time.')
+            return flight.outcome()
+        finally:
+            if on_task_complete:
+                flight.unsubscribe(on_task_complete)
+            await asyncio.to_thread(self.leave, flight)
+
+    def leave(self, flight):
+        """Remove one local waiter; the last one to leave an unfinished run stops it."""
+        with flight._lock:
+            flight.waiters -= 1
+            if flight.waiters > 0 or flight._done.is_set():
+                return
+            remaining = self._release(flight) if flight.owner else 0
+            if flight.role != LEADER or not remaining:
+                flight.closed = True
+        if flight.closed:
+            self._forget(flight)
+            if flight.role == LEADER and not remaining:
+                cancel_registry.cancel(flight.run_id, 'no request waits for it any more')
+
+    def _release(self, flight):
+        """Drop this worker's interest in the shared run; returns how many workers still wait for it."""
+        def release(conn):
+            row = conn.execute(f'SELECT owner, status, waiters FROM {self.table} WHERE key = ?', (flight.key,)).fetchone()
+            if row is None or row[0] != flight.owner or row[1] != RUNNING:
+                return 0
+            remaining = max(0, row[2] - 1)
+            if remaining:
+                conn.execute(f'UPDATE {self.table} SET waiters = ? WHERE key = ?', (remaining, flight.key))
+            else:
+                conn.execute(f'UPDATE {self.table} SET waiters = 0, status = ?, error = ?, updated_at = ? WHERE key = ?',
+                             (FAILED, 'Cancelled: no request waits for it any more.', time.time(), flight.key))
+            return remaining
+        try:
+            remaining = self._transaction(release)
+        except sqlite3.Error:
+            logger.exception('Could not leave the shared single-flight entry')
+            return 1  # keep the run going rather than cancel it on a database error
+        if not remaining and flight.role != LEADER:
+            cancel_registry.cancel(flight.owner, 'no request waits for it any more')
+        return remaining
+
+    def follow_remote(self, flight):
+        """Remote follower: relay the other worker's run to this worker's waiters from a polling thread."""
+        threading.Thread(target=self._poll_remote, args=(flight,), name='single-flight-follow', daemon=True).start()
+
+    def _poll_remote(self, flight):
+        state = {'seen': 0, 'started': time.monotonic()}
+        while not flight.closed and not self._poll(flight, state):
+            time.sleep(self.poll_interval)
+
+    def follow_remote_async(self, flight):
+        """``follow_remote`` for event-loop callers: polls from a task (each read in an executor thread)."""
+        task = asyncio.ensure_future(self._poll_remote_async(flight))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _poll_remote_async(self, flight):
+        state = {'seen': 0, 'started': time.monotonic()}
+        while not flight.closed and not await asyncio.to_thread(self._poll, flight, state):
+            await asyncio.sleep(self.poll_interval)
+
+    def _poll(self, flight, state):
+        """Relay new stages of the other worker's run; returns True once its outcome is delivered."""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(f'SELECT pid, status, stages, result, error, started_at, owner FROM {self.table} '
+                                   f'WHERE key = ?', (flight.key,)).fetchone()
+            if row is None or row[6] != flight.owner \
+                    or (row[1] == RUNNING and (not pid_alive(row[0]) or row[5] < time.time() - self.timeout)):
+                raise LeaderFailed('The identical analysis this request joined was abandoned by its worker.')
+            stages = json.loads(row[2])
+            for stage_name, output in stages[state['seen']:]:
+                flight.publish_stage(stage_name, output)
+            state['seen'] = max(state['seen'], len(stages))
+            if row[1] == DONE:
+                self.finish(flight, json.loads(row[3]))
+                return True
+            if row[1] == FAILED:
+                raise LeaderFailed(row[4])
+            if time.monotonic() - state['started'] > self.timeout:
+                raise LeaderFailed('The identical analysis this request joined did not finish in time.')
+            return False
+        except Exception as e:
+            if not isinstance(e, LeaderFailed):
+                logger.exception('Following the shared single-flight entry failed')
+            self.finish(flight, error=e)
+            return True
+
+
+single_flight = SingleFlight()
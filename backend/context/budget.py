@@ -0,0 +1,120 @@
+import re
+from functools import lru_cache
+
+# Lines worth keeping when an upstream output has to be shortened: headings, bullets, numbered items
+_KEY_LINE = re.compile(r'^\s*(#{1,6}\s|[-*•]\s|\d+[.)]\s|\*\*[^*]+\*\*)')
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """cl100k_base, loaded on first use (None when tiktoken or its encoding file is unavailable)."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:  # tiktoken missing or its encoding file unavailable offline
+        return None
+
+
+def count_tokens(text):
+    """Local token count (cl100k_base when tiktoken is available, ~4 chars/token otherwise)."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, budget):
+    if count_tokens(text) <= budget:
+        return text
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max(budget - 1, 0)]) + '…'
+    return text[:max(budget - 1, 0) * 4] + '…'
+
+
+def _normalize_line(line):
+    return re.sub(r'\s+', ' ', line).strip().lower()
+
+
+def dedupe_lines(text, seen):
+    """Drop non-empty lines already present in ``seen`` (normalized) and add the rest to it."""
+    kept = []
+    for line in text.splitlines():
+        key = _normalize_line(line)
+        if key and key in seen:
+            continue
+        if key:
+            seen.add(key)
+        kept.append(line)
+    return '\n'.join(kept)
+
+
+def compact(text, budget):
+    """Shrink ``text`` to ``budget`` tokens, preferring its outline (headings and list items).
+
+    The outline is always kept when it fits; the rest of the budget goes to the other lines
+    in their original order, the first one that does not fit whole being cut short.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    outline = [i for i, line in enumerate(lines) if _KEY_LINE.match(line)]
+    if not outline:
+        return truncate_to_tokens(text, budget)
+    remaining = budget - count_tokens('\n'.join(lines[i] for i in outline))
+    if remaining <= 0:
+        return truncate_to_tokens('\n'.join(lines[i] for i in outline), budget)
+    kept = dict.fromkeys(outline)
+    for i, line in enumerate(lines):
+        if i in kept or not line.strip():
+            continue
+        cost = count_tokens(line) + 1  # the line break
+        if cost > remaining:
+            if remaining > 1:
+                kept[i] = truncate_to_tokens(line, remaining - 1)
+            break
+        kept[i] = None
+        remaining -= cost
+    compacted = '\n'.join(lines[i] if kept[i] is None else kept[i] for i in sorted(kept))
+    return truncate_to_tokens(compacted, budget)
+
+
+class ContextBudgeter:
+    """Builds the upstream context of one stage within a token budget.
+
+    Each section is ``(label, raw_text, structured)``. Structured (pydantic) results are
+    rendered as compact JSON; free text is deduplicated against the task description and
+    earlier sections, then shortened when it does not fit. Sections that fit are kept whole
+    and their unused share goes to the larger ones.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+
+    def render(self, label, raw_text, structured):
+        """Return ``(header, body)`` for one section."""
+        if structured is not None:
+            return f"{label} (structured):", structured.model_dump_json()
+        return f"{label}:", raw_text or ''
+
+    def build(self, sections, description=''):
+        """Return ``(context_text, token_count)`` for ``sections``."""
+        seen = set()
+        dedupe_lines(description, seen)
+        rendered = []
+        for label, raw, structured in sections:
+            header, body = self.render(label, raw, structured)
+            rendered.append((header, dedupe_lines(body, seen)))
+        # Hand out the budget smallest-first so short sections stay intact
+        order = sorted(range(len(rendered)), key=lambda i: count_tokens(rendered[i][1]))
+        remaining, parts = self.budget, [None] * len(rendered)
+        for position, i in enumerate(order):
+            header, body = rendered[i]
+            share = remaining // (len(order) - position) - count_tokens(header)
+            text = f"{header}\n{compact(body, max(share, 0))}"
+            remaining -= count_tokens(text)
+            parts[i] = text
+        context = '\n\n'.join(parts)
+        return context, count_tokens(context)
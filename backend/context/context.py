@@ -0,0 +1,59 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+class RunContext:
+    """Per-run store of typed stage results, shared by the tasks and tools of one analysis.
+
+    Tools read upstream results (e.g. the CEO's ProjectAnalysisOutput) from here instead of
+    having the LLM re-serialize them into tool arguments. It also carries the run's
+    credentials and model routes, which the LLM handles and fast-path calls are built from,
+    so concurrent runs in one process never share them through process-global state.
+    """
+
+    def __init__(self, results=None, api_key=None, routes=None):
+        self._results = dict(results or {})
+        self._lock = threading.Lock()
+        self.api_key = api_key
+        self.routes = routes
+
+    def __repr__(self):
+        # Never print the API key
+        return f'RunContext(stages={sorted(self._results)}, routes={sorted(self.routes or {})})'
+
+    def set(self, stage_name, value):
+        with self._lock:
+            self._results[stage_name] = value
+
+    def get(self, stage_name, default=None):
+        with self._lock:
+            return self._results.get(stage_name, default)
+
+    def require(self, stage_name, expected_type):
+        """Return the ``stage_name`` result, raising ValueError if it is missing or of the wrong type."""
+        value = self.get(stage_name)
+        if not isinstance(value, expected_type):
+            raise ValueError(f"No {expected_type.__name__} from the '{stage_name}' stage is available in this run's context.")
+        return value
+
+    def __contains__(self, stage_name):
+        with self._lock:
+            return stage_name in self._results
+
+
+_current_run_context = contextvars.ContextVar('crew_run_context', default=None)
+
+
+def current_run_context():
+    """The RunContext of the analysis executing in this context (None outside one)."""
+    return _current_run_context.get()
+
+
+@contextmanager
+def use_run_context(run_context):
+    token = _current_run_context.set(run_context)
+    try:
+        yield run_context
+    finally:
+        _current_run_context.reset(token)
@@ -0,0 +1,272 @@
+import os
+import math
+import time
+import asyncio
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+from backend.observability.metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT
+
+# Share of dispatch slots each priority gets while all three are waiting (High:Medium:Low = 4:2:1)
+PRIORITY_WEIGHTS = {'High': 4, 'Medium': 2, 'Low': 1}
+DEFAULT_PRIORITY = 'Medium'
+
+ANALYSIS_CONCURRENCY = int(os.getenv('ANALYSIS_CONCURRENCY', '2'))      # crew runs at once per process
+ADMISSION_QUEUE_LIMIT = int(os.getenv('ADMISSION_QUEUE_LIMIT', '50'))   # waiting runs per process
+STARVATION_AGE = float(os.getenv('STARVATION_AGE', '120'))              # seconds before a waiter jumps the queue
+ANALYSIS_ESTIMATE = float(os.getenv('ANALYSIS_ESTIMATE', '60'))         # initial guess of one run's duration
+
+
+class AdmissionQueueFull(Exception):
+    """Raised when ADMISSION_QUEUE_LIMIT analyses are already waiting."""
+
+
+def normalize_priority(priority):
+    for name in PRIORITY_WEIGHTS:
+        if str(priority or '').strip().lower() == name.lower():
+            return name
+    return DEFAULT_PRIORITY
+
+
+class Ticket:
+    def __init__(self, priority, seq, on_update=None, wake=None):
+        self.priority = priority
+        self.seq = seq
+        self.on_update = on_update
+        self.wake = wake  # called (lock held, must not block) when the ticket is admitted
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+        self.position = None
+        self.estimated_wait = None
+
+    @property
+    def waited(self):
+        return (self.admitted_at or time.monotonic()) - self.enqueued_at
+
+
+class PriorityAdmission:
+    """Weighted-fair admission of analyses into a fixed number of concurrent slots.
+
+    Waiting runs are grouped by priority and served by stride scheduling (each class advances
+    its pass by 1/weight per dispatch, the lowest pass + 1/weight goes next), so High is served first under
+    load without locking Low out. A run that has waited longer than ``starvation_age`` is
+    dispatched before anything else. Waiters are told their position and an estimated wait
+    via ``on_update({'position': n, 'estimated_wait': seconds, ...})`` whenever their position
+    changes; position 0 means admitted. The queue is only re-evaluated when it changes (a run
+    enqueued, released or withdrawn) or when a waiter reaches the starvation age, so blocked
+    waiters stay idle apart from their periodic ``check()``.
+    """
+
+    def __init__(self, concurrency=ANALYSIS_CONCURRENCY, queue_limit=ADMISSION_QUEUE_LIMIT,
+                 starvation_age=STARVATION_AGE, weights=PRIORITY_WEIGHTS):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.starvation_age = starvation_age
+        self.weights = dict(weights)
+        self._queues = {priority: deque() for priority in self.weights}
+        self._pass = {priority: 0.0 for priority in self.weights}
+        self._running = 0
+        self._avg_duration = ANALYSIS_ESTIMATE
+        self._reorder_at = math.inf  # when the next waiter reaches the starvation age
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running(self):
+        return self._running
+
+    def _next(self, queues, passes, now):
+        """Pick the next ticket (without removing it): starved first, then lowest pass."""
+        oldest = min((q[0] for q in queues.values() if q), key=lambda t: t.enqueued_at, default=None)
+        if oldest is None:
+            return None
+        if now - oldest.enqueued_at >= self.starvation_age:
+            return oldest
+        # Virtual finish time: the class whose next dispatch completes its fair share first
+        priority = min((p for p, q in queues.items() if q), key=lambda p: passes[p] + 1.0 / self.weights[p])
+        return queues[priority][0]
+
+    def _take(self, ticket, queues, passes):
+        queues[ticket.priority].remove(ticket)
+        passes[ticket.priority] += 1.0 / self.weights[ticket.priority]
+
+    def _dispatch(self):
+        """Admit waiters while slots are free and recompute everyone's position. Lock held.
+
+        Returns the tickets to notify: the admitted ones and those whose position changed.
+        """
+        now = time.monotonic()
+        admitted = []
+        while self._running < self.concurrency:
+            ticket = self._next(self._queues, self._pass, now)
+            if ticket is None:
+                break
+            self._take(ticket, self._queues, self._pass)
+            ticket.admitted_at = now
+            ticket.position, ticket.estimated_wait = 0, 0.0
+            self._running += 1
+            ADMISSION_WAIT.labels(priority=ticket.priority).observe(ticket.waited)
+            if ticket.wake:
+                ticket.wake()
+            admitted.append(ticket)
+        for priority, queue in self._queues.items():
+            ADMISSION_QUEUE_DEPTH.labels(priority=priority).set(len(queue))
+        # Simulate the dispatch order of the remaining waiters to report positions
+        queues = {p: deque(q) for p, q in self._queues.items()}
+        passes = dict(self._pass)
+        moved = []
+        position = 0
+        while True:
+            ticket = self._next(queues, passes, now)
+            if ticket is None:
+                break
+            self._take(ticket, queues, passes)
+            position += 1
+            if ticket.position != position:
+                moved.append(ticket)
+            ticket.position = position
+            ticket.estimated_wait = math.ceil(position / self.concurrency) * self._avg_duration
+        # Positions stay valid until the oldest waiter not yet starved reaches the starvation age
+        self._reorder_at = min((ticket.enqueued_at + self.starvation_age for queue in self._queues.values()
+                                for ticket in queue if now - ticket.enqueued_at < self.starvation_age),
+                               default=math.inf)
+        if admitted:
+            self._cond.notify_all()
+        return admitted + moved
+
+    def _reorder(self):
+        """Re-evaluate the queue if a waiter reached the starvation age since the last dispatch. Lock held."""
+        if time.monotonic() >= self._reorder_at:
+            return self._dispatch()
+        return []
+
+    def _wakeup_timeout(self, check):
+        """How long a waiter sleeps: until the next starvation promotion, at most 1s with ``check``."""
+        return max(0.0, min(self._reorder_at - time.monotonic(), 1.0 if check is not None else 5.0))
+
+    def _notify(self, tickets):
+        for ticket in tickets:
+            if ticket.on_update:
+                try:
+                    ticket.on_update({'position': ticket.position, 'estimated_wait': round(ticket.estimated_wait, 1),
+                                      'priority': ticket.priority, 'waited': round(ticket.waited, 1)})
+                except Exception:
+                    pass
+
+    def acquire(self, priority=None, on_update=None, check=None):
+        """Block until a slot is free for this run; returns its Ticket.
+
+        ``check()`` is called about once a second while waiting; if it raises, the run leaves
+        the queue and the exception propagates (used for cancellation).
+        """
+        ticket = self._enqueue(priority, on_update)
+        try:
+            self._wait(ticket, check)
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        return ticket
+
+    async def acquire_async(self, priority=None, on_update=None, check=None):
+        """``acquire`` for event-loop callers: the wait costs a coroutine, not a thread.
+
+        ``check`` is run in a short-lived executor thread, since it may query the cancel table.
+        """
+        loop = asyncio.get_running_loop()
+        admitted = asyncio.Event()
+        ticket = self._enqueue(priority, on_update, wake=lambda: loop.call_soon_threadsafe(admitted.set))
+        try:
+            while ticket.admitted_at is None:
+                try:
+                    await asyncio.wait_for(admitted.wait(), self._wakeup_timeout(check))
+                except asyncio.TimeoutError:
+                    pass
+                if ticket.admitted_at is None and check is not None:
+                    await asyncio.to_thread(check)
+                if ticket.admitted_at is None:
+                    with self._cond:
+                        changed = self._reorder()
+                    self._notify(changed)
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+        return ticket
+
+    def _enqueue(self, priority, on_update, wake=None):
+        priority = normalize_priority(priority)
+        with self._cond:
+            if self.waiting >= self.queue_limit:
+                raise AdmissionQueueFull(f"{self.waiting} analyses are already waiting. Please retry shortly.")
+            ticket = Ticket(priority, next(self._seq), on_update, wake)
+            queue = self._queues[priority]
+            if not queue:
+                # A class returning from idle must not cash in credit from the time it was idle
+                active = [self._pass[p] for p, q in self._queues.items() if q]
+                self._pass[priority] = max(self._pass[priority], min(active, default=self._pass[priority]))
+            queue.append(ticket)
+            changed = self._dispatch()
+        self._notify(changed)
+        return ticket
+
+    def _wait(self, ticket, check):
+        with self._cond:
+            while ticket.admitted_at is None:
+                self._cond.wait(self._wakeup_timeout(check))
+                if check is not None and ticket.admitted_at is None:
+                    self._cond.release()
+                    try:
+                        check()
+                    finally:
+                        self._cond.acquire()
+                changed = self._reorder() if ticket.admitted_at is None else []
+                if changed:
+                    self._cond.release()
+                    try:
+                        self._notify(changed)
+                    finally:
+                        self._cond.acquire()
+
+    def _withdraw(self, ticket):
+        """Take a ticket that gave up waiting out of the queue (or give back its slot if it just got one)."""
+        with self._cond:
+            if ticket.admitted_at is None:
+                self._queues[ticket.priority].remove(ticket)
+            else:
+                self._running -= 1
+            changed = self._dispatch()
+        self._notify(changed)
+
+    def release(self, ticket, duration=None):
+        with self._cond:
+            self._running -= 1
+            if duration is not None:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            changed = self._dispatch()
+        self._notify(changed)
+
+    @contextmanager
+    def slot(self, priority=None, on_update=None, check=None):
+        ticket = self.acquire(priority, on_update, check)
+        started = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket, time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, priority=None, on_update=None, check=None):
+        ticket = await self.acquire_async(priority, on_update, check)
+        started = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket, time.monotonic() - started)
+
+
+admission = PriorityAdmission()
@@ -0,0 +1,182 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.observability.tracing import span
+from backend.observability.metrics import JOB_QUEUE_DEPTH, STAGE_ROLES
+from backend.pipeline.cancellation import cancel_registry, RunCancelled
+
+# Job state lives in SQLite so that any gunicorn worker can answer a poll,
+# not only the worker whose executor is running the job.
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(tempfile.gettempdir(), 'crewai_agency_jobs.sqlite3'))
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', '20'))  # queued + running jobs per process
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', '86400'))   # seconds to keep finished jobs
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+
+
+class JobQueueFull(Exception):
+    """Raised when this process already holds JOB_QUEUE_LIMIT jobs."""
+
+
+class JobStore:
+    """SQLite-backed job table shared by every worker process on the host."""
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                queue TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+            try:
+                conn.execute('ALTER TABLE jobs ADD COLUMN queue TEXT')  # tables created before queue info existed
+            except sqlite3.OperationalError:
+                pass
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def create(self, job_id):
+        now = time.time()
+        progress = {stage: 'pending' for stage in STAGE_ROLES}
+        with self._connect() as conn:
+            conn.execute('INSERT INTO jobs (id, status, progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                         (job_id, QUEUED, json.dumps(progress), now, now))
+
+    def update(self, job_id, status=None, stage=None, result=None, error=None, queue=None):
+        with self._connect() as conn:
+            # Stages of a parallel pipeline finish on different threads: take the write lock before
+            # reading progress so no stage's mark is overwritten by a concurrent update
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT status, progress FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            progress = json.loads(row[1])
+            if stage:
+                progress[stage] = 'done'
+            conn.execute('UPDATE jobs SET status = ?, progress = ?, result = COALESCE(?, result), '
+                         'error = COALESCE(?, error), queue = COALESCE(?, queue), updated_at = ? WHERE id = ?',
+                         (status or row[0], json.dumps(progress),
+                          json.dumps(result, default=str) if result is not None else None,
+                          error, json.dumps(queue) if queue is not None else None, time.time(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT id, status, progress, result, error, queue, created_at, updated_at '
+                               'FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'status': row[1],
+            'progress': json.loads(row[2]),
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'queue': json.loads(row[5]) if row[5] else None,
+            'created_at': row[6],
+            'updated_at': row[7],
+        }
+
+    def purge(self, older_than=JOB_RETENTION):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?',
+                         (SUCCEEDED, FAILED, CANCELLED, time.time() - older_than))
+
+
+class JobManager:
+    """Runs analyses on background threads and records their progress.
+
+    Up to ``queue_limit`` jobs are accepted per process; how many crews actually run at once
+    is decided by the priority admission queue (ANALYSIS_CONCURRENCY).
+    """
+
+    def __init__(self, store=None, queue_limit=JOB_QUEUE_LIMIT):
+        self._store = store
+        self.queue_limit = queue_limit
+        self._executor = None
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    def submit(self, data):
+        """Queue an analysis and return its job id without waiting for it."""
+        with self._lock:
+            if self._active >= self.queue_limit:
+                raise JobQueueFull(f"Too many analyses in progress ({self._active}). Please retry shortly.")
+            self._active += 1
+            JOB_QUEUE_DEPTH.inc()
+            # Created lazily so that the pool is built in the worker process, not before fork
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.queue_limit, thread_name_prefix='crew-job')
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.purge()
+            self.store.create(job_id)
+            self._executor.submit(self._run, job_id, data)
+        except Exception:
+            with self._lock:
+                self._active -= 1
+                JOB_QUEUE_DEPTH.dec()
+            raise
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Ask the job to stop (in whichever worker runs it); returns False for unknown or finished jobs."""
+        job = self.store.get(job_id)
+        if job is None or job['status'] in (SUCCEEDED, FAILED, CANCELLED):
+            return False
+        cancel_registry.cancel(job_id)
+        return True
+
+    @property
+    def active(self):
+        return self._active
+
+    def _run(self, job_id, data):
+        from backend.agents.agents import run_cached_project_analysis  # crewai is only loaded once a job runs
+        try:
+            def on_queue_update(info):
+                self.store.update(job_id, status=RUNNING if info['position'] == 0 else None, queue=info)
+
+            # resume: a cancel made while the job was still queued must not be cleared
+            with span('job', kind='request', job_id=job_id), cancel_registry.run(job_id, resume=True):
+                result, _, _ = run_cached_project_analysis(
+                    data,
+                    on_task_complete=lambda stage, output: self.store.update(job_id, stage=stage),
+                    on_queue_update=on_queue_update,
+                    run_id=job_id,
+                )
+            self.store.update(job_id, status=SUCCEEDED, result=result)
+        except RunCancelled as e:
+            self.store.update(job_id, status=CANCELLED, error=str(e))
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
+                JOB_QUEUE_DEPTH.dec()
+
+
+job_manager = JobManager()
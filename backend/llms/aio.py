@@ -0,0 +1,66 @@
+"""Run the LLM calls of synchronous callers (crewai agents, the fast path) as async completions.
+
+crewai drives its agents synchronously, so a stage always occupies a thread while it runs.
+Under the ASGI app (asgi_app.py) that thread no longer does the HTTP request itself: each
+litellm.completion call is handed to the server's event loop as ``litellm.acompletion`` and
+the thread only waits for the response, while every request socket lives on the loop and
+shares one async connection pool. Outside the ASGI app (no loop attached) calls go through
+unchanged. A cancelled run aborts its request on the loop instead of waiting for it.
+"""
+import asyncio
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import httpx
+
+from backend.pipeline.cancellation import current_token
+
+_loop = None
+_loop_thread = None
+
+
+async def attach():
+    """Route completions to the running event loop (call from the ASGI app's startup)."""
+    global _loop, _loop_thread
+    import litellm
+    litellm.aclient_session = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=60),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+    )
+    _loop = asyncio.get_running_loop()
+    _loop_thread = threading.get_ident()
+
+
+async def detach():
+    global _loop
+    import litellm
+    _loop = None
+    if litellm.aclient_session is not None:
+        await litellm.aclient_session.aclose()
+        litellm.aclient_session = None
+
+
+def on_loop(completion):
+    """Wrap the innermost litellm.completion so calls from worker threads run as acompletion on the loop."""
+    def loop_completion(*args, **kwargs):
+        loop = _loop
+        if loop is None or loop.is_closed() or kwargs.get('stream') \
+                or _loop_thread == threading.get_ident():
+            return completion(*args, **kwargs)
+        import litellm
+        future = asyncio.run_coroutine_threadsafe(litellm.acompletion(*args, **kwargs), loop)
+        token = current_token()
+        while True:
+            try:
+                return future.result(timeout=None if token is None else token.poll_interval)
+            except FutureTimeout:
+                if token.cancelled:
+                    future.cancel()
+                    token.check()
+    loop_completion.__wrapped__ = completion
+    return loop_completion
+
+
+def install():
+    import litellm
+    litellm.completion = on_loop(litellm.completion)
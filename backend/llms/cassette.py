@@ -0,0 +1,198 @@
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+import litellm
+
+# LLM_CASSETTE_MODE: 'record' captures every litellm.completion call of the process into
+# LLM_CASSETTE_DIR/<LLM_CASSETTE_NAME>.jsonl.gz, 'replay' serves them back with no network.
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'off')
+LLM_CASSETTE_DIR = os.getenv('LLM_CASSETTE_DIR', 'cassettes')
+LLM_CASSETTE_NAME = os.getenv('LLM_CASSETTE_NAME', 'default')
+LLM_REPLAY_TIMING = os.getenv('LLM_REPLAY_TIMING', '0') in ('1', 'true', 'True')  # sleep the recorded latency
+
+# Request fields that identify a completion; credentials and endpoints are deliberately excluded
+KEY_FIELDS = ['model', 'messages', 'tools', 'tool_choice', 'temperature', 'top_p', 'max_tokens',
+              'stop', 'response_format', 'seed']
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request that is not in the cassette."""
+
+
+def request_key(kwargs):
+    payload = {field: kwargs.get(field) for field in KEY_FIELDS if kwargs.get(field) is not None}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def cassette_path(name, directory=LLM_CASSETTE_DIR):
+    return os.path.join(directory, f'{name}.jsonl.gz')
+
+
+def load_interactions(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class Cassette:
+    """Hash-keyed recording of litellm completions.
+
+    Each interaction is stored as one gzipped JSONL line: the request key, its occurrence
+    number (identical requests are replayed in the order they were recorded), the original
+    latency, token usage and the response. Every line is appended as its own gzip member in a
+    single write, through a descriptor each process opens on first use, so workers forked
+    from a master that installed the cassette can record into the same file.
+    """
+
+    def __init__(self, path, mode, replay_timing=LLM_REPLAY_TIMING):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode '{mode}'; use 'record' or 'replay'.")
+        self.path = path
+        self.mode = mode
+        self.replay_timing = replay_timing
+        self._lock = threading.Lock()
+        self._seen = {}  # key -> occurrences so far in this process
+        self._interactions = {}  # (key, seq) -> interaction
+        self._fd = None
+        self._fd_pid = None
+        if mode == 'replay':
+            for interaction in load_interactions(path):
+                self._interactions[(interaction['key'], interaction['seq'])] = interaction
+        else:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _next_seq(self, key):
+        with self._lock:
+            seq = self._seen.get(key, 0)
+            self._seen[key] = seq + 1
+            return seq
+
+    def wrap(self, completion):
+        def cassette_completion(*args, **kwargs):
+            if args:
+                kwargs.setdefault('model', args[0])
+                if len(args) > 1:
+                    kwargs.setdefault('messages', args[1])
+            if kwargs.get('stream'):
+                return completion(**kwargs)  # streamed responses are passed through unrecorded
+            key = request_key(kwargs)
+            seq = self._next_seq(key)
+            if self.mode == 'replay':
+                return self._replay(key, seq)
+            started = time.perf_counter()
+            response = completion(**kwargs)
+            self._record(key, seq, time.perf_counter() - started, response)
+            return response
+        cassette_completion.__wrapped__ = completion
+        return cassette_completion
+
+    def _record(self, key, seq, elapsed, response):
+        data = response.model_dump() if hasattr(response, 'model_dump') else dict(response)
+        usage = data.get('usage') or {}
+        line = json.dumps({
+            'key': key, 'seq': seq, 'elapsed': round(elapsed, 4), 'recorded_at': time.time(),
+            'prompt_tokens': usage.get('prompt_tokens'), 'completion_tokens': usage.get('completion_tokens'),
+            'response': data,
+        }, separators=(',', ':'), default=str)
+        member = gzip.compress((line + '\n').encode('utf-8'))
+        with self._lock:
+            if self._fd_pid != os.getpid():
+                # Opened after fork: a descriptor inherited from the master would share its offset
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._fd_pid = os.getpid()
+            os.write(self._fd, member)
+
+    def _replay(self, key, seq):
+        interaction = self._interactions.get((key, seq))
+        if interaction is None:
+            # More identical calls than were recorded: reuse the last recorded answer
+            earlier = [i for (k, s), i in self._interactions.items() if k == key]
+            if not earlier:
+                raise CassetteMiss(f'No recorded response for request {key[:12]} in {self.path}')
+            interaction = max(earlier, key=lambda i: i['seq'])
+        if self.replay_timing:
+            time.sleep(interaction['elapsed'])
+        return litellm.ModelResponse(**interaction['response'])
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None and self._fd_pid == os.getpid():
+                os.close(self._fd)
+            self._fd = self._fd_pid = None
+
+
+_install_lock = threading.Lock()
+
+
+@contextmanager
+def use_cassette(name, mode, directory=LLM_CASSETTE_DIR, replay_timing=LLM_REPLAY_TIMING):
+    """Record or replay every litellm.completion made inside the block (process-wide)."""
+    cassette = Cassette(cassette_path(name, directory), mode, replay_timing)
+    with _install_lock:
+        original = litellm.completion
+        litellm.completion = cassette.wrap(original)
+    try:
+        yield cassette
+    finally:
+        with _install_lock:
+            litellm.completion = original
+        cassette.close()
+
+
+def install_from_env():
+    """Apply LLM_CASSETTE_MODE for the lifetime of the process; returns the Cassette or None."""
+    if LLM_CASSETTE_MODE in ('', 'off'):
+        return None
+    cassette = Cassette(cassette_path(LLM_CASSETTE_NAME), LLM_CASSETTE_MODE)
+    with _install_lock:
+        litellm.completion = cassette.wrap(litellm.completion)
+    return cassette
+
+
+def compare(baseline_path, candidate_path):
+    """Pair two recordings request-for-request (by key and occurrence) and diff time and tokens."""
+    baseline = {(i['key'], i['seq']): i for i in load_interactions(baseline_path)}
+    candidate = {(i['key'], i['seq']): i for i in load_interactions(candidate_path)}
+    rows = []
+    for pair in sorted(baseline.keys() & candidate.keys(), key=lambda p: baseline[p]['recorded_at']):
+        a, b = baseline[pair], candidate[pair]
+        rows.append({'key': pair[0][:12], 'seq': pair[1], 'elapsed': (a['elapsed'], b['elapsed']),
+                     'prompt_tokens': (a['prompt_tokens'], b['prompt_tokens']),
+                     'completion_tokens': (a['completion_tokens'], b['completion_tokens'])})
+    totals = {}
+    for name, recording in (('baseline', baseline), ('candidate', candidate)):
+        totals[name] = {
+            'requests': len(recording),
+            'elapsed': sum(i['elapsed'] for i in recording.values()),
+            'prompt_tokens': sum(i['prompt_tokens'] or 0 for i in recording.values()),
+            'completion_tokens': sum(i['completion_tokens'] or 0 for i in recording.values()),
+        }
+    return {'matched': rows, 'only_baseline': len(baseline.keys() - candidate.keys()),
+            'only_candidate': len(candidate.keys() - baseline.keys()), 'totals': totals}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two LLM cassette recordings request-for-request.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args(argv)
+    report = compare(args.baseline, args.candidate)
+    for row in report['matched']:
+        print(f"{row['key']}#{row['seq']}  elapsed {row['elapsed'][0]:.3f}s -> {row['elapsed'][1]:.3f}s  "
+              f"prompt {row['prompt_tokens'][0]} -> {row['prompt_tokens'][1]}  "
+              f"completion {row['completion_tokens'][0]} -> {row['completion_tokens'][1]}")
+    for name, totals in report['totals'].items():
+        print(f"{name:<9} requests {totals['requests']}  llm time {totals['elapsed']:.3f}s  "
+              f"prompt tokens {totals['prompt_tokens']}  completion tokens {totals['completion_tokens']}")
+    print(f"unmatched: {report['only_baseline']} only in baseline, {report['only_candidate']} only in candidate")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Run and stage deadlines, and hedged LLM calls.
+
+A run gets RUN_DEADLINE seconds and each stage STAGE_DEADLINE seconds (both capped by any
+enclosing deadline). Every LLM call made inside is bounded by what is left: its timeout is
+shortened to the remaining time and no call starts once the deadline has passed
+(``DeadlineExceeded``).
+
+A call still running after its stage's p95 LLM latency (HEDGE_DELAY until enough calls have
+been seen) gets a duplicate request, to the same model or the route's fallback
+(HEDGE_TARGET); the first valid response wins. Synchronous litellm calls cannot be
+interrupted, so the losing request is cancelled only if it has not started yet; otherwise its
+response is discarded when it arrives (its timeout is bounded by the deadline). Time a call
+spends waiting for rate-limit capacity (``request_queued``/``request_sent``) neither counts
+towards the hedge delay nor is recorded as provider latency. Calls are not hedged while an
+LLM cassette records or replays them: whether a hedge fires depends on timing, so its
+duplicate request would shift the cassette's occurrence numbers between runs.
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
+
+from backend.llms.routing import current_decision
+from backend.observability.tracing import record_event
+from backend.observability.metrics import stage_role, LLM_HEDGES
+
+RUN_DEADLINE = float(os.getenv('RUN_DEADLINE', '300'))        # seconds per analysis (0 = none)
+STAGE_DEADLINE = float(os.getenv('STAGE_DEADLINE', '120'))    # seconds per stage (0 = none)
+# Per-stage overrides, e.g. '{"dev": 180}'
+STAGE_DEADLINES = json.loads(os.getenv('STAGE_DEADLINES') or '{}')
+
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', '1') not in ('0', 'false', 'False')
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+HEDGE_DELAY = float(os.getenv('HEDGE_DELAY', '15'))           # until HEDGE_MIN_SAMPLES calls were seen
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_TARGET = os.getenv('HEDGE_TARGET', 'same')              # 'same' model or the route's 'fallback'
+HEDGE_POOL_SIZE = int(os.getenv('HEDGE_POOL_SIZE', '64'))
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting (or after timing out) an LLM call past the current deadline."""
+
+
+_deadline = contextvars.ContextVar('crew_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds):
+    """Bound the LLM calls made inside this block to ``seconds`` (0/None: only the enclosing deadline).
+
+    Yields the absolute deadline (a time.monotonic() value, or None).
+    """
+    outer = _deadline.get()
+    value = time.monotonic() + seconds if seconds else None
+    if outer is not None:
+        value = outer if value is None else min(outer, value)
+    token = _deadline.set(value)
+    try:
+        yield value
+    finally:
+        _deadline.reset(token)
+
+
+class Dispatch:
+    """When the current LLM request actually went out (None while it waits in the rate limiter)."""
+
+    def __init__(self):
+        self.sent_at = time.monotonic()
+
+    def queued(self):
+        self.sent_at = None
+
+    def sent(self):
+        self.sent_at = time.monotonic()
+
+
+_dispatch = contextvars.ContextVar('llm_dispatch', default=None)
+
+
+def request_queued():
+    """Called by the rate limiter before a request waits for capacity."""
+    dispatch = _dispatch.get()
+    if dispatch is not None:
+        dispatch.queued()
+
+
+def request_sent():
+    """Called by the rate limiter once the request is handed to the provider."""
+    dispatch = _dispatch.get()
+    if dispatch is not None:
+        dispatch.sent()
+
+
+def remaining():
+    """Seconds left before the current deadline (None when there is none)."""
+    value = _deadline.get()
+    return None if value is None else max(0.0, value - time.monotonic())
+
+
+def stage_deadline(stage_name):
+    return float(STAGE_DEADLINES.get(stage_name, STAGE_DEADLINE))
+
+
+class LatencyTracker:
+    """Recent successful LLM call latencies per role, for the hedging threshold."""
+
+    def __init__(self, window=200, min_samples=HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key, pct):
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100.0))]
+
+
+latency_tracker = LatencyTracker()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _hedge_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix='llm-hedge')
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def is_valid(response):
+    try:
+        return bool(response.choices)
+    except AttributeError:
+        return False
+
+
+def hedge_delay(role):
+    return latency_tracker.percentile(role, HEDGE_PERCENTILE) or HEDGE_DELAY
+
+
+def bounded(completion, hedge=HEDGE_REQUESTS):
+    """Wrap a litellm.completion-like function with the current deadline and (with ``hedge``) hedging."""
+    def bounded_completion(*args, **kwargs):
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded('Deadline reached before the LLM call could start.')
+            kwargs['timeout'] = min(kwargs.get('timeout') or left, left)
+        try:
+            role = stage_role()
+            delay = hedge_delay(role)
+            dispatch = Dispatch()
+            token = _dispatch.set(dispatch)
+            try:
+                if not hedge or kwargs.get('stream') or args or (left is not None and delay >= left):
+                    response = completion(*args, **kwargs)
+                    latency_tracker.record(role, time.monotonic() - dispatch.sent_at)
+                    return response
+                return _hedged(completion, kwargs, role, delay, dispatch)
+            finally:
+                _dispatch.reset(token)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if remaining() == 0:
+                raise DeadlineExceeded(f'Deadline reached during the LLM call ({type(e).__name__}).') from e
+            raise
+    bounded_completion.__wrapped__ = completion
+    return bounded_completion
+
+
+def _hedged(completion, kwargs, role, delay, dispatch):
+    pool = _hedge_pool()
+    primary = pool.submit(contextvars.copy_context().run, completion, **kwargs)
+
+    def record_primary(future):
+        if not future.cancelled() and future.exception() is None and dispatch.sent_at is not None:
+            latency_tracker.record(role, time.monotonic() - dispatch.sent_at)
+    primary.add_done_callback(record_primary)
+
+    # The delay runs from when the primary request went out: a hedge fired while it still waits
+    # for rate-limit capacity would only queue behind it and reserve the same tokens again
+    while True:
+        sent_at = dispatch.sent_at
+        timeout = delay if sent_at is None else sent_at + delay - time.monotonic()
+        try:
+            return primary.result(timeout=max(0.0, timeout))
+        except FutureTimeout:
+            sent_at = dispatch.sent_at
+            if sent_at is not None and time.monotonic() >= sent_at + delay:
+                break
+    decision = current_decision()
+    hedge_kwargs = dict(kwargs)
+    if HEDGE_TARGET == 'fallback' and decision and decision.get('fallback'):
+        hedge_kwargs['model'] = decision['fallback']
+    left = remaining()
+    if left is not None:
+        hedge_kwargs['timeout'] = min(hedge_kwargs.get('timeout') or left, left)
+    record_event('hedged_request', model=hedge_kwargs.get('model'), after=round(delay, 3))
+    hedge_context = contextvars.copy_context()
+    hedge_context.run(_dispatch.set, Dispatch())
+    hedge = pool.submit(hedge_context.run, completion, **hedge_kwargs)
+    branches = {primary: 'primary', hedge: 'hedge'}
+    pending, errors = set(branches), []
+    while pending:
+        finished, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+        if not finished:
+            raise DeadlineExceeded('Deadline reached while waiting for hedged LLM calls.')
+        for future in finished:
+            try:
+                response = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if is_valid(response):
+                for loser in pending:
+                    loser.cancel()
+                LLM_HEDGES.labels(role=role, winner=branches[future]).inc()
+                return response
+            errors.append(ValueError('LLM returned no choices'))
+    raise errors[0]
+
+
+def install(hedge=HEDGE_REQUESTS):
+    import litellm
+    litellm.completion = bounded(litellm.completion, hedge)
@@ -1,54 +1,169 @@
 import os
+import hashlib
+import threading
+import time
 from dotenv import load_dotenv
 #from langchain_groq import ChatGroq
-from litellm import completion
+import httpx
 import litellm
-litellm.set_verbose = True
+from crewai import LLM
+from backend.llms.cassette import install_from_env
+from backend.llms import aio
+from backend.pipeline import cancellation
+from backend.llms import ratelimit
+from backend.llms import routing
+from backend.llms.routing import normalize_model_name
+from backend.llms import deadlines
+from backend.observability import tracing
+from backend.observability.metrics import observe_llm_call
+from backend.logs import logs
 
 load_dotenv()
 
+# Per-agent sampling temperatures (same values as the Streamlit app)
+AGENT_TEMPERATURES = {
+    'ceo_llm': 0.7,
+    'cto_llm': 0.5,
+    'pm_llm': 0.4,
+    'dev_llm': 0.3,
+    'client_llm': 0.6,
+}
 
+# Server-wide key for requests that bring none. Read once at import and never written:
+# each run carries its own key (RunContext.api_key), the environment is not per-request state.
+DEFAULT_GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
-def get_llms(groq_api_key=None, model_name=None):
-    """Return a dict of LLMs for each agent, using the provided API key and model name."""
-    if not groq_api_key:
-        groq_api_key = os.getenv('GROQ_API_KEY')
-    if not model_name:
-        model_name = 'groq/gemma2-9b-it'  # Use a Groq-supported model name
-    # Ensure model_name is valid for Groq (must match Groq's supported models exactly)
-    # Remove any accidental whitespace
-    #model_name = model_name.strip()
+# Idle registry entries are dropped after this many seconds
+LLM_IDLE_TTL = float(os.getenv('LLM_IDLE_TTL', '900'))
+
+# Optional OpenAI-compatible endpoint overriding the provider's (e.g. the benchmark stub server)
+LLM_API_BASE = os.getenv('LLM_API_BASE') or None
+
+# Innermost: under the ASGI app the HTTP call itself runs as acompletion on its event loop
+aio.install()
+# No call starts (or returns) once its run is cancelled (see backend/pipeline/cancellation.py)
+cancellation.install()
+# Record/replay of completions when LLM_CASSETTE_MODE is set (see backend/llms/cassette.py)
+llm_cassette = install_from_env()
+# Per key/model request and token buckets with retry-after aware retries (not needed for replays)
+if not (llm_cassette and llm_cassette.mode == 'replay'):
+    ratelimit.install()
+# Bound each call by the run/stage deadline and hedge slow ones (see backend/llms/deadlines.py);
+# no hedging under a cassette, whose occurrence numbers must not depend on timing
+deadlines.install(hedge=deadlines.HEDGE_REQUESTS and llm_cassette is None)
+# Retry a failed or timed-out call once on the stage's fallback model (see backend/llms/routing.py)
+routing.install()
+# Sampled, redacted prompt/response logging (instead of litellm's synchronous verbose mode)
+logs.install()
+# Every completion becomes an 'llm_call' span and feeds the per-role LLM metrics
+tracing.install(observe=observe_llm_call)
+
+
+_client_session_pid = None
+_client_session_lock = threading.Lock()
+
+
+def init_client_session():
+    """Give this process one keep-alive HTTP connection pool shared by every litellm call,
+    so consecutive requests to Groq reuse TLS connections instead of reconnecting.
+
+    Created after fork (gunicorn post_worker_init, or lazily on first use): pooled sockets must
+    never be shared between a preloading master and its workers.
+    """
+    global _client_session_pid
+    if _client_session_pid == os.getpid():
+        return
+    with _client_session_lock:
+        if _client_session_pid != os.getpid():
+            litellm.client_session = httpx.Client(
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+                timeout=httpx.Timeout(120.0, connect=10.0),
+            )
+            _client_session_pid = os.getpid()
+
+
+def hash_api_key(api_key):
+    """Stable, non-reversible identifier for an API key (never store the key itself as a key)."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+class LLMRegistry:
+    """Process-wide registry of agent LLM handles keyed by (hashed API key, model, temperature,
+    max_tokens, timeout).
+
+    Handles are created on first use without any network round-trip and reused across
+    requests; entries not used for ``idle_ttl`` seconds are evicted.
+    """
+
+    def __init__(self, idle_ttl=LLM_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._entries = {}  # key -> (llm, last_used)
+        self._lock = threading.Lock()
+
+    def get(self, api_key, model, temperature, max_tokens=None, timeout=None):
+        key = (hash_api_key(api_key), model, temperature, max_tokens, timeout)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            # is_litellm: crewai would otherwise hand openai/anthropic/gemini/azure/bedrock models to
+            # its native SDK clients, bypassing every litellm.completion wrapper installed above
+            llm = entry[0] if entry else LLM(model=model, temperature=temperature, api_key=api_key,
+                                             base_url=LLM_API_BASE, max_tokens=max_tokens, timeout=timeout,
+                                             is_litellm=True)
+            self._entries[key] = (llm, now)
+        return llm
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now):
+        expired = [key for key, (_, last_used) in self._entries.items() if now - last_used > self.idle_ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+llm_registry = LLMRegistry()
+
+
+def resolve_api_key(groq_api_key=None):
+    """The request's key, or the server default; raises ValueError if neither is usable."""
+    groq_api_key = groq_api_key or DEFAULT_GROQ_API_KEY
     # Defensive: ensure groq_api_key is not None or empty
     if not groq_api_key or not isinstance(groq_api_key, str) or not groq_api_key.strip():
         raise ValueError("Groq API key is missing or invalid. Please provide a valid key.")
+    groq_api_key = groq_api_key.strip()
+    logs.register_secret(groq_api_key)
+    return groq_api_key
+
+
+def get_llms(groq_api_key=None, model_name=None, routes=None):
+    """Return a dict of LLMs for each agent, using the provided API key and model name.
+
+    With ``routes`` ({stage: {'model', 'max_tokens', 'timeout', ...}}, see routing.py) each
+    agent gets its own stage's model and limits instead. No completion is issued here; the
+    handles come from the shared registry and only talk to Groq when an agent actually runs.
+    The key is passed to each handle (and from there to every call), never set globally.
+    """
+    groq_api_key = resolve_api_key(groq_api_key)
+    init_client_session()
+    if routes is not None:
+        llms = {}
+        for name, temperature in AGENT_TEMPERATURES.items():
+            route = routes[name[:-len('_llm')]]
+            llms[name] = llm_registry.get(groq_api_key, normalize_model_name(route['model']), temperature,
+                                          route.get('max_tokens'), route.get('timeout'))
+        return llms
+    model_name = normalize_model_name(model_name)
     return {
-        'ceo_llm': completion(model="groq/llama3-8b-8192", 
-    messages=[
-       {"role": "user", "content": "hello from litellm"}
-   ],
-),
-        'cto_llm': completion(
-    model="groq/llama3-8b-8192", 
-    messages=[
-       {"role": "user", "content": "hello from litellm"}
-   ],
-),
-        'pm_llm': completion(
-    model="groq/llama3-8b-8192", 
-    messages=[
-       {"role": "user", "content": "hello from litellm"}
-   ],
-),
-        'dev_llm': completion(
-    model="groq/llama3-8b-8192", 
-    messages=[
-       {"role": "user", "content": "hello from litellm"}
-   ],
-),
-        'client_llm': completion(
-    model="groq/llama3-8b-8192", 
-    messages=[
-       {"role": "user", "content": "hello from litellm"}
-   ],
-),
+        name: llm_registry.get(groq_api_key, model_name, temperature)
+        for name, temperature in AGENT_TEMPERATURES.items()
     }
@@ -0,0 +1,333 @@
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+
+from backend.cache.cache import CACHE_DB_PATH
+from backend.context.budget import count_tokens
+from backend.context.context import current_run_context
+from backend.llms.deadlines import remaining, request_queued, request_sent, DeadlineExceeded
+from backend.pipeline.cancellation import check_cancelled
+from backend.observability.tracing import current_span
+
+# Provider ceilings per (API key, model). LLM_RATE_LIMITS can override them per model,
+# e.g. '{"groq/llama3-70b-8192": {"rpm": 30, "tpm": 6000}}'.
+LLM_RPM = float(os.getenv('LLM_RPM', '30'))
+LLM_TPM = float(os.getenv('LLM_TPM', '6000'))
+LLM_RATE_LIMITS = json.loads(os.getenv('LLM_RATE_LIMITS', '{}'))
+# The buckets are shared by every process on the host through a SQLite table next to the result
+# cache. With LLM_RATE_LIMIT_SHARED=0 each process keeps its own and gets an equal share of the
+# ceilings instead: by default the web workers times the crew pool processes of each.
+LLM_RATE_LIMIT_SHARED = os.getenv('LLM_RATE_LIMIT_SHARED', '1') not in ('0', 'false', 'False')
+LLM_RATE_LIMIT_PROCESSES = int(os.getenv('LLM_RATE_LIMIT_PROCESSES') or 0) or \
+    int(os.getenv('WEB_CONCURRENCY', '1')) * max(1, int(os.getenv('CREW_POOL_SIZE', '0')))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '120'))  # seconds a call may be held
+DEFAULT_COMPLETION_ESTIMATE = 512  # tokens reserved for a reply until replies of the key/model were seen
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderRateLimited(Exception):
+    """The provider kept rate-limiting a call past LLM_MAX_RETRIES / LLM_RATE_LIMIT_MAX_WAIT."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        # Keeps retry_after when the error is sent back from a crew pool process
+        return type(self), (str(self), self.retry_after)
+
+
+class TokenBucket:
+    """Classic token bucket holding up to ``per_minute`` units, refilled continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale=1.0):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0 * scale)
+        self.updated = now
+
+    def wait_time(self, amount, scale=1.0):
+        """Seconds until ``amount`` units are available (requests larger than the bucket wait for a full one)."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60.0 / (self.capacity * scale)) if missing > 0 else 0.0
+
+    def take(self, amount):
+        self.level -= amount
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class KeyLimiter:
+    """Request and token buckets for one (API key, model), with adaptive slow-down after 429s."""
+
+    MIN_SCALE = 0.2
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.scale = 1.0  # fraction of the nominal refill rate currently used
+        self.completion_estimate = float(DEFAULT_COMPLETION_ESTIMATE)  # average reply size seen so far
+        self._cond = threading.Condition()
+
+    def _update(self, work):
+        """Apply ``work()`` to the buckets under the lock and wake the waiting callers."""
+        with self._cond:
+            value = work()
+            self._cond.notify_all()
+            return value
+
+    def _try_take(self, tokens):
+        now = self.clock()
+        self.requests.refill(now, self.scale)
+        self.tokens.refill(now, self.scale)
+        wait = max(self.blocked_until - now,
+                   self.requests.wait_time(1, self.scale),
+                   self.tokens.wait_time(tokens, self.scale))
+        if wait <= 0:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        return wait
+
+    def acquire(self, tokens, deadline, check=None):
+        """Block until one request and ``tokens`` tokens fit; raise ProviderRateLimited past ``deadline``.
+
+        ``check()`` is called (without the lock) before every wait and may raise to give up.
+        """
+        while True:
+            wait = self._update(lambda: self._try_take(tokens))
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise ProviderRateLimited('No rate-limit capacity before the call would have to start.', wait)
+            if check is not None:
+                check()
+            with self._cond:
+                self._cond.wait(min(wait, 1.0))
+
+    def settle(self, reserved, used, completion=None):
+        """Return (or charge) the difference between the reserved and the actually used tokens,
+        and fold the reply's ``completion`` tokens into the estimate used for later reservations."""
+        def settle():
+            if used < reserved:
+                self.tokens.give(reserved - used)
+            else:
+                self.tokens.take(used - reserved)
+            self.scale = min(1.0, self.scale * 1.05)
+            if completion is not None:
+                self.completion_estimate += (completion - self.completion_estimate) * 0.2
+        self._update(settle)
+
+    def throttled(self, retry_after, reserved):
+        """A 429 arrived: hold every caller of this key/model for ``retry_after`` and slow down."""
+        def throttle():
+            self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+            self.tokens.give(reserved)
+            self.scale = max(self.MIN_SCALE, self.scale * 0.8)
+        self._update(throttle)
+
+    def release(self, reserved):
+        self._update(lambda: self.tokens.give(reserved))
+
+
+class SharedKeyLimiter(KeyLimiter):
+    """KeyLimiter whose buckets live in a SQLite row shared by every process on the host.
+
+    Each update loads the row, applies the change and writes it back in one ``BEGIN IMMEDIATE``
+    transaction, so all workers (and crew pool processes) draw from the provider's full ceilings.
+    """
+
+    clock = staticmethod(time.time)  # comparable across processes
+
+    def __init__(self, rpm, tpm, key, path=CACHE_DB_PATH, table='rate_limits'):
+        super().__init__(rpm, tpm)
+        self.key = key
+        self.path = path
+        self.table = table
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                key TEXT PRIMARY KEY,
+                requests REAL NOT NULL,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL,
+                blocked_until REAL NOT NULL,
+                scale REAL NOT NULL
+            )""")
+            self._initialized = True
+        return conn
+
+    def _load(self, conn):
+        row = conn.execute(f'SELECT requests, tokens, updated, blocked_until, scale FROM {self.table} WHERE key = ?',
+                           (self.key,)).fetchone()
+        if row is None:
+            row = (self.requests.capacity, self.tokens.capacity, self.clock(), 0.0, 1.0)
+        self.requests.level, self.tokens.level, updated, self.blocked_until, self.scale = row
+        self.requests.updated = self.tokens.updated = updated
+
+    def _store(self, conn):
+        conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, requests, tokens, updated, blocked_until, scale) '
+                     f'VALUES (?, ?, ?, ?, ?, ?)', (self.key, self.requests.level, self.tokens.level,
+                                                    self.tokens.updated, self.blocked_until, self.scale))
+
+    def _update(self, work):
+        with self._cond:
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    self._load(conn)
+                    value = work()
+                    self._store(conn)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                logger.exception('Could not update the shared rate-limit buckets; using this process\'s copy')
+                value = work()
+            self._cond.notify_all()
+            return value
+
+
+_RETRY_IN = re.compile(r'try again in (?:(\d+)m)?(\d+(?:\.\d+)?)(ms|s)', re.IGNORECASE)
+
+
+def is_rate_limit_error(error):
+    import litellm
+    return isinstance(error, getattr(litellm, 'RateLimitError', ())) or getattr(error, 'status_code', None) == 429
+
+
+def retry_after_seconds(error):
+    """Retry delay from a 429: the retry-after header if present, else Groq's 'try again in 1m2.5s'."""
+    for headers in (getattr(getattr(error, 'response', None), 'headers', None),
+                    getattr(error, 'litellm_response_headers', None)):
+        try:
+            value = headers and headers.get('retry-after')
+            if value:
+                return float(value)
+        except (TypeError, ValueError, AttributeError):
+            pass
+    match = _RETRY_IN.search(str(error))
+    if match:
+        minutes, amount, unit = match.groups()
+        seconds = float(amount) / 1000.0 if unit.lower() == 'ms' else float(amount)
+        return seconds + 60 * int(minutes or 0)
+    return None
+
+
+def estimate_tokens(kwargs, completion_estimate=DEFAULT_COMPLETION_ESTIMATE):
+    """Tokens to reserve for a call: its prompt plus the expected reply, at most ``max_tokens``.
+
+    Reserving the full ``max_tokens`` would hold most of a small bucket for replies that are
+    usually far shorter; the difference is settled once the response reports its usage.
+    """
+    messages = kwargs.get('messages') or []
+    prompt = '\n'.join(str(m.get('content') or '') for m in messages if isinstance(m, dict))
+    completion = int(completion_estimate)
+    if kwargs.get('max_tokens'):
+        completion = min(completion, kwargs['max_tokens'])
+    return count_tokens(prompt) + completion
+
+
+class RateLimitScheduler:
+    """Every completion goes through here: held until its key/model has capacity, and on a
+    429 only that call is retried (after retry-after) rather than the whole crew."""
+
+    def __init__(self, max_retries=LLM_MAX_RETRIES, max_wait=LLM_RATE_LIMIT_MAX_WAIT,
+                 shared=LLM_RATE_LIMIT_SHARED, processes=LLM_RATE_LIMIT_PROCESSES):
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self.shared = shared
+        self.processes = max(1, processes)
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, api_key, model):
+        from backend.llms.llm import hash_api_key
+        key = (hash_api_key(api_key or ''), model)
+        with self._lock:
+            if key not in self._limiters:
+                limits = LLM_RATE_LIMITS.get(model, {})
+                rpm, tpm = limits.get('rpm', LLM_RPM), limits.get('tpm', LLM_TPM)
+                if self.shared:
+                    self._limiters[key] = SharedKeyLimiter(rpm, tpm, f'{key[0]}:{model}')
+                else:
+                    self._limiters[key] = KeyLimiter(rpm / self.processes, tpm / self.processes)
+            return self._limiters[key]
+
+    def wrap(self, completion):
+        def scheduled_completion(*args, **kwargs):
+            model = kwargs.get('model') or (args[0] if args else None)
+            run_context = current_run_context()
+            limiter = self.limiter(kwargs.get('api_key') or (run_context.api_key if run_context else None), model)
+            reserved = estimate_tokens(kwargs, limiter.completion_estimate)
+            # Held at most max_wait, and never past the run's or stage's deadline
+            left = remaining()
+            wait_limit = self.max_wait if left is None else min(self.max_wait, left)
+            deadline = time.monotonic() + wait_limit
+            retry_after = None
+            for attempt in range(self.max_retries + 1):
+                request_queued()
+                try:
+                    limiter.acquire(reserved, deadline, check=check_cancelled)
+                except ProviderRateLimited:
+                    if wait_limit < self.max_wait:
+                        raise DeadlineExceeded('Deadline reached while the LLM call waited for rate-limit capacity.')
+                    raise
+                request_sent()
+                left = remaining()
+                if left is not None:
+                    kwargs['timeout'] = min(kwargs.get('timeout') or left, left)  # less is left after waiting
+                try:
+                    response = completion(*args, **kwargs)
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        limiter.release(reserved)
+                        raise
+                    retry_after = retry_after_seconds(e) or min(30.0, 2 ** attempt) * (0.5 + random.random())
+                    limiter.throttled(retry_after, reserved)
+                    span = current_span()
+                    if span is not None:
+                        span.set(retries=attempt + 1, rate_limited=True)
+                    continue
+                except BaseException:
+                    # RunCancelled (and other BaseExceptions): the reservation was never used either
+                    limiter.release(reserved)
+                    raise
+                usage = getattr(response, 'usage', None)
+                used = getattr(usage, 'total_tokens', None) if usage is not None else None
+                limiter.settle(reserved, used if used is not None else reserved,
+                               getattr(usage, 'completion_tokens', None) if usage is not None else None)
+                return response
+            raise ProviderRateLimited(
+                f'{model} is still rate-limited after {self.max_retries} retries. Please retry shortly.', retry_after)
+        scheduled_completion.__wrapped__ = completion
+        return scheduled_completion
+
+
+rate_limit_scheduler = RateLimitScheduler()
+
+
+def install():
+    import litellm
+    litellm.completion = rate_limit_scheduler.wrap(litellm.completion)
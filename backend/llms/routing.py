@@ -0,0 +1,135 @@
+"""Per-role model routing: the model and max_tokens each stage runs with, and its fallback.
+
+The CEO and CTO stages only produce small structured outputs, so they go to a small fast
+model; the Dev plan is the longest and most technical answer and goes to a larger one.
+A call that times out, fails to connect or gets a 5xx on the primary model is retried once
+on the route's fallback, and the rest of that stage stays on the fallback. Errors another
+model would hit too (deadline, rate limit, bad key or request) are raised as they are. Every run reports what it
+did per stage under ``routing`` in the result.
+"""
+import os
+import json
+import contextvars
+from contextlib import contextmanager
+
+from backend.observability.tracing import record_event
+
+DEFAULT_MODEL = 'groq/gemma2-9b-it'  # Use a Groq-supported model name
+
+# stage -> model (litellm id), max_tokens, timeout (seconds per call) and fallback model.
+# Every route is called through litellm.completion, where the rate limiter, deadlines and
+# hedging, cancellation, cassettes, fallback and tracing are installed: the agent LLMs are
+# created with is_litellm=True so crewai does not send openai/anthropic/gemini/azure/bedrock
+# models to its native SDK clients instead. crewai still needs its extra for those providers
+# installed (e.g. crewai[anthropic]) to construct such an LLM at all.
+DEFAULT_ROUTES = {
+    'ceo': {'model': 'groq/llama-3.1-8b-instant', 'max_tokens': 1024, 'timeout': 30, 'fallback': 'groq/gemma2-9b-it'},
+    'cto': {'model': 'groq/llama-3.1-8b-instant', 'max_tokens': 1024, 'timeout': 30, 'fallback': 'groq/gemma2-9b-it'},
+    'pm': {'model': 'groq/gemma2-9b-it', 'max_tokens': 2048, 'timeout': 60, 'fallback': 'groq/llama-3.1-8b-instant'},
+    'dev': {'model': 'groq/llama-3.3-70b-versatile', 'max_tokens': 4096, 'timeout': 90, 'fallback': 'groq/gemma2-9b-it'},
+    'client': {'model': 'groq/gemma2-9b-it', 'max_tokens': 2048, 'timeout': 60, 'fallback': 'groq/llama-3.1-8b-instant'},
+}
+
+
+def normalize_model_name(model_name=None):
+    """Return a litellm model id with the provider prefix (e.g. 'groq/gemma2-9b-it')."""
+    model_name = (model_name or DEFAULT_MODEL).strip()
+    if '/' not in model_name:
+        model_name = f'groq/{model_name}'
+    return model_name
+
+
+def load_routes():
+    """DEFAULT_ROUTES with per-stage overrides from MODEL_ROUTES, e.g. '{"dev": {"model": "groq/gemma2-9b-it"}}'.
+
+    Models and fallbacks are given their provider prefix, so 'gemma2-9b-it' works for either.
+    """
+    overrides = json.loads(os.getenv('MODEL_ROUTES') or '{}')
+    routes = {}
+    for stage_name, route in DEFAULT_ROUTES.items():
+        route = dict(route, **overrides.get(stage_name, {}))
+        route['model'] = normalize_model_name(route['model'])
+        if route.get('fallback'):
+            route['fallback'] = normalize_model_name(route['fallback'])
+        routes[stage_name] = route
+    return routes
+
+
+MODEL_ROUTES = load_routes()
+
+
+def routes_signature(routes, stages=None):
+    """Stable string of the routes that affect an output (part of the cache keys)."""
+    stages = stages or sorted(routes)
+    return json.dumps({stage_name: [routes[stage_name]['model'], routes[stage_name].get('max_tokens')]
+                       for stage_name in stages}, sort_keys=True)
+
+
+def route_decision(route):
+    """What one run records for a stage; 'used' and 'fallback_reason' change if it falls back."""
+    return {
+        'model': route['model'],
+        'max_tokens': route.get('max_tokens'),
+        'fallback': route.get('fallback'),
+        'used': route['model'],
+        'fallback_reason': None,
+    }
+
+
+_current_decision = contextvars.ContextVar('crew_model_route', default=None)
+
+
+def current_decision():
+    return _current_decision.get()
+
+
+@contextmanager
+def use_route(decision):
+    """Route the LLM calls made inside this block (one stage) by ``decision``."""
+    token = _current_decision.set(decision)
+    try:
+        yield decision
+    finally:
+        _current_decision.reset(token)
+
+
+def should_fall_back(error):
+    """True for errors the fallback model may avoid: timeouts, connection errors and 5xx responses."""
+    import litellm
+    from backend.llms.deadlines import DeadlineExceeded
+    from backend.llms.ratelimit import ProviderRateLimited
+    if isinstance(error, (DeadlineExceeded, ProviderRateLimited)):
+        return False
+    transient = tuple(getattr(litellm, name) for name in ('Timeout', 'APIConnectionError', 'InternalServerError',
+                                                          'ServiceUnavailableError') if hasattr(litellm, name))
+    if isinstance(error, transient + (TimeoutError, ConnectionError)):
+        return True  # litellm's Timeout carries status 408
+    status = getattr(error, 'status_code', None)
+    return isinstance(status, int) and status >= 500
+
+
+def with_fallback(completion):
+    """Wrap a litellm.completion-like function with the current stage's model fallback."""
+    def routed_completion(*args, **kwargs):
+        decision = _current_decision.get()
+        if args or decision is None or not decision.get('fallback'):
+            return completion(*args, **kwargs)
+        if decision['fallback_reason']:
+            return completion(**dict(kwargs, model=decision['fallback']))
+        try:
+            return completion(**kwargs)
+        except Exception as e:
+            if not should_fall_back(e):
+                raise
+            decision['fallback_reason'] = f'{type(e).__name__}: {e}'[:300]
+            decision['used'] = decision['fallback']
+            record_event('model_fallback', model=kwargs.get('model'), fallback=decision['fallback'],
+                         error=type(e).__name__)
+            return completion(**dict(kwargs, model=decision['fallback']))
+    routed_completion.__wrapped__ = completion
+    return routed_completion
+
+
+def install():
+    import litellm
+    litellm.completion = with_fallback(litellm.completion)
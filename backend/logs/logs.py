@@ -0,0 +1,240 @@
+"""Process logging: a non-blocking queue handler, per-component levels, redaction and sampled
+LLM payload logging (replaces ``litellm.set_verbose``).
+
+Request threads only render the message and put the record on a bounded queue; a listener
+thread (started lazily in each process, so it survives gunicorn's fork) redacts, truncates
+and writes it. Full prompt/response bodies are logged for a sample of LLM calls, for every
+failed call, and for all calls of an analysis that fails (``capture_failures``).
+"""
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+# Per-environment defaults; every value can be overridden by the variables below
+LOG_PRESETS = {
+    'development': {
+        'level': 'DEBUG',
+        'levels': {'LiteLLM': 'INFO', 'httpx': 'INFO', 'httpcore': 'INFO'},
+        'sample_rate': 1.0,
+        'crew_verbose': True,
+    },
+    'production': {
+        'level': 'INFO',
+        'levels': {'LiteLLM': 'WARNING', 'httpx': 'WARNING', 'httpcore': 'WARNING', 'crewai': 'WARNING'},
+        'sample_rate': 0.01,
+        'crew_verbose': False,
+    },
+}
+LOG_ENV = os.getenv('LOG_ENV', 'production')
+_preset = LOG_PRESETS.get(LOG_ENV, LOG_PRESETS['production'])
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', _preset['level']).upper()
+# Per-logger overrides, e.g. 'crewai_agency.llm=DEBUG,LiteLLM=ERROR'
+LOG_LEVELS = dict(_preset['levels'], **{
+    name.strip(): level.strip().upper()
+    for name, _, level in (item.partition('=') for item in os.getenv('LOG_LEVELS', '').split(','))
+    if name.strip() and level.strip()
+})
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')                       # 'text' or 'json'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))          # records dropped beyond this
+LOG_PROMPT_SAMPLE_RATE = float(os.getenv('LOG_PROMPT_SAMPLE_RATE', str(_preset['sample_rate'])))
+LOG_MAX_PAYLOAD = int(os.getenv('LOG_MAX_PAYLOAD', '4000'))         # chars of a sampled LLM payload
+LOG_MAX_MESSAGE = int(os.getenv('LOG_MAX_MESSAGE', '100000'))       # hard cap for any record
+# crewai's verbose mode prints every prompt and answer to stdout synchronously, bypassing the
+# queue and the redaction above, so it is only on where that is wanted (development)
+CREW_VERBOSE = os.getenv('CREW_VERBOSE', '1' if _preset['crew_verbose'] else '0') not in ('0', 'false', 'False')
+
+llm_logger = logging.getLogger('crewai_agency.llm')
+
+_SECRET_PATTERNS = [
+    re.compile(r'gsk_[A-Za-z0-9]{8,}'),                               # Groq keys
+    re.compile(r'sk-[A-Za-z0-9_\-]{8,}'),                             # OpenAI-style keys
+    re.compile(r'(?i)(bearer\s+)[A-Za-z0-9_\-.=]{8,}'),
+    re.compile(r'''(?i)(["']?(?:groq_api_key|api_key|authorization|x-api-key)["']?\s*[:=]\s*["']?)[^"',\s})]+'''),
+]
+_known_secrets = set()
+_MAX_KNOWN_SECRETS = 256
+
+
+def register_secret(value):
+    """Redact this exact value (e.g. a request's groq_api_key) from every log record."""
+    if value and len(_known_secrets) < _MAX_KNOWN_SECRETS:
+        _known_secrets.add(value)
+
+
+def redact(text):
+    for secret in list(_known_secrets):
+        if secret in text:
+            text = text.replace(secret, '[REDACTED]')
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(lambda m: (m.group(1) if m.groups() else '') + '[REDACTED]', text)
+    return text
+
+
+def truncate(text, limit):
+    if limit and len(text) > limit:
+        return f'{text[:limit]}… [{len(text) - limit} chars truncated]'
+    return text
+
+
+class RedactingFilter(logging.Filter):
+    """Runs on the listener thread: redacts secrets and caps the size of every record."""
+
+    def filter(self, record):
+        record.msg = truncate(redact(record.getMessage()), LOG_MAX_MESSAGE)
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'ts': record.created, 'level': record.levelname, 'logger': record.name, 'msg': record.getMessage()}
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: records beyond the queue size are dropped and counted.
+
+    The listener thread is started on first use in each process, so a handler configured in a
+    preloading gunicorn master still works in the forked workers.
+    """
+
+    def __init__(self, target, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                # A queue inherited across fork may hold records (and a lock) from the parent
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # Render on the calling thread (arguments may change later); exc_info stays for the listener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f'{dropped} log records dropped (log queue full)'}))
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+
+
+_handler = None
+
+
+def configure_logging():
+    """Install the queue handler on the root logger and apply the levels (idempotent)."""
+    global _handler
+    if _handler is not None:
+        return _handler
+    output = logging.StreamHandler(sys.stderr)
+    output.addFilter(RedactingFilter())
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else
+                        logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    _handler = AsyncQueueHandler(output)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+    atexit.register(_handler.stop)
+    return _handler
+
+
+# LLM payloads of the current analysis, emitted only if it fails (see capture_failures)
+_failure_buffer = contextvars.ContextVar('crew_log_failure_buffer', default=None)
+_MAX_BUFFERED_CALLS = 50
+
+
+def llm_payload(kwargs, response=None, limit=LOG_MAX_PAYLOAD):
+    """JSON of a completion's request (without credentials) and response text, truncated."""
+    payload = {key: kwargs.get(key) for key in ('model', 'messages', 'tools', 'temperature', 'max_tokens')
+               if kwargs.get(key) is not None}
+    if kwargs.get('stream'):
+        payload['response'] = '<stream>'
+    elif response is not None:
+        try:
+            payload['response'] = response.choices[0].message.content
+        except (AttributeError, IndexError, TypeError):
+            payload['response'] = str(response)
+    return truncate(json.dumps(payload, default=str), limit)
+
+
+def logged(completion, sample_rate=None):
+    """Wrap a litellm.completion-like function with sampled payload logging."""
+    def logged_completion(*args, **kwargs):
+        rate = LOG_PROMPT_SAMPLE_RATE if sample_rate is None else sample_rate
+        try:
+            response = completion(*args, **kwargs)
+        except Exception as e:
+            llm_logger.error('LLM call failed (%s: %s): %s', type(e).__name__, e, llm_payload(kwargs, limit=0))
+            raise
+        if rate > 0 and random.random() < rate:
+            llm_logger.info('LLM call: %s', llm_payload(kwargs, response))
+        else:
+            buffer = _failure_buffer.get()
+            if buffer is not None and len(buffer) < _MAX_BUFFERED_CALLS:
+                buffer.append((kwargs, response))
+        return response
+    logged_completion.__wrapped__ = completion
+    return logged_completion
+
+
+@contextmanager
+def capture_failures():
+    """Keep this analysis' unsampled LLM payloads and log them in full only if it raises."""
+    buffer = []
+    token = _failure_buffer.set(buffer)
+    try:
+        yield
+    except Exception:
+        for kwargs, response in buffer:
+            llm_logger.warning('LLM call of a failed analysis: %s', llm_payload(kwargs, response, limit=0))
+        raise
+    finally:
+        _failure_buffer.reset(token)
+
+
+def install(sample_rate=None):
+    """Log (sampled) payloads of every litellm.completion call of the process."""
+    import litellm
+    litellm.set_verbose = False
+    litellm.completion = logged(litellm.completion, sample_rate)
@@ -0,0 +1,66 @@
+import os
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               generate_latest, CONTENT_TYPE_LATEST)
+from prometheus_client import multiprocess
+
+from backend.observability.tracing import current_span
+
+# Display names of the five stages, used as the 'role' label
+STAGE_ROLES = {'ceo': 'CEO', 'cto': 'CTO', 'pm': 'PM', 'dev': 'Dev', 'client': 'Client'}
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+REQUEST_LATENCY = Histogram('crew_request_duration_seconds', 'End-to-end latency of analysis requests',
+                            ['endpoint', 'cache'], buckets=LATENCY_BUCKETS)
+STAGE_LATENCY = Histogram('crew_stage_duration_seconds', 'Latency of each pipeline stage, per agent role',
+                          ['role', 'source'], buckets=LATENCY_BUCKETS)
+LLM_LATENCY = Histogram('crew_llm_call_duration_seconds', 'Latency of individual LLM calls, per agent role',
+                        ['role', 'model'], buckets=LATENCY_BUCKETS)
+LLM_TOKENS = Counter('crew_llm_tokens_total', 'Prompt and completion tokens, per agent role',
+                     ['role', 'type'])
+LLM_ERRORS = Counter('crew_llm_errors_total', 'Failed LLM calls, per agent role', ['role'])
+ANALYSES_IN_FLIGHT = Gauge('crew_analyses_in_flight', 'Crew runs currently executing', multiprocess_mode='livesum')
+LLM_HEDGES = Counter('crew_llm_hedged_total', 'Hedged duplicate LLM requests, per role and winning branch',
+                     ['role', 'winner'])
+DEGRADED_RUNS = Counter('crew_degraded_runs_total', 'Analyses returned without every stage after a deadline')
+COALESCED_REQUESTS = Counter('crew_coalesced_requests_total',
+                             'Requests served by joining an identical in-flight analysis', ['scope'])
+CREW_RUN_PEAK_RSS = Histogram('crew_run_peak_rss_bytes', 'Peak resident memory of a crew pool process during one run',
+                              buckets=[2 ** 20 * mb for mb in (128, 256, 384, 512, 768, 1024, 1536, 2048, 4096)])
+CREW_WORKERS_RECYCLED = Counter('crew_pool_recycled_total', 'Crew pool processes retired, per reason', ['reason'])
+JOB_QUEUE_DEPTH = Gauge('crew_job_queue_depth', 'Background jobs queued or running', multiprocess_mode='livesum')
+ADMISSION_QUEUE_DEPTH = Gauge('crew_admission_queue_depth', 'Crew runs waiting for an admission slot, per priority',
+                              ['priority'], multiprocess_mode='livesum')
+ADMISSION_WAIT = Histogram('crew_admission_wait_seconds', 'Time crew runs waited for an admission slot, per priority',
+                           ['priority'], buckets=LATENCY_BUCKETS)
+
+
+def stage_role(s=None):
+    """Role label of the stage ``s`` (default: the current span) belongs to ('none' outside a stage)."""
+    s = s if s is not None else current_span()
+    while s is not None:
+        if 'stage' in s.attributes:
+            return STAGE_ROLES.get(s.attributes['stage'], s.attributes['stage'])
+        s = s.parent
+    return 'none'
+
+
+def observe_llm_call(s):
+    """tracing.install() hook: feed a finished llm_call span into the metrics."""
+    role = stage_role(s)
+    LLM_LATENCY.labels(role=role, model=s.attributes.get('model') or 'unknown').observe(s.duration)
+    LLM_TOKENS.labels(role=role, type='prompt').inc(s.prompt_tokens)
+    LLM_TOKENS.labels(role=role, type='completion').inc(s.completion_tokens)
+    if 'error' in s.attributes:
+        LLM_ERRORS.labels(role=role).inc()
+
+
+def render():
+    """Return ``(body, content_type)`` for /metrics, aggregating all gunicorn workers when
+    PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
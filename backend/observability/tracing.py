@@ -0,0 +1,143 @@
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger('crewai_agency.tracing')
+
+_current_span = contextvars.ContextVar('crew_current_span', default=None)
+
+# Most recent finished root spans, for debugging from a shell or a test
+recent_traces = deque(maxlen=50)
+
+
+class Span:
+    """One timed unit of work: request -> task -> agent step / LLM call / tool call.
+
+    Token counts added to a span are also added to all of its ancestors, so a task span
+    carries the total prompt/completion tokens of its LLM calls.
+    """
+
+    def __init__(self, name, kind, parent=None, **attributes):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes)
+        self.events = []
+        self.children = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+        if parent is not None:
+            with parent._lock:
+                parent.children.append(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_event(self, name, **attributes):
+        with self._lock:
+            self.events.append({'name': name, 'offset': time.perf_counter() - self._start, **attributes})
+
+    def add_tokens(self, prompt_tokens=0, completion_tokens=0):
+        span = self
+        while span is not None:
+            with span._lock:
+                span.prompt_tokens += prompt_tokens or 0
+                span.completion_tokens += completion_tokens or 0
+            span = span.parent
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'attributes': self.attributes,
+            'events': self.events,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def span(name, kind='internal', **attributes):
+    """Open a child of the current span (or a new root span) for the duration of the block."""
+    parent = _current_span.get()
+    s = Span(name, kind, parent, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set(error=f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        s.finish()
+        _current_span.reset(token)
+        if parent is None:
+            export(s)
+
+
+def export(root):
+    """Finished root spans go to the tracing logger as one JSON line each."""
+    recent_traces.append(root)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(root.to_dict(), default=str))
+
+
+def record_event(name, **attributes):
+    s = _current_span.get()
+    if s is not None:
+        s.add_event(name, **attributes)
+
+
+def trace_agent_step(step):
+    """crewai step_callback: mark each agent step (tool action or final answer) on the task span."""
+    record_event('agent_step', step=type(step).__name__, tool=getattr(step, 'tool', None))
+
+
+def traced(completion, observe=None):
+    """Wrap a litellm.completion-like function so each call becomes an 'llm_call' span.
+
+    ``observe(span)`` is called once the span is finished (used to feed metrics).
+    """
+    def traced_completion(*args, **kwargs):
+        model = kwargs.get('model') or (args[0] if args else None)
+        s = None
+        try:
+            with span('llm_call', kind='llm', model=model, retries=0) as s:
+                response = completion(*args, **kwargs)
+                usage = getattr(response, 'usage', None)
+                if usage is not None and not kwargs.get('stream'):
+                    s.add_tokens(getattr(usage, 'prompt_tokens', 0), getattr(usage, 'completion_tokens', 0))
+        finally:
+            if observe and s is not None:
+                observe(s)
+        return response
+    traced_completion.__wrapped__ = completion
+    return traced_completion
+
+
+def install(observe=None):
+    """Trace every litellm.completion call of the process."""
+    import litellm
+    litellm.completion = traced(litellm.completion, observe)
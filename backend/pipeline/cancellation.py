@@ -0,0 +1,206 @@
+"""Cooperative cancellation of analysis runs.
+
+A run executes under a ``CancelToken`` (``cancel_registry.run(run_id)``). The token is
+checked before each stage starts, after every agent step, and before and after every LLM
+call. Under the ASGI app an LLM request still in flight is aborted. Otherwise the current
+call is allowed to finish and its response is dropped. Either way a cancelled run stops
+within one LLM-call latency.
+
+Runs are cancelled by id, from any worker: ``cancel_registry.cancel(run_id)`` flags the
+token directly if the run executes in this process and also records the request in a
+SQLite table next to the result cache, which tokens of other workers poll.
+
+``RunCancelled`` derives from BaseException (like asyncio.CancelledError) so that the
+``except Exception`` retry and fallback paths of crewai and the LLM wrappers do not swallow it.
+"""
+import os
+import re
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from backend.cache.cache import CACHE_DB_PATH
+
+CANCEL_POLL_INTERVAL = float(os.getenv('CANCEL_POLL_INTERVAL', '0.5'))  # seconds between checks of the shared table
+CANCEL_RETENTION = float(os.getenv('CANCEL_RETENTION', '3600'))         # seconds a cancel request is kept
+RUN_ID_PATTERN = re.compile(r'[0-9a-f]{32}')  # client-chosen run ids: uuid4().hex
+
+logger = logging.getLogger(__name__)
+
+
+class RunCancelled(BaseException):
+    """Raised inside a run once its token is cancelled."""
+
+
+class RunIdInUse(ValueError):
+    """A client-chosen run id that a run already used (see ``CancelRegistry.claim``)."""
+
+
+class CancelToken:
+    def __init__(self, run_id, registry=None, poll_interval=CANCEL_POLL_INTERVAL):
+        self.run_id = run_id
+        self.reason = None
+        self.poll_interval = poll_interval
+        self._registry = registry
+        self._event = threading.Event()
+        self._checked_at = 0.0
+
+    def cancel(self, reason='cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        now = time.monotonic()
+        if self._registry is not None and now - self._checked_at >= self.poll_interval:
+            self._checked_at = now
+            if self._registry.requested(self.run_id):
+                self.cancel('cancel requested')
+        return self._event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise RunCancelled(f'Run {self.run_id} was cancelled ({self.reason}).')
+
+
+_current_token = contextvars.ContextVar('crew_cancel_token', default=None)
+
+
+def current_token():
+    return _current_token.get()
+
+
+def check_cancelled():
+    """Raise RunCancelled if the current run has been cancelled (no-op outside a run)."""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+class CancelRegistry:
+    """Tokens of the runs executing in this process, plus cancel requests shared by all workers."""
+
+    def __init__(self, path=CACHE_DB_PATH, table='cancellations', retention=CANCEL_RETENTION):
+        self.path = path
+        self.table = table
+        self.retention = retention
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                run_id TEXT PRIMARY KEY,
+                requested_at REAL NOT NULL
+            )""")
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table}_claims (
+                run_id TEXT PRIMARY KEY,
+                claimed_at REAL NOT NULL
+            )""")
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def run(self, run_id=None, resume=False):
+        """Execute the block as run ``run_id`` (a new id by default); yields its CancelToken.
+
+        A new run clears an earlier cancel request for the same id, so a reused id does not
+        start out cancelled. Ids reserved with ``claim`` are single-use, so their cancel
+        requests are kept: a client may cancel its run while it still waits for admission.
+        With ``resume`` the block continues a run registered before (a crew pool process, a
+        queued job) and a cancel request made meanwhile still applies.
+        Registering the id of the run already current in this context just joins it.
+        """
+        current = _current_token.get()
+        if current is not None and run_id is not None and current.run_id == run_id:
+            yield current
+            return
+        if run_id is not None and not resume:
+            self.clear(run_id)
+        token = CancelToken(run_id or uuid.uuid4().hex, registry=self)
+        with self._lock:
+            self._tokens[token.run_id] = token
+        context_token = _current_token.set(token)
+        try:
+            yield token
+        finally:
+            _current_token.reset(context_token)
+            with self._lock:
+                if self._tokens.get(token.run_id) is token:
+                    del self._tokens[token.run_id]
+
+    def cancel(self, run_id, reason='cancel requested'):
+        """Cancel ``run_id`` wherever it runs; returns True if it was running in this process."""
+        with self._lock:
+            token = self._tokens.get(run_id)
+        if token is not None:
+            token.cancel(reason)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(f'INSERT OR REPLACE INTO {self.table} (run_id, requested_at) VALUES (?, ?)', (run_id, now))
+                conn.execute(f'DELETE FROM {self.table} WHERE requested_at < ?', (now - self.retention,))
+        except sqlite3.Error:
+            logger.exception('Could not record the cancel request for other workers')
+        return token is not None
+
+    def claim(self, run_id):
+        """Reserve a client-chosen run id; False if any worker used it in the last ``retention`` seconds."""
+        with self._lock:
+            if run_id in self._tokens:
+                return False
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(f'DELETE FROM {self.table}_claims WHERE claimed_at < ?', (now - self.retention,))
+                conn.execute(f'INSERT INTO {self.table}_claims (run_id, claimed_at) VALUES (?, ?)', (run_id, now))
+        except sqlite3.IntegrityError:
+            return False
+        except sqlite3.Error:
+            logger.exception('Could not reserve the run id for other workers')
+        return True
+
+    def clear(self, run_id):
+        """Drop an earlier cancel request for ``run_id`` unless the id was claimed."""
+        try:
+            with self._connect() as conn:
+                conn.execute(f'DELETE FROM {self.table} WHERE run_id = ? AND run_id NOT IN '
+                             f'(SELECT run_id FROM {self.table}_claims)', (run_id,))
+        except sqlite3.Error:
+            logger.exception('Could not clear an earlier cancel request')
+
+    def requested(self, run_id):
+        try:
+            with self._connect() as conn:
+                return conn.execute(f'SELECT 1 FROM {self.table} WHERE run_id = ?', (run_id,)).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+
+cancel_registry = CancelRegistry()
+
+
+def cancellable(completion):
+    """Wrap a litellm.completion-like function: no call starts, and no response is used, once the run is cancelled."""
+    def cancellable_completion(*args, **kwargs):
+        check_cancelled()
+        response = completion(*args, **kwargs)
+        check_cancelled()
+        return response
+    cancellable_completion.__wrapped__ = completion
+    return cancellable_completion
+
+
+def install():
+    import litellm
+    litellm.completion = cancellable(litellm.completion)
@@ -0,0 +1,86 @@
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+PIPELINE_PARALLELISM = int(os.getenv('PIPELINE_PARALLELISM', '2'))
+
+
+def validate_graph(graph):
+    """Raise ValueError if ``graph`` ({stage: [dependencies]}) references unknown stages or has a cycle."""
+    for stage, deps in graph.items():
+        unknown = [dep for dep in deps if dep not in graph]
+        if unknown:
+            raise ValueError(f"Stage '{stage}' depends on unknown stage(s): {', '.join(unknown)}")
+    visiting, visited = set(), set()
+
+    def visit(stage):
+        if stage in visited:
+            return
+        if stage in visiting:
+            raise ValueError(f"Pipeline graph has a cycle through stage '{stage}'")
+        visiting.add(stage)
+        for dep in graph[stage]:
+            visit(dep)
+        visiting.discard(stage)
+        visited.add(stage)
+
+    for stage in graph:
+        visit(stage)
+
+
+def run_dag(graph, run_stage, completed=(), max_parallel=PIPELINE_PARALLELISM, deadline=None, tolerate=()):
+    """Run every stage of ``graph`` as soon as all of its dependencies have finished.
+
+    ``run_stage(stage)`` is called on a pool of at most ``max_parallel`` threads. Stages in
+    ``completed`` are treated as already done. The first stage failure cancels the stages
+    that have not started and is re-raised, except for failures of a type in ``tolerate``,
+    which only drop that stage and the stages depending on it. Once ``deadline`` (a
+    time.monotonic() value) passes, no further stage starts and running ones are abandoned;
+    so are the running stages when a failure is re-raised.
+    Returns ``{stage: run_stage(stage)}`` for the stages that finished.
+    """
+    validate_graph(graph)
+    done = set(completed)
+    dropped = set()
+    results = {}
+    running = {}  # future -> stage
+    abandon = False
+    executor = ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix='crew-stage')
+    try:
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                abandon = True
+                break
+            for stage, deps in graph.items():
+                if stage in done or stage in dropped or stage in running.values():
+                    continue
+                if any(dep in dropped for dep in deps):
+                    dropped.add(stage)
+                elif all(dep in done for dep in deps):
+                    # Each stage runs in a copy of the caller's context so tracing spans nest correctly
+                    running[executor.submit(contextvars.copy_context().run, run_stage, stage)] = stage
+            if not running:
+                break
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                error = future.exception()
+                if isinstance(error, tolerate):
+                    dropped.add(stage)
+                elif error is not None:
+                    for other in running:
+                        other.cancel()
+                    raise error
+                else:
+                    results[stage] = future.result()
+                    done.add(stage)
+    except BaseException:
+        abandon = True
+        raise
+    finally:
+        # Past the deadline, or when a failure propagates, the running stages are left to
+        # finish (or fail) in the background instead of delaying the result or the error
+        executor.shutdown(wait=not abandon, cancel_futures=True)
+    return results
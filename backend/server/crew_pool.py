@@ -0,0 +1,280 @@
+"""Crew runs in a pool of separate processes that are recycled before they grow.
+
+Agent histories, verbose logs and pydantic models make a long-lived process grow with every
+crew run. With CREW_POOL_SIZE > 0 each run executes in a pool process instead of the web
+worker. A process is retired after CREW_POOL_MAX_RUNS runs or once its RSS passes
+CREW_POOL_MAX_RSS_MB. At most CREW_POOL_SIZE runs execute at once, while CREW_POOL_SPARES
+extra processes are kept started and initialized, so a run never waits for a cold start
+when a process retires. Processes are created through a fork
+server that has already imported crewai/litellm (``forkserver``) and then run init_worker().
+
+Stage callbacks are relayed to the caller as they happen. Each result reports the run's peak
+memory under ``memory``. Cancelling the run (backend/pipeline/cancellation.py) reaches the pool
+process through the shared cancel table.
+"""
+import os
+import time
+import atexit
+import pickle
+import logging
+import threading
+import multiprocessing
+from queue import Queue, Empty
+
+from backend.pipeline.cancellation import cancel_registry, current_token, check_cancelled, RunCancelled
+from backend.observability.metrics import CREW_RUN_PEAK_RSS, CREW_WORKERS_RECYCLED
+
+CREW_POOL_SIZE = int(os.getenv('CREW_POOL_SIZE', '0'))                  # 0: run crews in the web process
+CREW_POOL_MAX_RUNS = int(os.getenv('CREW_POOL_MAX_RUNS', '50'))         # runs before a process is recycled
+CREW_POOL_MAX_RSS_MB = float(os.getenv('CREW_POOL_MAX_RSS_MB', '1024'))  # RSS after a run that triggers recycling
+CREW_POOL_SPARES = int(os.getenv('CREW_POOL_SPARES', '1'))              # pre-warmed processes beyond CREW_POOL_SIZE
+CREW_POOL_START_METHOD = os.getenv('CREW_POOL_START_METHOD', 'forkserver')
+
+logger = logging.getLogger(__name__)
+
+
+class CrewWorkerLost(Exception):
+    """The pool process running an analysis exited before returning its result."""
+
+
+def _status_kb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Restart the kernel's peak-RSS counter (VmHWM) for this process; False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def memory_usage():
+    """Current and peak RSS of this process in MB (peak since reset_peak_rss, else since start)."""
+    rss, peak = _status_kb('VmRSS'), _status_kb('VmHWM')
+    if rss is None:
+        import resource
+        peak = rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'rss_mb': round(rss / 1024, 1), 'peak_rss_mb': round((peak or rss) / 1024, 1)}
+
+
+def _portable_error(e):
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(f'{type(e).__name__}: {e}')
+
+
+def worker_main(conn):
+    """Pool process: initialize once, then run analyses sent by the parent until told to stop."""
+    from backend.logs.logs import configure_logging
+    from backend.server.startup import init_worker
+    from backend.agents.agents import run_project_analysis
+    configure_logging()
+    init_worker()
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    send(('ready', os.getpid()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        run_id, data, use_cache = job
+        reset_peak_rss()
+        try:
+            with cancel_registry.run(run_id, resume=True):
+                result = run_project_analysis(data, use_cache=use_cache,
+                                              on_task_complete=lambda stage, output: send(('stage', stage, output)))
+            send(('result', result, memory_usage()))
+        except RunCancelled as e:
+            send(('cancelled', str(e), memory_usage()))
+        except Exception as e:
+            send(('error', _portable_error(e), memory_usage()))
+
+
+class CrewWorker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.pid = process.pid
+        self.runs = 0
+        self.rss_mb = 0.0
+
+
+class CrewPool:
+    """Keeps ``size + spares`` initialized pool processes and hands each run to an idle one,
+    with at most ``size`` runs at a time so that ``spares`` processes are always idle."""
+
+    def __init__(self, size=CREW_POOL_SIZE, max_runs=CREW_POOL_MAX_RUNS, max_rss_mb=CREW_POOL_MAX_RSS_MB,
+                 spares=CREW_POOL_SPARES, start_method=CREW_POOL_START_METHOD):
+        self.size = size
+        self.max_runs = max_runs
+        self.max_rss_mb = max_rss_mb
+        self.spares = spares
+        self.start_method = start_method
+        self._idle = Queue()
+        self._workers = set()
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self._context = None
+        self._closed = False
+
+    def _ensure_started(self):
+        """Start the processes on first use in each web worker (never in a preloading master)."""
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._context = multiprocessing.get_context(self.start_method)
+            if self.start_method == 'forkserver':
+                from backend.server.startup import PRELOAD_MODULES
+                self._context.set_forkserver_preload(PRELOAD_MODULES)
+            self._idle, self._workers, self._slots = Queue(), set(), threading.Semaphore(self.size)
+            self._closed = False
+            self._started_pid = os.getpid()
+            atexit.register(self.shutdown)
+        for _ in range(self.size + self.spares):
+            self._spawn_async()
+
+    def _spawn_async(self):
+        threading.Thread(target=self._spawn, name='crew-pool-spawn', daemon=True).start()
+
+    def _spawn(self):
+        if self._closed:
+            return
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=worker_main, args=(child_conn,), name='crew-pool', daemon=True)
+        try:
+            process.start()
+            child_conn.close()
+            parent_conn.recv()  # 'ready': imports and init_worker() done
+        except Exception:
+            process.kill()
+            if self._closed:
+                return
+            logger.exception('Could not start a crew pool process')
+            time.sleep(1.0)
+            self._spawn_async()
+            return
+        worker = CrewWorker(process, parent_conn)
+        with self._lock:
+            if self._closed:
+                process.kill()
+                return
+            self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker, reason):
+        CREW_WORKERS_RECYCLED.labels(reason=reason).inc()
+        with self._lock:
+            self._workers.discard(worker)
+        self._spawn_async()
+        try:
+            worker.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.conn.close()
+        from backend.server.startup import worker_exited
+        worker_exited(worker.pid)
+
+    def run(self, data, on_task_complete=None, use_cache=True):
+        """Run one analysis in an idle pool process; same contract as run_project_analysis.
+
+        The result's ``memory`` reports this run only; callers should not cache it.
+        """
+        self._ensure_started()
+        while not self._slots.acquire(timeout=1.0):
+            check_cancelled()
+        try:
+            return self._run(data, on_task_complete, use_cache)
+        finally:
+            self._slots.release()
+
+    def _run(self, data, on_task_complete, use_cache):
+        token = current_token()
+        run_id = token.run_id if token is not None else None
+        while True:
+            try:
+                worker = self._idle.get(timeout=1.0)
+                break
+            except Empty:
+                check_cancelled()
+        relayed = False
+        try:
+            worker.conn.send((run_id, data, use_cache))
+            while True:
+                if not worker.conn.poll(0.5):
+                    if token is not None and not relayed and token.cancelled:
+                        # Local-only cancellations (e.g. a disconnect) must reach the pool process too
+                        cancel_registry.cancel(run_id, token.reason)
+                        relayed = True
+                    continue
+                message = worker.conn.recv()
+                if message[0] == 'stage':
+                    if on_task_complete:
+                        on_task_complete(message[1], message[2])
+                    continue
+                break
+        except (EOFError, OSError) as e:
+            threading.Thread(target=self._retire, args=(worker, 'crash'), daemon=True).start()
+            raise CrewWorkerLost(f'The crew process {worker.pid} exited during the analysis.') from e
+        except BaseException:
+            # The caller gave up mid-run: the process may still be busy, so replace it
+            threading.Thread(target=self._retire, args=(worker, 'abandoned'), daemon=True).start()
+            raise
+        kind, payload, memory = message
+        worker.runs += 1
+        worker.rss_mb = memory['rss_mb']
+        CREW_RUN_PEAK_RSS.observe(memory['peak_rss_mb'] * 2 ** 20)
+        if worker.runs >= self.max_runs:
+            threading.Thread(target=self._retire, args=(worker, 'runs'), daemon=True).start()
+        elif self.max_rss_mb and worker.rss_mb >= self.max_rss_mb:
+            threading.Thread(target=self._retire, args=(worker, 'rss'), daemon=True).start()
+        else:
+            self._idle.put(worker)
+        if kind == 'cancelled':
+            raise RunCancelled(payload)
+        if kind == 'error':
+            raise payload
+        payload['memory'] = dict(memory, worker_pid=worker.pid, worker_runs=worker.runs)
+        return payload
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+
+
+crew_pool = CrewPool()
@@ -0,0 +1,40 @@
+"""Process start-up hooks used by gunicorn.conf.py.
+
+The master imports the heavy, fork-safe modules once (``preload``) so every worker starts
+with them already in memory; anything holding sockets or threads is built per worker after
+fork (``init_worker``). Without gunicorn the same state is created lazily on first use.
+"""
+import os
+import importlib
+
+# Pure imports: no sockets, threads or open files are left behind by loading these
+PRELOAD_MODULES = [
+    'litellm',
+    'crewai',
+    'backend.llms.llm',
+    'backend.agents.agents',
+]
+
+
+def preload():
+    """Import the shared modules in the gunicorn master, before workers are forked."""
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    from backend.context.budget import get_encoding
+    get_encoding()
+
+
+def init_worker():
+    """Per-process state, built in each worker once it has started and before it serves requests."""
+    from backend.llms.llm import init_client_session
+    from backend.agents.templates import crew_prototypes
+    init_client_session()
+    # Building agents may start crewai's event/telemetry threads, which do not survive a fork
+    crew_prototypes()
+
+
+def worker_exited(pid):
+    """Drop a dead worker's live gauges from the multiprocess metrics."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
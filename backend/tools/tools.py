@@ -1,8 +1,7 @@
-from typing import List, Literal, Dict, Optional, Type
+from typing import List, Literal, Optional, Type, Any
 from pydantic import Field, BaseModel
 from crewai.tools import BaseTool
-import litellm
-litellm.set_verbose = True
+from backend.observability.tracing import span
 
 
 
@@ -39,9 +38,14 @@ class AnalyzeProjectRequirements(BaseTool):
                          description="Budget range for the project")
 
     args_schema: Type[BaseModel] = ArgsSchema
+    run_context: Optional[Any] = Field(default=None, exclude=True, description="RunContext the analysis is recorded in")
 
     def _run(self, project_name: str, project_description: str, project_type: str, budget_range: str) -> ProjectAnalysisOutput:
         """Analyzes project and returns structured analysis."""
+        with span('tool_call', kind='tool', tool=self.name):
+            return self._analyze(project_name, project_description, project_type, budget_range)
+
+    def _analyze(self, project_name: str, project_description: str, project_type: str, budget_range: str) -> ProjectAnalysisOutput:
         # Simplified analysis logic, focusing on returning the structure
         # In a real scenario, an LLM might generate these values or more complex logic would exist.
 
@@ -53,14 +57,16 @@ class AnalyzeProjectRequirements(BaseTool):
             "budget_feasibility": "within range", # Example value
             "requirements": ["Scalable architecture", "Security", "API integration"] # Example values
         }
-        return ProjectAnalysisOutput(**analysis)
+        result = ProjectAnalysisOutput(**analysis)
+        if self.run_context is not None:
+            self.run_context.set('ceo', result)
+        return result
 
 class CreateTechnicalSpecification(BaseTool):
     name: str = "CreateTechnicalSpecificationTool"
-    description: str = "Creates technical specifications based on project analysis, outputting a structured specification."
+    description: str = "Creates technical specifications based on the project analysis of this run, outputting a structured specification."
 
     class ArgsSchema(BaseModel):
-        project_analysis_json: str = Field(..., description="JSON string of the project analysis output from AnalyzeProjectRequirementsTool")
         architecture_type: Literal["monolithic", "microservices", "serverless", "hybrid"] = Field(
             ...,
             description="Proposed architecture type based on the analysis"
@@ -75,18 +81,22 @@ class CreateTechnicalSpecification(BaseTool):
         )
 
     args_schema: Type[BaseModel] = ArgsSchema
+    run_context: Optional[Any] = Field(default=None, exclude=True, description="RunContext holding the CEO's ProjectAnalysisOutput")
+
+    def _run(self, architecture_type: str, core_technologies: str, scalability_requirements: str) -> TechnicalSpecificationOutput:
+        """Creates technical specification based on the CEO's analysis in the run context."""
+        with span('tool_call', kind='tool', tool=self.name):
+            return self._specify(architecture_type, core_technologies, scalability_requirements)
 
-    def _run(self, project_analysis_json: str, architecture_type: str, core_technologies: str, scalability_requirements: str) -> TechnicalSpecificationOutput:
-        """Creates technical specification based on analysis dictionary."""
-        try:
-            project_analysis_data = ProjectAnalysisOutput.model_validate_json(project_analysis_json)
-        except Exception as e:
-            raise ValueError(f"Invalid project_analysis_json: {e}. It must be a valid JSON of ProjectAnalysisOutput.")
+    def _specify(self, architecture_type: str, core_technologies: str, scalability_requirements: str) -> TechnicalSpecificationOutput:
+        if self.run_context is None:
+            raise ValueError("CreateTechnicalSpecificationTool needs a run_context holding the CEO's project analysis.")
+        project_analysis_data = self.run_context.require('ceo', ProjectAnalysisOutput)
 
         spec = {
             "project_name": project_analysis_data.name,
             "architecture": architecture_type,
-            "technologies": core_technologies.split(","), # Assuming LLM provides comma-separated
+            "technologies": [t.strip() for t in core_technologies.split(",") if t.strip()], # Assuming LLM provides comma-separated
             "scalability": scalability_requirements
         }
         return TechnicalSpecificationOutput(**spec)
\ No newline at end of file
@@ -0,0 +1,414 @@
+"""Offline end-to-end benchmarks against the local stub LLM server.
+
+    python -m benchmarks.bench pipeline --runs 20 --concurrency 4
+    python -m benchmarks.bench http --workers 1 2 4 --requests 40 --concurrency 8
+    python -m benchmarks.bench construction --runs 200
+    python -m benchmarks.bench startup
+    python -m benchmarks.bench load --requests 400 --concurrency 200
+
+``pipeline`` calls run_project_analysis in-process; ``http`` starts gunicorn with the given
+worker counts and posts to /api/analyze. Both report p50/p95/p99 latency and throughput;
+with ``--concurrency 1`` the pipeline run also splits each stage into simulated LLM time and
+framework/glue overhead. ``construction`` times building one run's five agents, tasks and crews from
+scratch against cloning them from the prebuilt prototypes (no LLM calls). ``startup`` runs
+``python -X importtime`` on what a worker imports at boot and on what the first analysis adds.
+``load`` holds ``--concurrency`` requests in flight against the gunicorn setup (gunicorn.conf.py,
+4 workers) and against the ASGI app under uvicorn (one process), and also reports the peak
+resident memory of each server's process tree.
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_llm_server import start_in_thread
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The production rate limits (30 RPM / 6000 TPM) would make every scenario measure the limiter's sleeps
+NO_RATE_LIMITS = {"LLM_RPM": "1000000", "LLM_TPM": "1000000000"}
+
+SAMPLE_FORM = {
+    "project_name": "Benchmark Project",
+    "project_description": "A customer portal with dashboards, billing and a public REST API.",
+    "project_type": "Web Application",
+    "timeline": "3-4 months",
+    "budget_range": "$50k-$100k",
+    "priority": "High",
+    "tech_requirements": "Python backend, React frontend",
+    "special_considerations": "GDPR compliance",
+    "groq_api_key": "stub-key",
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies, wall_time):
+    return {
+        "runs": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "throughput_per_s": len(latencies) / wall_time if wall_time else 0.0,
+        "wall_time": wall_time,
+    }
+
+
+def form(i, extra=None):
+    return dict(SAMPLE_FORM, project_name=f"{SAMPLE_FORM['project_name']} {i}", **(extra or {}))
+
+
+def stage_overheads(windows, log):
+    """Per-stage wall time, stub LLM time inside the stage's window, and the difference."""
+    result = {}
+    for stage_name, (start, end) in windows.items():
+        llm_time = sum(e["end"] - e["start"] for e in log if e["start"] >= start and e["end"] <= end)
+        calls = sum(1 for e in log if e["start"] >= start and e["end"] <= end)
+        result[stage_name] = {"wall": end - start, "llm": llm_time, "overhead": end - start - llm_time, "llm_calls": calls}
+    return result
+
+
+def bench_pipeline(args, stub):
+    from backend.agents.agents import run_project_analysis
+
+    per_stage = []
+
+    def one(i):
+        started = time.time()
+        windows, last = {}, [started]
+
+        def on_task_complete(stage_name, output):
+            now = time.time()
+            windows[stage_name] = (last[0], now)
+            last[0] = now
+
+        run_project_analysis(form(i, args.form_extra), on_task_complete=on_task_complete, use_cache=False)
+        per_stage.append(windows)
+        return time.time() - started
+
+    for i in range(args.warmup):
+        one(-1 - i)
+    per_stage.clear()
+    stub.reset()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = list(executor.map(one, range(args.runs)))
+    report = summarize(latencies, time.time() - started)
+    stats = stub.stats()
+    report.update(llm_requests=stats["requests"], prompt_tokens=stats["prompt_tokens"],
+                  completion_tokens=stats["completion_tokens"])
+    if args.concurrency == 1:
+        # Sequential runs: attribute stub time to the stage whose window contains it
+        totals = {}
+        for windows in per_stage:
+            for stage_name, numbers in stage_overheads(windows, stats["log"]).items():
+                agg = totals.setdefault(stage_name, {"wall": 0.0, "llm": 0.0, "overhead": 0.0, "llm_calls": 0})
+                for key, value in numbers.items():
+                    agg[key] += value
+        report["stages"] = {stage_name: {key: value / args.runs for key, value in agg.items()}
+                            for stage_name, agg in totals.items()}
+    return report
+
+
+def bench_construction(args):
+    """Per-run setup of the five stages' agents, tasks and one-task crews: full construction from the
+    templates vs. cloning the prototypes. Both variants include the Crew each stage runs in."""
+    from backend.agents.agents import STAGE_NAMES, STAGE_DEPENDENCIES, template_inputs, stage_inputs
+    from backend.agents.templates import (AGENT_TEMPLATES, build_stage, build_crew, clone_stage, clone_crew,
+                                          crew_prototypes)
+    from backend.context.context import RunContext
+    from backend.llms.llm import get_llms
+
+    llms = get_llms(SAMPLE_FORM["groq_api_key"])
+    inputs = template_inputs(form(0, args.form_extra))
+    inputs_by_stage = {stage_name: stage_inputs(inputs, STAGE_DEPENDENCIES[stage_name])
+                       for stage_name in STAGE_NAMES}
+
+    def build(run_context):
+        for stage_name in STAGE_NAMES:
+            tools = [tool(run_context=run_context) for tool in AGENT_TEMPLATES[stage_name]["tools"]]
+            build_crew(*build_stage(stage_name, llms[f"{stage_name}_llm"], tools, inputs_by_stage[stage_name]))
+
+    def clone(run_context):
+        for stage_name in STAGE_NAMES:
+            _, task = clone_stage(stage_name, inputs_by_stage[stage_name], llms[f"{stage_name}_llm"], run_context)
+            clone_crew(stage_name, task)
+
+    started = time.perf_counter()
+    crew_prototypes()
+    prototype_time = time.perf_counter() - started
+    reports = {}
+    for name, setup in (("build", build), ("clone", clone)):
+        for _ in range(args.warmup):
+            setup(RunContext())
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            setup(RunContext())
+            timings.append(time.perf_counter() - started)
+        reports[name] = summarize(timings, sum(timings))
+    reports["clone"]["prototype_time"] = prototype_time
+    reports["clone"]["speedup"] = reports["build"]["mean"] / reports["clone"]["mean"] if reports["clone"]["mean"] else 0.0
+    return reports
+
+
+# What a worker imports to serve requests, and what it only loads once an analysis runs
+STARTUP_IMPORTS = {
+    "worker boot": "app",
+    "first analysis": "backend.agents.agents",
+}
+
+
+def import_times(module, top=10):
+    """Parse ``python -X importtime -c 'import module'`` into a total and the slowest top-level imports."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_ROOT,
+                               env=dict(os.environ), capture_output=True, text=True)
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    # -X importtime indents nested imports by two spaces per level; keep the first level
+    top_level = [(name.strip(), cumulative_us) for name, _, cumulative_us in entries if name[1:2] != " "]
+    top_level.sort(key=lambda entry: entry[1], reverse=True)
+    return {
+        "ok": completed.returncode == 0,
+        "import_time": sum(self_us for _, self_us, _ in entries) / 1e6,
+        "modules": len(entries),
+        "imports": [(name, cumulative_us / 1e6) for name, cumulative_us in top_level[:top]],
+    }
+
+
+def bench_startup(args):
+    return {name: import_times(module) for name, module in STARTUP_IMPORTS.items()}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def post_json(url, payload, timeout=600):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json", "Cache-Control": "no-cache"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def bench_http(args, base_url):
+    reports = {}
+    for workers in args.workers:
+        port = free_port()
+        env = dict(os.environ, LLM_API_BASE=base_url, CACHE_ENABLED="0", GROQ_API_KEY="stub-key",
+                   WEB_CONCURRENCY=str(workers), **NO_RATE_LIMITS)
+        command = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+                   "--workers", str(workers), "--timeout", "600"] + args.gunicorn_args
+        server = subprocess.Popen(command, cwd=REPO_ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            boot_started = time.time()
+            wait_for(f"http://127.0.0.1:{port}/")
+            boot_time = time.time() - boot_started
+            url = f"http://127.0.0.1:{port}/api/analyze"
+
+            def one(i):
+                started = time.time()
+                ok = post_json(url, form(i, args.form_extra)).get("success", False)
+                return time.time() - started, ok
+
+            for i in range(args.warmup):
+                one(-1 - i)
+            started = time.time()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                results = list(executor.map(one, range(args.requests)))
+            report = summarize([latency for latency, _ in results], time.time() - started)
+            report.update(errors=sum(1 for _, ok in results if not ok), boot_time=boot_time)
+            reports[f"workers={workers}"] = report
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return reports
+
+
+# Server command lines for the load scenario ({port} is filled in)
+LOAD_SERVERS = {
+    "gunicorn-4": [sys.executable, "-m", "gunicorn", "app:app", "--config", "gunicorn.conf.py",
+                   "--bind", "127.0.0.1:{port}", "--workers", "4", "--timeout", "600"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", "{port}",
+             "--no-access-log"],
+}
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+        stack.extend(children.get(current, []))
+    return total
+
+
+def bench_load(args, base_url):
+    reports = {}
+    for name in args.servers:
+        port = free_port()
+        # No cache, rate limits or admission queue in the way: every request runs a full crew
+        env = dict(os.environ, LLM_API_BASE=base_url, CACHE_ENABLED="0", GROQ_API_KEY="stub-key",
+                   ANALYSIS_CONCURRENCY=str(args.concurrency), ADMISSION_QUEUE_LIMIT=str(args.requests),
+                   ASGI_CREW_THREADS=str(args.concurrency), **NO_RATE_LIMITS)
+        command = [part.format(port=port) for part in LOAD_SERVERS[name]]
+        server = subprocess.Popen(command, cwd=REPO_ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            boot_started = time.time()
+            wait_for(f"http://127.0.0.1:{port}/")
+            boot_time = time.time() - boot_started
+            url = f"http://127.0.0.1:{port}/api/analyze"
+
+            def one(i):
+                started = time.time()
+                try:
+                    ok = post_json(url, form(i, args.form_extra)).get("success", False)
+                except Exception:
+                    ok = False
+                return time.time() - started, ok
+
+            for i in range(args.warmup):
+                one(-1 - i)
+            idle_rss = process_tree_rss(server.pid)
+            peak_rss, running = [idle_rss], [True]
+
+            def sample():
+                while running[0]:
+                    peak_rss[0] = max(peak_rss[0], process_tree_rss(server.pid))
+                    time.sleep(0.2)
+
+            sampler = threading.Thread(target=sample, daemon=True)
+            sampler.start()
+            started = time.time()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                results = list(executor.map(one, range(args.requests)))
+            wall_time = time.time() - started
+            running[0] = False
+            sampler.join()
+            report = summarize([latency for latency, _ in results], wall_time)
+            report.update(errors=sum(1 for _, ok in results if not ok), boot_time=boot_time,
+                          idle_rss_mb=idle_rss / 2 ** 20, peak_rss_mb=peak_rss[0] / 2 ** 20)
+            reports[name] = report
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return reports
+
+
+def print_report(name, report):
+    print(f"\n== {name} ==")
+    for key in ("runs", "p50", "p95", "p99", "mean", "throughput_per_s", "wall_time", "errors", "boot_time",
+                "llm_requests", "prompt_tokens", "completion_tokens", "prototype_time", "speedup",
+                "import_time", "modules", "ok", "idle_rss_mb", "peak_rss_mb"):
+        if key in report:
+            value = report[key]
+            print(f"  {key:<18} {value:.3f}" if isinstance(value, float) else f"  {key:<18} {value}")
+    for stage_name, numbers in report.get("stages", {}).items():
+        print(f"  stage {stage_name:<7} wall {numbers['wall']:.3f}s  llm {numbers['llm']:.3f}s  "
+              f"overhead {numbers['overhead']:.3f}s  calls {numbers['llm_calls']:.1f}")
+    for name, seconds in report.get("imports", []):
+        print(f"  import {name:<40} {seconds:.3f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the crew pipeline and the Flask app.")
+    parser.add_argument("scenario", choices=["pipeline", "http", "construction", "startup", "load", "all"])
+    parser.add_argument("--runs", type=int, default=10, help="pipeline runs (construction: setups per variant)")
+    parser.add_argument("--requests", type=int, default=20, help="HTTP requests per worker count")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="gunicorn worker counts")
+    parser.add_argument("--servers", nargs="+", choices=sorted(LOAD_SERVERS), default=sorted(LOAD_SERVERS),
+                        help="servers compared by the load scenario")
+    parser.add_argument("--gunicorn-args", nargs=argparse.REMAINDER, default=[], help="extra gunicorn arguments")
+    parser.add_argument("--form", dest="form_extra", type=json.loads, default=None,
+                        help='JSON merged into every form, e.g. \'{"pipeline": "fanout", "fast_path": true}\'')
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--tps", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=300)
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_in_thread(ttft=args.ttft, tps=args.tps, completion_tokens=args.completion_tokens)
+    # Must be set before backend.llms.llm is imported
+    os.environ["LLM_API_BASE"] = base_url
+    os.environ.update(NO_RATE_LIMITS)
+    os.environ.setdefault("GROQ_API_KEY", "stub-key")
+
+    reports = {"config": {"ttft": args.ttft, "tps": args.tps, "completion_tokens": args.completion_tokens,
+                          "concurrency": args.concurrency, "form": args.form_extra}}
+    if args.scenario in ("pipeline", "all"):
+        reports["pipeline"] = bench_pipeline(args, server.stub)
+        print_report("pipeline", reports["pipeline"])
+    if args.scenario in ("http", "all"):
+        for name, report in bench_http(args, base_url).items():
+            reports[f"http {name}"] = report
+            print_report(f"http {name}", report)
+    if args.scenario in ("construction", "all"):
+        for name, report in bench_construction(args).items():
+            reports[f"construction {name}"] = report
+            print_report(f"construction {name}", report)
+    if args.scenario in ("startup", "all"):
+        for name, report in bench_startup(args).items():
+            reports[f"startup {name}"] = report
+            print_report(f"startup {name}", report)
+    if args.scenario in ("load", "all"):
+        for name, report in bench_load(args, base_url).items():
+            reports[f"load {name}"] = report
+            print_report(f"load {name}", report)
+    server.shutdown()
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Local OpenAI/Groq-compatible completion server for offline benchmarks.
+
+Serves ``POST .../chat/completions`` (any path prefix, so both ``/v1`` and ``/openai/v1``
+work) with canned responses, a configurable time-to-first-token and tokens-per-second,
+and records every request so benchmarks can separate simulated LLM time from framework
+overhead. ``GET /stats`` returns the request log; ``POST /stats/reset`` clears it.
+
+    python -m benchmarks.stub_llm_server --port 8765 --ttft 0.2 --tps 400
+    LLM_API_BASE=http://127.0.0.1:8765/v1 gunicorn app:app ...
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FILLER = ("The plan phases delivery into discovery, build and launch milestones with weekly client reviews, "
+          "clear acceptance criteria, automated testing and a cloud budget tracked against the estimate. ")
+
+# First rule whose 'match' substrings all occur in the prompt (and none of 'unless') wins.
+DEFAULT_RULES = [
+    {"match": ["architecture_type", "JSON object"],
+     "content": json.dumps({"architecture_type": "microservices", "core_technologies": "Python, FastAPI, PostgreSQL",
+                            "scalability_requirements": "high"})},
+    {"match": ["budget_feasibility", "JSON"], "unless": ["Action:"],
+     "content": json.dumps({"name": "Stub Project", "analyzed_project_type": "Web Application", "complexity": "high",
+                            "timeline": "6 months", "budget_feasibility": "within range",
+                            "requirements": ["Scalable architecture", "Security", "API integration"]})},
+    {"match": ["scalability", "technologies", "JSON"], "unless": ["Action:"],
+     "content": json.dumps({"project_name": "Stub Project", "architecture": "microservices",
+                            "technologies": ["Python", "FastAPI", "PostgreSQL"], "scalability": "high"})},
+    {"match": ["AnalyzeProjectRequirementsTool"], "unless": ["Observation"],
+     "content": ('Thought: I should analyze the project first.\nAction: AnalyzeProjectRequirementsTool\n'
+                 'Action Input: {"project_name": "Stub Project", "project_description": "Benchmark project", '
+                 '"project_type": "Web Application", "budget_range": "$50k-$100k"}')},
+    {"match": ["CreateTechnicalSpecificationTool"], "unless": ["Observation"],
+     "content": ('Thought: I should create the specification.\nAction: CreateTechnicalSpecificationTool\n'
+                 'Action Input: {"architecture_type": "microservices", "core_technologies": "Python, FastAPI, PostgreSQL", '
+                 '"scalability_requirements": "high"}')},
+]
+
+# Arguments returned for native (function-calling) tool calls, by tool name
+DEFAULT_TOOL_ARGS = {
+    "AnalyzeProjectRequirementsTool": {"project_name": "Stub Project", "project_description": "Benchmark project",
+                                       "project_type": "Web Application", "budget_range": "$50k-$100k"},
+    "CreateTechnicalSpecificationTool": {"architecture_type": "microservices",
+                                         "core_technologies": "Python, FastAPI, PostgreSQL",
+                                         "scalability_requirements": "high"},
+}
+
+
+def approx_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubLLM:
+    """Response selection, timing model and request log shared by all handler threads."""
+
+    def __init__(self, ttft=0.2, tps=400.0, completion_tokens=300, rules=None, tool_args=None):
+        self.ttft = ttft
+        self.tps = tps
+        self.completion_tokens = completion_tokens
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.tool_args = tool_args if tool_args is not None else DEFAULT_TOOL_ARGS
+        self.log = []
+        self._lock = threading.Lock()
+
+    def final_answer(self):
+        words = (FILLER * (self.completion_tokens // approx_tokens(FILLER) + 1))
+        return "Thought: I now know the final answer\nFinal Answer: " + words[:self.completion_tokens * 4]
+
+    def respond(self, body):
+        """Return ``(message_dict, prompt_text)`` for a chat completion request body."""
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        tools = body.get("tools") or []
+        if tools and not any(m.get("role") == "tool" for m in messages):
+            name = tools[0].get("function", {}).get("name", "")
+            return {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(self.tool_args.get(name, {}))},
+            }]}, prompt
+        for rule in self.rules:
+            if all(s in prompt for s in rule.get("match", [])) and not any(s in prompt for s in rule.get("unless", [])):
+                return {"role": "assistant", "content": rule["content"]}, prompt
+        return {"role": "assistant", "content": self.final_answer()}, prompt
+
+    def record(self, started, finished, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.log.append({"start": started, "end": finished,
+                             "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+
+    def stats(self):
+        with self._lock:
+            log = list(self.log)
+        return {
+            "requests": len(log),
+            "simulated_seconds": sum(entry["end"] - entry["start"] for entry in log),
+            "prompt_tokens": sum(entry["prompt_tokens"] for entry in log),
+            "completion_tokens": sum(entry["completion_tokens"] for entry in log),
+            "log": log,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.log.clear()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real provider
+    stub = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            return self._send_json(self.stub.stats())
+        if self.path.rstrip("/").endswith("/models"):
+            return self._send_json({"object": "list", "data": [{"id": "stub-model", "object": "model"}]})
+        self._send_json({"error": {"message": "not found"}}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/").endswith("/stats/reset"):
+            self.stub.reset()
+            return self._send_json({"ok": True})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json({"error": {"message": "not found"}}, 404)
+
+        started = time.time()
+        message, prompt = self.stub.respond(body)
+        text = message.get("content") or json.dumps(message.get("tool_calls"))
+        prompt_tokens, completion_tokens = approx_tokens(prompt), approx_tokens(text)
+        generation = completion_tokens / self.stub.tps if self.stub.tps > 0 else 0.0
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "stub-model")
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+
+        time.sleep(self.stub.ttft)
+        if body.get("stream"):
+            self._stream(completion_id, model, message, generation, usage)
+        else:
+            time.sleep(generation)
+            self._send_json({
+                "id": completion_id, "object": "chat.completion", "created": int(started), "model": model,
+                "choices": [{"index": 0, "message": message,
+                             "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+                "usage": usage,
+            })
+        self.stub.record(started, time.time(), prompt_tokens, completion_tokens)
+
+    def _stream(self, completion_id, model, message, generation, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        content = message.get("content") or ""
+        chunks = [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+        delay = generation / len(chunks)
+
+        def event(delta, finish_reason=None, **extra):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant"})
+        if message.get("tool_calls"):
+            event({"tool_calls": [dict(call, index=i) for i, call in enumerate(message["tool_calls"])]})
+        for chunk in chunks:
+            time.sleep(delay)
+            event({"content": chunk})
+        event({}, "stop", usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=0, **stub_options):
+    """Create (but do not start) a server; ``server.stub`` holds the StubLLM, port 0 picks a free port."""
+    stub = StubLLM(**stub_options)
+    handler = type("BoundStubHandler", (StubHandler,), {"stub": stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stub = stub
+    return server
+
+
+def start_in_thread(**options):
+    """Start a server on a background thread; returns ``(server, base_url)``."""
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tps", type=float, default=400.0, help="completion tokens per second (0 = instant)")
+    parser.add_argument("--completion-tokens", type=int, default=300, help="length of default final answers")
+    parser.add_argument("--responses", help="JSON file with a list of rules ({match, unless, content}) replacing the defaults")
+    args = parser.parse_args(argv)
+    rules = None
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            rules = json.load(f)
+    server = make_server(args.host, args.port, ttft=args.ttft, tps=args.tps,
+                         completion_tokens=args.completion_tokens, rules=rules)
+    print(f"Stub LLM listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+const TABS = [
+    { id: 'ceo', label: "CEO's Project Analysis" },
+    { id: 'cto', label: "CTO's Technical Specification" },
+    { id: 'pm', label: "Product Manager's Plan" },
+    { id: 'dev', label: "Developer's Implementation" },
+    { id: 'client', label: "Client Success Strategy" }
+];
+
 document.getElementById('projectForm').addEventListener('submit', async function(e) {
     e.preventDefault();
     document.getElementById('results').style.display = 'none';
     document.getElementById('errorAlert').style.display = 'none';
-    
+
     const data = {
         project_name: document.getElementById('project_name').value,
         project_description: document.getElementById('project_description').value,
@@ -14,58 +22,110 @@ document.getElementById('projectForm').addEventListener('submit', async function
         special_considerations: document.getElementById('special_considerations').value,
         groq_api_key: document.getElementById('groq_api_key').value
     };
+    // Set by the server's 'started' event; lets the Cancel button stop this run on the server
+    let runId = null;
 
     const btn = this.querySelector('button[type="submit"]');
     btn.disabled = true;
     btn.innerHTML = 'Analyzing... <span class="spinner-border spinner-border-sm"></span>';
+    const controller = new AbortController();
+    const cancelBtn = document.getElementById('cancelBtn');
+    cancelBtn.style.display = '';
+    cancelBtn.disabled = false;
+    cancelBtn.onclick = function() {
+        cancelBtn.disabled = true;
+        if (runId) {
+            fetch(`/api/analyze/${encodeURIComponent(runId)}/cancel`, { method: 'POST' }).catch(() => {});
+        }
+        controller.abort();
+    };
 
     try {
-        const response = await fetch('/api/analyze', {
+        const response = await fetch('/api/analyze/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(data)
+            body: JSON.stringify(data),
+            signal: controller.signal
+        });
+        renderTabs();
+        // Each NDJSON line is an event: a finished stage, the final result, or an error
+        await readNdjson(response, function(event) {
+            if (event.event === 'started') {
+                runId = event.run_id;
+            } else if (event.event === 'queued') {
+                btn.innerHTML = event.position > 0
+                    ? `Queued (#${event.position}, ~${Math.ceil(event.estimated_wait)}s)... <span class="spinner-border spinner-border-sm"></span>`
+                    : 'Analyzing... <span class="spinner-border spinner-border-sm"></span>';
+            } else if (event.event === 'stage') {
+                fillTab(event.stage, event.output);
+            } else if (event.event === 'done') {
+                showResults(event.result);
+            } else if (event.event === 'error') {
+                showError(event.error || 'Unknown error.');
+            } else if (event.event === 'cancelled') {
+                showError('Analysis cancelled.');
+            }
         });
-        const result = await response.json();
-        btn.disabled = false;
-        btn.innerHTML = 'Analyze Project';
-        if (result.success) {
-            showResults(result.result);
-        } else {
-            showError(result.error || 'Unknown error.');
-        }
     } catch (err) {
+        showError(err.name === 'AbortError' ? 'Analysis cancelled.' : 'Network or server error.');
+    } finally {
         btn.disabled = false;
         btn.innerHTML = 'Analyze Project';
-        showError('Network or server error.');
+        cancelBtn.style.display = 'none';
     }
 });
 
-function showResults(result) {
+async function readNdjson(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline).trim();
+            buffer = buffer.slice(newline + 1);
+            if (line) onEvent(JSON.parse(line));
+        }
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
+function renderTabs() {
     document.getElementById('results').style.display = '';
-    const tabs = [
-        { id: 'ceo', label: "CEO's Project Analysis" },
-        { id: 'cto', label: "CTO's Technical Specification" },
-        { id: 'pm', label: "Product Manager's Plan" },
-        { id: 'dev', label: "Developer's Implementation" },
-        { id: 'client', label: "Client Success Strategy" }
-    ];
     let nav = '<ul class="nav nav-tabs" id="resultTab" role="tablist">';
     let content = '<div class="tab-content">';
-    tabs.forEach((tab, i) => {
+    TABS.forEach((tab, i) => {
         nav += `<li class="nav-item" role="presentation">
             <button class="nav-link${i===0?' active':''}" id="${tab.id}-tab" data-bs-toggle="tab" data-bs-target="#${tab.id}" type="button" role="tab" aria-controls="${tab.id}" aria-selected="${i===0?'true':'false'}">${tab.label}</button>
         </li>`;
-        let tabData = result[tab.id];
-        let raw = tabData && tabData.raw_output ? `<pre>${escapeHtml(tabData.raw_output)}</pre>` : '<em>No output.</em>';
-        let exported = tabData && tabData.exported_output ? `<pre>${JSON.stringify(tabData.exported_output, null, 2)}</pre>` : '';
         content += `<div class="tab-pane fade${i===0?' show active':''}" id="${tab.id}" role="tabpanel" aria-labelledby="${tab.id}-tab">
-            ${raw}
-            ${exported}
+            <em class="text-muted">Waiting for this stage... <span class="spinner-border spinner-border-sm"></span></em>
         </div>`;
     });
     nav += '</ul>';
     content += '</div>';
     document.getElementById('resultTabs').innerHTML = nav + content;
+    document.getElementById('crewResult').innerHTML = '';
+}
+
+function fillTab(id, tabData) {
+    const pane = document.getElementById(id);
+    if (!pane) return;
+    let raw = tabData && tabData.raw_output ? `<pre>${escapeHtml(tabData.raw_output)}</pre>` : '<em>No output.</em>';
+    let exported = tabData && tabData.exported_output ? `<pre>${JSON.stringify(tabData.exported_output, null, 2)}</pre>` : '';
+    pane.innerHTML = raw + exported;
+}
+
+function showResults(result) {
+    if (!document.getElementById('resultTab')) renderTabs();
+    TABS.forEach(tab => fillTab(tab.id, result[tab.id]));
+    (result.incomplete_stages || []).forEach(id => {
+        const pane = document.getElementById(id);
+        if (pane) pane.innerHTML = '<em>This stage did not finish before the deadline.</em>';
+    });
     document.getElementById('crewResult').innerHTML = `<h5 class="mt-4">Full Crew Execution Log</h5><pre>${escapeHtml(result.crew_result)}</pre>`;
 }
 
@@ -0,0 +1,32 @@
+"""Gunicorn settings, picked up automatically by ``gunicorn app:app`` from the repo root.
+
+With GUNICORN_PRELOAD (default on) the master imports crewai/litellm and the backend once and
+forks the workers from it; provider clients and crew prototypes are created after fork.
+Runs carry their own credentials (RunContext), so each worker serves many analyses at once
+on threads (gthread).
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))  # splits the LLM rate limits when LLM_RATE_LIMIT_SHARED=0
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') not in ('0', 'false', 'False')
+
+
+def on_starting(server):
+    if preload_app:
+        from backend.server.startup import preload
+        preload()
+
+
+def post_worker_init(worker):
+    # After the worker class has set itself up (and loaded the app), before the first request
+    from backend.server.startup import init_worker
+    init_worker()
+
+
+def child_exit(server, worker):
+    from backend.server.startup import worker_exited
+    worker_exited(worker.pid)
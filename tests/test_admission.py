@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.jobs.admission import AdmissionQueueFull, PriorityAdmission, normalize_priority
+
+
+def queued(admission, priorities):
+    """Dispatch order of a run taking the only slot and of one waiter per priority queued behind it."""
+    holder = admission.acquire(priorities[0])
+    tickets = [admission._enqueue(priority, None) for priority in priorities[1:]]
+    return [holder.priority] + [ticket.priority for ticket in sorted(tickets, key=lambda ticket: ticket.position)]
+
+
+def test_priorities_share_dispatches_by_weight():
+    admission = PriorityAdmission(concurrency=1, starvation_age=3600)
+    order = queued(admission, ['Medium'] + ['Low'] * 7 + ['Medium'] * 7 + ['High'] * 7)
+
+    first = order[:7]
+    assert (first.count('High'), first.count('Medium'), first.count('Low')) == (4, 2, 1)
+    assert order[1] == 'High'
+
+
+def test_long_waiters_are_dispatched_first():
+    admission = PriorityAdmission(concurrency=1, starvation_age=0)
+    assert queued(admission, ['High', 'Low', 'High', 'Medium']) == ['High', 'Low', 'High', 'Medium']
+
+
+def test_unknown_priorities_count_as_medium():
+    assert normalize_priority(' high ') == 'High'
+    assert normalize_priority(None) == 'Medium'
+    assert normalize_priority('urgent') == 'Medium'
+
+
+def test_a_full_queue_rejects_new_waiters():
+    admission = PriorityAdmission(concurrency=1, queue_limit=1)
+    admission.acquire()
+    admission._enqueue('High', None)
+    with pytest.raises(AdmissionQueueFull):
+        admission._enqueue('High', None)
+
+
+def test_a_released_slot_admits_the_next_waiter():
+    admission = PriorityAdmission(concurrency=1, starvation_age=3600)
+    updates = []
+    holder = admission.acquire('Low')
+    admitted = threading.Event()
+
+    def wait_for_slot():
+        with admission.slot('High', on_update=updates.append):
+            admitted.set()
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    assert not admitted.wait(0.2)
+    assert updates[0]['position'] == 1 and admission.waiting == 1
+    admission.release(holder)
+    assert admitted.wait(5)
+    waiter.join(5)
+    assert updates[-1]['position'] == 0
+    assert admission.running == 0
+
+
+def test_a_waiter_that_gives_up_leaves_the_queue():
+    admission = PriorityAdmission(concurrency=1)
+    admission.acquire('High')
+
+    def check():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        admission.acquire('High', check=check)
+    assert admission.waiting == 0
+
+
+def test_blocked_waiters_stay_idle():
+    admission = PriorityAdmission(concurrency=1, starvation_age=3600)
+    holder = admission.acquire()
+    updates, checks = [], []
+    waiters = [threading.Thread(target=admission.acquire, daemon=True, kwargs={
+        'priority': 'High', 'on_update': updates.append,
+        'check': (lambda: checks.append(1)) if i % 2 else None}) for i in range(5)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.2)
+    started = time.process_time()
+    time.sleep(1.5)
+
+    assert time.process_time() - started < 0.3
+    assert len(updates) == 5  # each waiter's position, once
+    assert len(checks) <= 2 * 3  # about once a second per waiter with a check
+    admission.release(holder)
+    time.sleep(0.2)
+    assert sorted(update['position'] for update in updates[5:]) == [0, 1, 2, 3, 4]
+    for _ in waiters:
+        admission.release(None)
+        time.sleep(0.05)
+    for waiter in waiters:
+        waiter.join(5)
+    assert len(updates) == 5 + 5 + 4 + 3 + 2 + 1  # queued, then admitted or moved up once per release
+
+
+def test_blocked_async_waiters_stay_idle():
+    admission = PriorityAdmission(concurrency=1, starvation_age=3600)
+    holder = admission.acquire()
+    updates = []
+
+    async def main():
+        waiters = [asyncio.ensure_future(admission.acquire_async('High', updates.append, check=lambda: None))
+                   for _ in range(5)]
+        await asyncio.sleep(1.5)
+        assert len(updates) == 5
+        admission.release(holder)
+        await asyncio.wait_for(waiters[0], 5)
+        for waiter in waiters[1:]:
+            waiter.cancel()
+        await asyncio.gather(*waiters[1:], return_exceptions=True)
+
+    asyncio.run(main())
+    assert admission.waiting == 0 and admission.running == 1
+
+
+def test_positions_are_updated_when_a_waiter_starves():
+    admission = PriorityAdmission(concurrency=1, starvation_age=0.3)
+    admission.acquire()
+    updates = {}
+    low = threading.Thread(target=admission.acquire, daemon=True,
+                           kwargs={'priority': 'Low', 'on_update': updates.setdefault('low', []).append})
+    low.start()
+    time.sleep(0.05)
+    for _ in range(2):
+        threading.Thread(target=admission.acquire, daemon=True,
+                         kwargs={'priority': 'High', 'on_update': updates.setdefault('high', []).append}).start()
+    time.sleep(0.1)
+    assert updates['low'][-1]['position'] == 3
+
+    time.sleep(0.5)
+    assert updates['low'][-1]['position'] == 1
+    admission.release(None)
+    low.join(5)
+    assert updates['low'][-1]['position'] == 0
@@ -0,0 +1,67 @@
+from pydantic import BaseModel
+
+from backend.context.budget import ContextBudgeter, compact, count_tokens
+
+SECTION = '\n'.join([
+    '## Phase 1',
+    'Set up the repository, CI and the staging environment for the portal.',
+    '- Authentication',
+    'Users sign in with email links; admins additionally use TOTP.',
+    '## Phase 2',
+    'Billing integrates the payment provider and sends monthly invoices.',
+    '- Dashboards',
+] + ['Background detail that only matters for the final estimate, repeated at length.'] * 40)
+
+
+class Spec(BaseModel):
+    architecture_type: str
+    core_technologies: str
+
+
+def test_text_within_budget_is_unchanged():
+    assert compact(SECTION, count_tokens(SECTION)) == SECTION
+
+
+def test_compact_keeps_the_outline_and_fills_the_budget_with_body_text():
+    compacted = compact(SECTION, 100)
+
+    assert count_tokens(compacted) <= 100
+    assert count_tokens(compacted) > 80
+    for heading in ('## Phase 1', '- Authentication', '## Phase 2', '- Dashboards'):
+        assert heading in compacted
+    assert 'Set up the repository' in compacted
+    assert compacted.index('## Phase 1') < compacted.index('Set up the repository') < compacted.index('## Phase 2')
+
+
+def test_compact_truncates_an_outline_that_does_not_fit():
+    compacted = compact(SECTION, 5)
+
+    assert count_tokens(compacted) <= 5
+    assert compacted.startswith('## Phase')
+
+
+def test_compact_truncates_text_without_an_outline():
+    text = 'word ' * 500
+    assert count_tokens(compact(text, 50)) <= 50
+
+
+def test_budgeter_keeps_short_and_structured_sections_whole():
+    spec = Spec(architecture_type='Microservices', core_technologies='Python, React')
+    context, tokens = ContextBudgeter(200).build([
+        ("CEO's analysis", 'Short analysis.', None),
+        ("CTO's technical specification", None, spec),
+        ("PM's roadmap", SECTION, None),
+    ])
+
+    assert tokens == count_tokens(context) <= 200
+    assert "CEO's analysis:\nShort analysis." in context
+    assert spec.model_dump_json() in context
+    assert '## Phase 1' in context
+
+
+def test_budgeter_drops_lines_repeated_from_the_description():
+    context, _ = ContextBudgeter(500).build([("PM's roadmap", 'Build the portal.\nShip in Q3.', None)],
+                                            description='Build the portal.')
+
+    assert 'Build the portal.' not in context
+    assert 'Ship in Q3.' in context
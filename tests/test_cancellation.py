@@ -0,0 +1,56 @@
+import pytest
+
+from backend.pipeline.cancellation import CancelRegistry, RunCancelled, check_cancelled, current_token
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return CancelRegistry(path=str(tmp_path / 'cancel.sqlite3'))
+
+
+def test_cancel_flags_a_run_in_this_process(registry):
+    with registry.run('a' * 32) as token:
+        assert current_token() is token
+        assert registry.cancel(token.run_id)
+        with pytest.raises(RunCancelled):
+            check_cancelled()
+    assert current_token() is None
+
+
+def test_cancel_before_claimed_run_starts_is_kept(registry):
+    run_id = 'b' * 32
+    assert registry.claim(run_id)
+    assert not registry.cancel(run_id)  # still waiting for admission
+    with registry.run(run_id) as token:
+        with pytest.raises(RunCancelled):
+            token.check()
+
+
+def test_new_run_clears_a_stale_cancel_of_an_unclaimed_id(registry):
+    run_id = 'c' * 32
+    registry.cancel(run_id)
+    with registry.run(run_id) as token:
+        token.check()
+    with registry.run(run_id, resume=True):
+        pass
+    registry.cancel(run_id)
+    with registry.run(run_id, resume=True) as token:
+        with pytest.raises(RunCancelled):
+            token.check()
+
+
+def test_claimed_ids_are_single_use(registry):
+    run_id = 'd' * 32
+    assert registry.claim(run_id)
+    assert not registry.claim(run_id)
+    with registry.run('e' * 32):
+        assert not registry.claim('e' * 32)
+
+
+def test_cancel_is_seen_by_other_registries(tmp_path):
+    path = str(tmp_path / 'cancel.sqlite3')
+    worker, other = CancelRegistry(path=path), CancelRegistry(path=path)
+    with worker.run('f' * 32) as token:
+        token.poll_interval = 0
+        assert not other.cancel(token.run_id)
+        assert token.cancelled
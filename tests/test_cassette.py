@@ -0,0 +1,56 @@
+import threading
+import time
+
+import litellm
+import pytest
+
+from backend.llms import deadlines
+from backend.llms.cassette import Cassette, CassetteMiss, load_interactions
+
+MESSAGES = [{'role': 'user', 'content': 'Summarize the project.'}]
+
+
+def fake_completion(replies):
+    replies = iter(replies)
+
+    def completion(**kwargs):
+        return litellm.ModelResponse(model=kwargs['model'],
+                                     choices=[{'message': {'role': 'assistant', 'content': next(replies)}}])
+    return completion
+
+
+def content(response):
+    return response.choices[0].message.content
+
+
+def test_identical_requests_replay_in_recorded_order(tmp_path):
+    path = str(tmp_path / 'run.jsonl.gz')
+    recorder = Cassette(path, 'record')
+    record = recorder.wrap(fake_completion(['first', 'second']))
+    assert [content(record(model='groq/m', messages=MESSAGES)) for _ in range(2)] == ['first', 'second']
+    recorder.close()
+    assert [i['seq'] for i in load_interactions(path)] == [0, 1]
+
+    replay = Cassette(path, 'replay').wrap(fake_completion([]))
+    assert [content(replay(model='groq/m', messages=MESSAGES)) for _ in range(3)] == ['first', 'second', 'second']
+    with pytest.raises(CassetteMiss):
+        replay(model='groq/other', messages=MESSAGES)
+
+
+def test_a_slow_call_is_dispatched_once_without_hedging(tmp_path, monkeypatch):
+    monkeypatch.setattr(deadlines, 'hedge_delay', lambda role: 0.01)
+    calls = []
+    lock = threading.Lock()
+    inner = fake_completion(['reply', 'duplicate'])
+
+    def slow(**kwargs):
+        with lock:
+            calls.append(kwargs['model'])
+        time.sleep(0.1)
+        return inner(**kwargs)
+
+    recorder = Cassette(str(tmp_path / 'run.jsonl.gz'), 'record')
+    completion = deadlines.bounded(recorder.wrap(slow), hedge=False)
+    assert content(completion(model='groq/m', messages=MESSAGES)) == 'reply'
+    assert calls == ['groq/m']
+    recorder.close()
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+pytest.importorskip('crewai')
+
+import litellm
+from crewai import LLM
+
+from backend.agents.fast_path import DEFAULT_TECH_CHOICES, analyze_project, choose_tech
+
+FORM = {
+    'project_name': 'Atlas',
+    'project_description': 'Inventory tracking for small shops',
+    'project_type': 'Web Application',
+    'budget_range': '$25k-$50k',
+}
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs)
+        reply = {'architecture_type': 'serverless', 'core_technologies': ['Python', 'DynamoDB'],
+                 'scalability_requirements': 'high'}
+        return litellm.ModelResponse(choices=[{'message': {'role': 'assistant', 'content': json.dumps(reply)}}])
+
+    monkeypatch.setattr(litellm, 'completion', completion)
+    return calls
+
+
+@pytest.mark.parametrize('model', ['groq/llama-3.1-8b-instant', 'openai/gpt-4o-mini'])
+def test_the_cto_choice_goes_to_the_routed_model(completions, model):
+    llm = LLM(model=model, api_key='test-key', temperature=0.5)
+    choices, fallback = choose_tech(analyze_project(FORM), llm, 'test-key', model)
+
+    assert completions[0]['model'] == model
+    assert (choices, fallback) == (('serverless', 'Python, DynamoDB', 'high'), False)
+
+
+def test_an_unusable_reply_falls_back_to_the_project_type_defaults(monkeypatch):
+    monkeypatch.setattr(litellm, 'completion', lambda **kwargs: litellm.ModelResponse(
+        choices=[{'message': {'role': 'assistant', 'content': 'not json'}}]))
+    llm = LLM(model='groq/llama-3.1-8b-instant', api_key='test-key')
+    choices, fallback = choose_tech(analyze_project(FORM), llm, 'test-key', 'groq/llama-3.1-8b-instant')
+
+    assert (choices, fallback) == (DEFAULT_TECH_CHOICES['Web Application'], True)
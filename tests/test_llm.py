@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip('crewai')
+
+from backend.llms.llm import LLMRegistry
+
+
+@pytest.mark.parametrize('model', ['groq/gemma2-9b-it', 'openai/gpt-4o-mini'])
+def test_agent_llms_are_called_through_litellm(model):
+    registry = LLMRegistry()
+    llm = registry.get('test-key', model, 0.5, max_tokens=256, timeout=30)
+
+    assert llm.is_litellm and llm.model == model
+    assert registry.get('test-key', model, 0.5, max_tokens=256, timeout=30) is llm
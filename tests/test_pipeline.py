@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from backend.pipeline.pipeline import run_dag, validate_graph
+
+GRAPH = {'ceo': [], 'cto': ['ceo'], 'pm': ['ceo', 'cto'], 'dev': ['ceo', 'cto'], 'client': ['pm', 'dev']}
+
+
+class Flaky(Exception):
+    pass
+
+
+def test_validate_graph_rejects_unknown_stages_and_cycles():
+    with pytest.raises(ValueError, match='unknown'):
+        validate_graph({'pm': ['ceo']})
+    with pytest.raises(ValueError, match='cycle'):
+        validate_graph({'a': ['b'], 'b': ['a']})
+
+
+def test_stages_start_once_their_dependencies_finish():
+    order, lock = [], threading.Lock()
+
+    def run_stage(stage):
+        with lock:
+            order.append(stage)
+        return stage.upper()
+
+    results = run_dag(GRAPH, run_stage, max_parallel=2)
+
+    assert results == {stage: stage.upper() for stage in GRAPH}
+    for stage, deps in GRAPH.items():
+        assert all(order.index(dep) < order.index(stage) for dep in deps)
+
+
+def test_independent_stages_run_concurrently():
+    both_running = threading.Barrier(2, timeout=5)
+
+    def run_stage(stage):
+        if stage in ('pm', 'dev'):
+            both_running.wait()
+
+    run_dag(GRAPH, run_stage, max_parallel=2)
+
+
+def test_completed_stages_are_not_run_again():
+    ran = []
+    run_dag(GRAPH, ran.append, completed=['ceo', 'cto'], max_parallel=1)
+    assert sorted(ran) == ['client', 'dev', 'pm']
+
+
+def test_a_failure_is_raised_without_waiting_for_running_siblings():
+    release = threading.Event()
+
+    def run_stage(stage):
+        if stage == 'pm':
+            release.wait(5)
+        if stage == 'dev':
+            raise RuntimeError('dev failed')
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match='dev failed'):
+        run_dag(GRAPH, run_stage, max_parallel=2)
+    assert time.monotonic() - started < 2
+    release.set()
+
+
+def test_tolerated_failures_drop_the_stage_and_its_dependents():
+    def run_stage(stage):
+        if stage == 'dev':
+            raise Flaky()
+        return stage
+
+    results = run_dag(GRAPH, run_stage, max_parallel=2, tolerate=(Flaky,))
+    assert sorted(results) == ['ceo', 'cto', 'pm']
+
+
+def test_stages_past_the_deadline_are_abandoned():
+    release = threading.Event()
+
+    def run_stage(stage):
+        if stage == 'cto':
+            release.wait(5)
+        return stage
+
+    started = time.monotonic()
+    results = run_dag(GRAPH, run_stage, deadline=time.monotonic() + 0.2)
+    assert results == {'ceo': 'ceo'}
+    assert time.monotonic() - started < 2
+    release.set()
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from backend.llms.ratelimit import (DEFAULT_COMPLETION_ESTIMATE, KeyLimiter, ProviderRateLimited, RateLimitScheduler,
+                                    SharedKeyLimiter, TokenBucket, estimate_tokens, retry_after_seconds)
+from backend.pipeline.cancellation import RunCancelled
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_at_its_per_minute_rate():
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(30) == pytest.approx(30.0)
+    bucket.refill(bucket.updated + 10)
+    assert bucket.level == pytest.approx(10.0)
+    bucket.refill(bucket.updated + 120)
+    assert bucket.level == 60.0  # never above capacity
+    assert bucket.wait_time(120) == 0.0  # larger than the bucket: waits for a full one
+
+
+def test_acquire_gives_up_when_capacity_comes_after_the_deadline():
+    limiter = KeyLimiter(rpm=60, tpm=1000)
+    limiter.clock = FakeClock(time.monotonic())
+    limiter.acquire(900, deadline=time.monotonic() + 1)
+    with pytest.raises(ProviderRateLimited) as raised:
+        limiter.acquire(900, deadline=time.monotonic() + 1)
+    assert raised.value.retry_after == pytest.approx(48.0)
+
+
+def test_acquire_stops_waiting_when_check_raises():
+    limiter = KeyLimiter(rpm=1, tpm=1000)
+    limiter.acquire(10, deadline=time.monotonic() + 1)
+
+    def check():
+        raise RuntimeError('cancelled')
+
+    with pytest.raises(RuntimeError):
+        limiter.acquire(10, deadline=time.monotonic() + 3600, check=check)
+
+
+def test_settle_refunds_unused_tokens_and_tracks_reply_sizes():
+    limiter = KeyLimiter(rpm=60, tpm=1000)
+    limiter.clock = FakeClock(time.monotonic())
+    limiter.acquire(600, deadline=time.monotonic() + 1)
+    limiter.settle(600, 200, completion=100)
+
+    assert limiter.tokens.level == pytest.approx(800.0)
+    assert limiter.completion_estimate == pytest.approx(DEFAULT_COMPLETION_ESTIMATE + (100 - DEFAULT_COMPLETION_ESTIMATE) * 0.2)
+
+
+def test_a_429_blocks_the_key_and_slows_its_refill():
+    limiter = KeyLimiter(rpm=60, tpm=1000)
+    clock = limiter.clock = FakeClock(time.monotonic())
+    limiter.acquire(100, deadline=time.monotonic() + 1)
+    limiter.throttled(5.0, 100)
+
+    assert limiter.tokens.level == pytest.approx(1000.0)
+    assert limiter.scale == pytest.approx(0.8)
+    assert limiter._try_take(1) == pytest.approx(5.0)
+    clock.now += 5.0
+    assert limiter._try_take(1) == 0.0
+
+
+def test_shared_limiters_draw_from_one_bucket(tmp_path):
+    path = str(tmp_path / 'limits.sqlite3')
+    worker, other = (SharedKeyLimiter(60, 1000, 'key:groq/m', path=path) for _ in range(2))
+    worker.acquire(700, deadline=time.monotonic() + 1)
+
+    with pytest.raises(ProviderRateLimited):
+        other.acquire(700, deadline=time.monotonic() + 1)
+    other.settle(700, 100)
+    worker.acquire(500, deadline=time.monotonic() + 1)
+
+
+def test_reservation_caps_the_expected_reply_at_max_tokens():
+    kwargs = {'messages': [{'role': 'user', 'content': 'x' * 40}], 'max_tokens': 64}
+    assert estimate_tokens(kwargs) == estimate_tokens({'messages': kwargs['messages']}) - DEFAULT_COMPLETION_ESTIMATE + 64
+
+
+def test_retry_after_is_read_from_groq_messages():
+    assert retry_after_seconds(Exception('Please try again in 1m2.5s.')) == pytest.approx(62.5)
+    assert retry_after_seconds(Exception('Please try again in 250ms.')) == pytest.approx(0.25)
+    assert retry_after_seconds(Exception('rate limited')) is None
+
+
+def test_a_cancelled_call_returns_its_reservation():
+    scheduler = RateLimitScheduler(shared=False, processes=1)
+
+    def cancelled(**kwargs):
+        raise RunCancelled('cancelled mid-call')
+
+    with pytest.raises(RunCancelled):
+        scheduler.wrap(cancelled)(model='groq/m', api_key='key', messages=[{'role': 'user', 'content': 'hi'}])
+    limiter = scheduler.limiter('key', 'groq/m')
+    limiter.tokens.refill(limiter.tokens.updated)
+    assert limiter.tokens.level == pytest.approx(limiter.tokens.capacity, rel=0.01)
@@ -0,0 +1,21 @@
+import json
+
+from backend.llms.routing import DEFAULT_ROUTES, load_routes
+
+
+def test_overridden_models_and_fallbacks_get_the_provider_prefix(monkeypatch):
+    monkeypatch.setenv('MODEL_ROUTES', json.dumps({
+        'dev': {'model': 'llama-3.3-70b-versatile', 'fallback': 'gemma2-9b-it'},
+        'pm': {'fallback': 'openai/gpt-4o-mini'},
+    }))
+    routes = load_routes()
+
+    assert routes['dev']['model'] == 'groq/llama-3.3-70b-versatile'
+    assert routes['dev']['fallback'] == 'groq/gemma2-9b-it'
+    assert routes['pm']['fallback'] == 'openai/gpt-4o-mini'
+    assert routes['ceo'] == DEFAULT_ROUTES['ceo']
+
+
+def test_a_route_without_fallback_keeps_none(monkeypatch):
+    monkeypatch.setenv('MODEL_ROUTES', json.dumps({'cto': {'fallback': None}}))
+    assert load_routes()['cto']['fallback'] is None
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from backend.cache import singleflight
+from backend.cache.singleflight import FOLLOWER, LEADER, REMOTE_FOLLOWER, SingleFlight
+from backend.pipeline.cancellation import CancelRegistry, RunCancelled, check_cancelled
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    registry = CancelRegistry(path=str(tmp_path / 'cancel.sqlite3'))
+    monkeypatch.setattr(singleflight, 'cancel_registry', registry)
+    return registry
+
+
+def flights(tmp_path, shared=False):
+    return SingleFlight(path=str(tmp_path / 'flights.sqlite3'), poll_interval=0.01, shared=shared)
+
+
+def test_identical_requests_share_one_run(tmp_path):
+    sf = flights(tmp_path)
+    flight, role = sf.begin('key')
+    joined, second_role = sf.begin('key')
+    assert (role, second_role) == (LEADER, FOLLOWER) and joined is flight
+
+    release, calls = threading.Event(), []
+
+    def run(on_stage):
+        calls.append(1)
+        on_stage('ceo', {'raw_output': 'analysis'})
+        release.wait(5)
+        return {'crew_result': 'done'}
+
+    sf.lead(flight, run)
+    stages = []
+    follower = threading.Thread(target=lambda: stages.append(sf.wait(joined, lambda *stage: stages.append(stage))))
+    follower.start()
+    release.set()
+    assert sf.wait(flight) == {'crew_result': 'done'}
+    follower.join(5)
+
+    assert calls == [1]
+    assert stages == [('ceo', {'raw_output': 'analysis'}), {'crew_result': 'done'}]
+    assert sf.begin('key')[1] == LEADER  # a finished run is not joined
+
+
+def test_followers_get_the_leader_error(tmp_path):
+    sf = flights(tmp_path)
+    flight, _ = sf.begin('key')
+    sf.begin('key')
+
+    def run(on_stage):
+        raise ValueError('provider down')
+
+    sf.lead(flight, run)
+    for _ in range(2):
+        with pytest.raises(ValueError, match='provider down'):
+            sf.wait(flight)
+
+
+def test_the_run_is_cancelled_once_no_request_waits_for_it(tmp_path):
+    sf = flights(tmp_path)
+    flight, _ = sf.begin('key')
+    sf.begin('key')
+    stopped = threading.Event()
+
+    def run(on_stage):
+        try:
+            while True:
+                check_cancelled()
+                stopped.wait(0.01)
+        except RunCancelled:
+            stopped.set()
+            raise
+
+    def give_up():
+        raise RunCancelled('request cancelled')
+
+    sf.lead(flight, run)
+    with pytest.raises(RunCancelled):
+        sf.wait(flight, check=give_up)
+    assert not stopped.wait(0.3)  # the other request still waits
+    with pytest.raises(RunCancelled):
+        sf.wait(flight, check=give_up)
+    assert stopped.wait(5)
+
+
+def test_another_worker_relays_the_shared_run(tmp_path):
+    path = str(tmp_path / 'flights.sqlite3')
+    leader, worker = (SingleFlight(path=path, poll_interval=0.01) for _ in range(2))
+    flight, role = leader.begin('key')
+    assert role == LEADER
+    with sqlite3.connect(path) as conn:  # pretend the leader row belongs to another live process
+        conn.execute('UPDATE flights SET pid = ? WHERE key = ?', (os.getppid(), 'key'))
+
+    remote, remote_role = worker.begin('key')
+    assert remote_role == REMOTE_FOLLOWER
+    worker.follow_remote(remote)
+    stages = []
+    leader.publish_stage(flight, 'ceo', {'raw_output': 'analysis'})
+    leader.finish(flight, {'crew_result': 'done'})
+
+    assert worker.wait(remote, lambda *stage: stages.append(stage)) == {'crew_result': 'done'}
+    assert stages == [('ceo', {'raw_output': 'analysis'})]
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip('crewai')
+
+from backend.agents.templates import clone_crew, clone_stage, crew_prototypes
+from backend.context.context import RunContext
+from backend.llms.llm import normalize_model_name
+
+INPUTS = {
+    'project_name': 'Atlas',
+    'project_description': 'Inventory tracking for small shops',
+    'project_type': 'Web Application',
+    'budget_range': '$25k-$50k',
+    'project_info': 'Project Name: Atlas',
+    'context': '',
+}
+
+
+@pytest.mark.parametrize('stage_name', ['ceo', 'cto'])
+def test_cloned_task_tools_carry_the_run_context(stage_name):
+    from crewai import LLM
+    run_context = RunContext()
+    agent, task = clone_stage(stage_name, INPUTS, LLM(model=normalize_model_name()), run_context)
+
+    assert task.tools and all(tool.run_context is run_context for tool in task.tools)
+    assert all(tool.run_context is run_context for tool in agent.tools)
+    proto_agent, proto_task = crew_prototypes()[stage_name]
+    assert all(tool.run_context is None for tool in proto_task.tools)
+
+
+def test_cloned_crews_run_the_run_task_with_their_own_tool_cache():
+    from crewai import LLM
+    crews = []
+    for _ in range(2):
+        agent, task = clone_stage('cto', INPUTS, LLM(model=normalize_model_name()), RunContext())
+        crew = clone_crew('cto', task)
+        assert crew.agents == [agent] and crew.tasks == [task]
+        if crew.cache:
+            assert agent.cache_handler is crew._cache_handler
+        crews.append(crew)
+    assert crews[0].id != crews[1].id
+    assert crews[0]._cache_handler is not crews[1]._cache_handler
+
+
+def test_downstream_goals_name_only_the_stages_of_their_graph():
+    from crewai import LLM
+    from backend.agents.agents import PIPELINES, stage_inputs
+
+    llm = LLM(model=normalize_model_name())
+    dev_agent, _ = clone_stage('dev', stage_inputs(INPUTS, PIPELINES['dag']['dev']), llm, RunContext())
+    assert "PM's roadmap" not in dev_agent.goal
+    assert "CTO's technical specification" in dev_agent.goal
+    sequential_dev, _ = clone_stage('dev', stage_inputs(INPUTS, PIPELINES['sequential']['dev']), llm, RunContext())
+    assert "PM's roadmap" in sequential_dev.goal
+    client_agent, _ = clone_stage('client', stage_inputs(INPUTS, PIPELINES['fanout']['client']), llm, RunContext())
+    assert "Developer's plan" not in client_agent.goal